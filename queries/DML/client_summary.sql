@@ -1,3 +1,7 @@
+-- output: client_summary.csv
+-- depends: events_enriched
+-- description: resumen de clientes
+
 WITH EVENTS_AGG AS (
     SELECT 
         E.CLIENT_ID,
@@ -29,30 +33,15 @@ WITH EVENTS_AGG AS (
         ) as FAIL_RATE,
         
         -- AVG Delay
-        ROUND(
-            AVG(
-                CASE 
-                    WHEN E.COMPLETED_AT IS NOT NULL AND E.CREATED_AT IS NOT NULL 
-                    THEN EXTRACT(EPOCH FROM (CAST(E.COMPLETED_AT AS TIMESTAMP) - CAST(E.CREATED_AT AS TIMESTAMP))) / 3600.0
-                    ELSE NULL 
-                END
-            ), 2
-        ) AS AVG_DELAY_HOURS
+        ROUND(AVG(E.DELAY_HOURS), 2) AS AVG_DELAY_HOURS,
+
+        -- Retries: ya agregados por evento en EVENTS_ENRICHED (sin multiplicación)
+        CAST(SUM(E.RETRY_COUNT) AS BIGINT) as TOTAL_RETRIES,
+        SUM(E.SUCCESSFUL_RETRY_COUNT) as SUCCESSFUL_RETRIES,
+        SUM(E.FAILED_RETRY_COUNT) as FAILED_RETRIES,
+        COUNT(CASE WHEN E.HAS_RETRY THEN 1 END) as EVENTS_WITH_RETRIES
         
-    FROM EVENTS AS E
-    GROUP BY E.CLIENT_ID
-),
-RETRY_AGG AS (
-    -- Agregamos retries por separado para evitar multiplicación
-    SELECT 
-        E.CLIENT_ID,
-        COUNT(R.RETRY_ID) as TOTAL_RETRIES,
-        SUM(CASE WHEN R.RETRY_STATUS = 'success' THEN 1 ELSE 0 END) as SUCCESSFUL_RETRIES,
-        SUM(CASE WHEN R.RETRY_STATUS = 'failed' THEN 1 ELSE 0 END) as FAILED_RETRIES,
-        COUNT(DISTINCT R.ORIGINAL_EVENT_ID) as EVENTS_WITH_RETRIES
-    FROM EVENTS AS E
-    INNER JOIN RETRY_LOGS AS R 
-        ON E.EVENT_ID = R.ORIGINAL_EVENT_ID
+    FROM EVENTS_ENRICHED AS E
     GROUP BY E.CLIENT_ID
 )
 SELECT 
@@ -75,9 +64,9 @@ SELECT
     COALESCE(EA.CREATED_EVENTS, 0) as CREATED_EVENTS,
     
     -- Retry metrics
-    COALESCE(RA.TOTAL_RETRIES, 0) as TOTAL_RETRIES,
-    COALESCE(RA.SUCCESSFUL_RETRIES, 0) as SUCCESSFUL_RETRIES,
-    COALESCE(RA.FAILED_RETRIES, 0) as FAILED_RETRIES,
+    COALESCE(EA.TOTAL_RETRIES, 0) as TOTAL_RETRIES,
+    COALESCE(EA.SUCCESSFUL_RETRIES, 0) as SUCCESSFUL_RETRIES,
+    COALESCE(EA.FAILED_RETRIES, 0) as FAILED_RETRIES,
     
     -- Ratios
     COALESCE(EA.PAY_IN_RATIO, 0) as PAY_IN_RATIO,
@@ -87,13 +76,11 @@ SELECT
     
     -- Retry rate corregido
     ROUND(
-        COALESCE(RA.EVENTS_WITH_RETRIES, 0) * 100.0 / 
+        COALESCE(EA.EVENTS_WITH_RETRIES, 0) * 100.0 / 
         NULLIF(COALESCE(EA.TOTAL_EVENTS, 0), 0), 2
     ) AS RETRY_RATE
 
 FROM CLIENTS AS C
 LEFT JOIN EVENTS_AGG AS EA
     ON C.CLIENT_ID = EA.CLIENT_ID
-LEFT JOIN RETRY_AGG AS RA
-    ON C.CLIENT_ID = RA.CLIENT_ID
 ORDER BY COALESCE(EA.TOTAL_VOLUME, 0) DESC NULLS LAST
\ No newline at end of file
@@ -1,17 +1,15 @@
+-- output: event_time_series.csv
+-- depends: events_enriched
+-- description: series temporales de eventos
+
 WITH DAILY_EVENTS AS (
   SELECT 
     -- Transactional Data
-    DATE(CAST(E.CREATED_AT AS TIMESTAMP)) AS TRANSACTION_DATE,
-    EXTRACT(HOUR FROM CAST(E.CREATED_AT AS TIMESTAMP)) AS TRANSACTION_HOUR,
+    E.TRANSACTION_DATE,
+    E.TRANSACTION_HOUR,
     
     -- AVG Delay
-    AVG(
-        CASE 
-            WHEN E.COMPLETED_AT IS NOT NULL AND E.CREATED_AT IS NOT NULL 
-            THEN EXTRACT(EPOCH FROM (CAST(E.COMPLETED_AT AS TIMESTAMP) - CAST(E.CREATED_AT AS TIMESTAMP))) / 3600.0
-            ELSE NULL 
-        END
-    ) AS AVG_DELAY_HOURS,
+    AVG(E.DELAY_HOURS) AS AVG_DELAY_HOURS,
     
     -- Split by type
     COUNT(E.EVENT_ID) AS TOTAL_EVENTS,
@@ -42,26 +40,18 @@ WITH DAILY_EVENTS AS (
     ) AS COMPLETED_COUNT,
     SUM(
         CASE WHEN E.STATUS = 'processing' THEN 1 ELSE 0 END
-    ) AS PROCESSING_COUNT
+    ) AS PROCESSING_COUNT,
+
+    -- Eventos que tuvieron retries (flag por evento, sin duplicar volumen)
+    COUNT(CASE WHEN E.HAS_RETRY THEN 1 END) AS EVENTS_WITH_RETRIES
     
-  FROM EVENTS AS E
-  GROUP BY 1,2
-)
-, EVENTS_WITH_RETRIES_BY_HOUR AS (
-  -- CTE separada para eventos que tuvieron retries (sin duplicar volumen)
-  SELECT 
-    DATE(CAST(E.CREATED_AT AS TIMESTAMP)) AS TRANSACTION_DATE,
-    EXTRACT(HOUR FROM CAST(E.CREATED_AT AS TIMESTAMP)) AS TRANSACTION_HOUR,
-    COUNT(DISTINCT E.EVENT_ID) AS EVENTS_WITH_RETRIES
-  FROM EVENTS AS E
-  INNER JOIN RETRY_LOGS AS R 
-    ON E.EVENT_ID = R.ORIGINAL_EVENT_ID
+  FROM EVENTS_ENRICHED AS E
   GROUP BY 1,2
 )
 , RETRY_LOGS_BY_HOUR AS (
   SELECT 
-    DATE(CAST(R.RETRY_TIME AS TIMESTAMP)) AS RETRY_DATE,
-    EXTRACT(HOUR FROM CAST(R.RETRY_TIME AS TIMESTAMP)) AS RETRY_HOUR,
+    DATE(R.RETRY_TIME) AS RETRY_DATE,
+    EXTRACT(HOUR FROM R.RETRY_TIME) AS RETRY_HOUR,
     COUNT(1) AS TOTAL_RETRIES,
     SUM(
         CASE WHEN R.RETRY_STATUS = 'success' THEN 1 ELSE 0 END
@@ -94,17 +84,14 @@ SELECT
   DE.PROCESSING_COUNT,
   
   -- Retry metrics
-  COALESCE(ER.EVENTS_WITH_RETRIES, 0) AS EVENTS_WITH_RETRIES,
+  DE.EVENTS_WITH_RETRIES,
   COALESCE(DR.TOTAL_RETRIES, 0) AS TOTAL_RETRIES,
   COALESCE(DR.SUCCESSFUL_RETRIES, 0) AS SUCCESSFUL_RETRIES,
   
   -- Retry rate
-  ROUND(COALESCE(ER.EVENTS_WITH_RETRIES, 0) * 100.0 / NULLIF(DE.TOTAL_EVENTS, 0), 2) AS RETRY_RATE
+  ROUND(DE.EVENTS_WITH_RETRIES * 100.0 / NULLIF(DE.TOTAL_EVENTS, 0), 2) AS RETRY_RATE
 
 FROM DAILY_EVENTS AS DE
-LEFT JOIN EVENTS_WITH_RETRIES_BY_HOUR AS ER
-  ON DE.TRANSACTION_DATE = ER.TRANSACTION_DATE 
-  AND DE.TRANSACTION_HOUR = ER.TRANSACTION_HOUR
 LEFT JOIN RETRY_LOGS_BY_HOUR AS DR
   ON DE.TRANSACTION_DATE = DR.RETRY_DATE 
   AND DE.TRANSACTION_HOUR = DR.RETRY_HOUR
@@ -0,0 +1,50 @@
+-- export: false
+-- description: fact de eventos enriquecido (etapa compartida)
+
+-- Una fila por evento, materializada una vez por ejecución y leída por todas
+-- las queries analíticas: timestamps tipados, buckets de fecha/hora, delay en
+-- horas y conteos de retries por evento (el join EVENTS ⋈ RETRY_LOGS se
+-- resuelve aquí una sola vez, ya agregado por evento)
+WITH RETRIES_BY_EVENT AS (
+    SELECT 
+        R.ORIGINAL_EVENT_ID AS EVENT_ID,
+        COUNT(R.RETRY_ID) AS RETRY_COUNT,
+        SUM(CASE WHEN R.RETRY_STATUS = 'success' THEN 1 ELSE 0 END) AS SUCCESSFUL_RETRY_COUNT,
+        SUM(CASE WHEN R.RETRY_STATUS = 'failed' THEN 1 ELSE 0 END) AS FAILED_RETRY_COUNT
+    FROM RETRY_LOGS AS R
+    GROUP BY R.ORIGINAL_EVENT_ID
+)
+SELECT 
+    -- Event data
+    E.EVENT_ID,
+    E.CLIENT_ID,
+    E.TYPE,
+    E.STATUS,
+    E.AMOUNT,
+    E.CURRENCY,
+    E.ERROR_CODE,
+    E.ORIGIN_COUNTRY,
+    E.DESTINATION_COUNTRY,
+    E.CREATED_AT,
+    E.COMPLETED_AT,
+
+    -- Time buckets
+    DATE(E.CREATED_AT) AS TRANSACTION_DATE,
+    EXTRACT(HOUR FROM E.CREATED_AT) AS TRANSACTION_HOUR,
+
+    -- Delay
+    CASE 
+        WHEN E.COMPLETED_AT IS NOT NULL AND E.CREATED_AT IS NOT NULL 
+        THEN EXTRACT(EPOCH FROM (E.COMPLETED_AT - E.CREATED_AT)) / 3600.0
+        ELSE NULL 
+    END AS DELAY_HOURS,
+
+    -- Retries
+    RBE.EVENT_ID IS NOT NULL AS HAS_RETRY,
+    COALESCE(RBE.RETRY_COUNT, 0) AS RETRY_COUNT,
+    COALESCE(RBE.SUCCESSFUL_RETRY_COUNT, 0) AS SUCCESSFUL_RETRY_COUNT,
+    COALESCE(RBE.FAILED_RETRY_COUNT, 0) AS FAILED_RETRY_COUNT
+
+FROM EVENTS AS E
+LEFT JOIN RETRIES_BY_EVENT AS RBE
+    ON E.EVENT_ID = RBE.EVENT_ID
@@ -0,0 +1,65 @@
+-- Agregados parciales (sumables) por cliente para los eventos/retries del batch
+WITH EVENTS_PARTIAL AS (
+    SELECT
+        E.CLIENT_ID,
+        COUNT(E.EVENT_ID) AS TOTAL_EVENTS,
+        SUM(E.AMOUNT) AS TOTAL_VOLUME,
+        COUNT(E.AMOUNT) AS AMOUNT_COUNT,
+
+        -- Status counts
+        SUM(CASE WHEN E.STATUS = 'completed' THEN 1 ELSE 0 END) AS COMPLETED_EVENTS,
+        SUM(CASE WHEN E.STATUS = 'failed' THEN 1 ELSE 0 END) AS FAILED_EVENTS,
+        SUM(CASE WHEN E.STATUS = 'processing' THEN 1 ELSE 0 END) AS PROCESSING_EVENTS,
+        SUM(CASE WHEN E.STATUS = 'created' THEN 1 ELSE 0 END) AS CREATED_EVENTS,
+
+        -- Type counts
+        SUM(CASE WHEN E.TYPE = 'pay_in' THEN 1 ELSE 0 END) AS PAY_IN_COUNT,
+        SUM(CASE WHEN E.TYPE = 'pay_out' THEN 1 ELSE 0 END) AS PAY_OUT_COUNT,
+
+        -- Delay (suma y conteo en lugar de AVG)
+        SUM(
+            CASE
+                WHEN E.COMPLETED_AT IS NOT NULL AND E.CREATED_AT IS NOT NULL
+                THEN EXTRACT(EPOCH FROM (E.COMPLETED_AT - E.CREATED_AT)) / 3600.0
+                ELSE NULL
+            END
+        ) AS DELAY_SUM,
+        COUNT(
+            CASE
+                WHEN E.COMPLETED_AT IS NOT NULL AND E.CREATED_AT IS NOT NULL THEN 1
+                ELSE NULL
+            END
+        ) AS DELAY_COUNT
+    FROM EVENTS_DELTA AS E
+    GROUP BY E.CLIENT_ID
+),
+RETRY_PARTIAL AS (
+    SELECT
+        P.CLIENT_ID,
+        COUNT(P.RETRY_ID) AS TOTAL_RETRIES,
+        SUM(CASE WHEN P.RETRY_STATUS = 'success' THEN 1 ELSE 0 END) AS SUCCESSFUL_RETRIES,
+        SUM(CASE WHEN P.RETRY_STATUS = 'failed' THEN 1 ELSE 0 END) AS FAILED_RETRIES,
+        COUNT(DISTINCT CASE WHEN P.IS_FIRST_RETRY_BATCH THEN P.EVENT_ID END) AS EVENTS_WITH_RETRIES
+    FROM RETRY_PAIRS_DELTA AS P
+    GROUP BY P.CLIENT_ID
+)
+SELECT
+    COALESCE(EP.CLIENT_ID, RP.CLIENT_ID) AS CLIENT_ID,
+    COALESCE(EP.TOTAL_EVENTS, 0) AS TOTAL_EVENTS,
+    EP.TOTAL_VOLUME,
+    COALESCE(EP.AMOUNT_COUNT, 0) AS AMOUNT_COUNT,
+    COALESCE(EP.COMPLETED_EVENTS, 0) AS COMPLETED_EVENTS,
+    COALESCE(EP.FAILED_EVENTS, 0) AS FAILED_EVENTS,
+    COALESCE(EP.PROCESSING_EVENTS, 0) AS PROCESSING_EVENTS,
+    COALESCE(EP.CREATED_EVENTS, 0) AS CREATED_EVENTS,
+    COALESCE(EP.PAY_IN_COUNT, 0) AS PAY_IN_COUNT,
+    COALESCE(EP.PAY_OUT_COUNT, 0) AS PAY_OUT_COUNT,
+    EP.DELAY_SUM,
+    COALESCE(EP.DELAY_COUNT, 0) AS DELAY_COUNT,
+    COALESCE(RP.TOTAL_RETRIES, 0) AS TOTAL_RETRIES,
+    COALESCE(RP.SUCCESSFUL_RETRIES, 0) AS SUCCESSFUL_RETRIES,
+    COALESCE(RP.FAILED_RETRIES, 0) AS FAILED_RETRIES,
+    COALESCE(RP.EVENTS_WITH_RETRIES, 0) AS EVENTS_WITH_RETRIES
+FROM EVENTS_PARTIAL AS EP
+FULL OUTER JOIN RETRY_PARTIAL AS RP
+    ON EP.CLIENT_ID = RP.CLIENT_ID
@@ -0,0 +1,41 @@
+-- client_summary derivado de los agregados parciales acumulados
+SELECT
+    -- Client metadata
+    C.CLIENT_ID,
+    C.CLIENT_NAME,
+    C.SECTOR,
+    C.CONTRACT_TIER,
+    C.SIGN_UP_DATE,
+
+    -- Event metrics
+    COALESCE(P.TOTAL_EVENTS, 0) as TOTAL_EVENTS,
+    COALESCE(P.TOTAL_VOLUME, 0) as TOTAL_VOLUME,
+    COALESCE(P.TOTAL_VOLUME / NULLIF(P.AMOUNT_COUNT, 0), 0) as AVG_TRANSACTION_AMOUNT,
+
+    -- Status counts
+    COALESCE(P.COMPLETED_EVENTS, 0) as COMPLETED_EVENTS,
+    COALESCE(P.FAILED_EVENTS, 0) as FAILED_EVENTS,
+    COALESCE(P.PROCESSING_EVENTS, 0) as PROCESSING_EVENTS,
+    COALESCE(P.CREATED_EVENTS, 0) as CREATED_EVENTS,
+
+    -- Retry metrics
+    COALESCE(P.TOTAL_RETRIES, 0) as TOTAL_RETRIES,
+    COALESCE(P.SUCCESSFUL_RETRIES, 0) as SUCCESSFUL_RETRIES,
+    COALESCE(P.FAILED_RETRIES, 0) as FAILED_RETRIES,
+
+    -- Ratios
+    COALESCE(ROUND(P.PAY_IN_COUNT * 100.0 / NULLIF(P.TOTAL_EVENTS, 0), 2), 0) as PAY_IN_RATIO,
+    COALESCE(ROUND(P.PAY_OUT_COUNT * 100.0 / NULLIF(P.TOTAL_EVENTS, 0), 2), 0) as PAY_OUT_RATIO,
+    COALESCE(ROUND(P.FAILED_EVENTS * 100.0 / NULLIF(P.TOTAL_EVENTS, 0), 2), 0) as FAIL_RATE,
+    COALESCE(ROUND(P.DELAY_SUM / NULLIF(P.DELAY_COUNT, 0), 2), 0) AS AVG_DELAY_HOURS,
+
+    -- Retry rate
+    ROUND(
+        COALESCE(P.EVENTS_WITH_RETRIES, 0) * 100.0 /
+        NULLIF(COALESCE(P.TOTAL_EVENTS, 0), 0), 2
+    ) AS RETRY_RATE
+
+FROM CLIENTS AS C
+LEFT JOIN CLIENT_SUMMARY_PARTIAL AS P
+    ON C.CLIENT_ID = P.CLIENT_ID
+ORDER BY COALESCE(P.TOTAL_VOLUME, 0) DESC NULLS LAST
@@ -0,0 +1,13 @@
+-- Sketch de cuantiles del delay (horas) por (CLIENT_ID, fecha, hora): conteo
+-- de eventos por bucket logarítmico (ver SQLAnalytics._create_sketch_macros).
+-- Los conteos se suman al mergear; los percentiles de cualquier grano salen
+-- del acumulado de buckets (ver SQLAnalytics.query_sketches)
+SELECT
+    E.CLIENT_ID AS CLIENT_ID,
+    DATE(E.CREATED_AT) AS TRANSACTION_DATE,
+    EXTRACT(HOUR FROM E.CREATED_AT) AS TRANSACTION_HOUR,
+    delay_bucket(EXTRACT(EPOCH FROM (E.COMPLETED_AT - E.CREATED_AT)) / 3600.0) AS BUCKET,
+    COUNT(*) AS DELAY_COUNT
+FROM EVENTS_DELTA AS E
+WHERE E.COMPLETED_AT IS NOT NULL AND E.CREATED_AT IS NOT NULL
+GROUP BY 1, 2, 3, 4
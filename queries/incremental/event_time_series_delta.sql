@@ -0,0 +1,60 @@
+-- Agregados parciales (sumables) por hora de creación del evento
+WITH EVENTS_PARTIAL AS (
+  SELECT
+    DATE(E.CREATED_AT) AS TRANSACTION_DATE,
+    EXTRACT(HOUR FROM E.CREATED_AT) AS TRANSACTION_HOUR,
+
+    -- Delay (suma y conteo en lugar de AVG)
+    SUM(
+        CASE
+            WHEN E.COMPLETED_AT IS NOT NULL AND E.CREATED_AT IS NOT NULL
+            THEN EXTRACT(EPOCH FROM (E.COMPLETED_AT - E.CREATED_AT)) / 3600.0
+            ELSE NULL
+        END
+    ) AS DELAY_SUM,
+    COUNT(
+        CASE
+            WHEN E.COMPLETED_AT IS NOT NULL AND E.CREATED_AT IS NOT NULL THEN 1
+            ELSE NULL
+        END
+    ) AS DELAY_COUNT,
+
+    COUNT(E.EVENT_ID) AS TOTAL_EVENTS,
+    SUM(E.AMOUNT) AS TOTAL_VOLUME,
+    SUM(CASE WHEN E.TYPE = 'pay_in' THEN 1 ELSE 0 END) AS PAY_IN_COUNT,
+    SUM(CASE WHEN E.TYPE = 'pay_out' THEN 1 ELSE 0 END) AS PAY_OUT_COUNT,
+    SUM(CASE WHEN E.TYPE = 'pay_in' THEN E.AMOUNT ELSE 0 END) AS PAY_IN_VOLUME,
+    SUM(CASE WHEN E.TYPE = 'pay_out' THEN E.AMOUNT ELSE 0 END) AS PAY_OUT_VOLUME,
+    SUM(CASE WHEN E.STATUS = 'failed' THEN 1 ELSE 0 END) AS FAILED_COUNT,
+    SUM(CASE WHEN E.STATUS = 'completed' THEN 1 ELSE 0 END) AS COMPLETED_COUNT,
+    SUM(CASE WHEN E.STATUS = 'processing' THEN 1 ELSE 0 END) AS PROCESSING_COUNT
+  FROM EVENTS_DELTA AS E
+  GROUP BY 1,2
+)
+, RETRIES_PARTIAL AS (
+  SELECT
+    DATE(P.CREATED_AT) AS TRANSACTION_DATE,
+    EXTRACT(HOUR FROM P.CREATED_AT) AS TRANSACTION_HOUR,
+    COUNT(DISTINCT CASE WHEN P.IS_FIRST_RETRY_BATCH THEN P.EVENT_ID END) AS EVENTS_WITH_RETRIES
+  FROM RETRY_PAIRS_DELTA AS P
+  GROUP BY 1,2
+)
+SELECT
+  COALESCE(EP.TRANSACTION_DATE, RP.TRANSACTION_DATE) AS TRANSACTION_DATE,
+  COALESCE(EP.TRANSACTION_HOUR, RP.TRANSACTION_HOUR) AS TRANSACTION_HOUR,
+  EP.DELAY_SUM,
+  COALESCE(EP.DELAY_COUNT, 0) AS DELAY_COUNT,
+  COALESCE(EP.TOTAL_EVENTS, 0) AS TOTAL_EVENTS,
+  EP.TOTAL_VOLUME,
+  COALESCE(EP.PAY_IN_COUNT, 0) AS PAY_IN_COUNT,
+  COALESCE(EP.PAY_OUT_COUNT, 0) AS PAY_OUT_COUNT,
+  COALESCE(EP.PAY_IN_VOLUME, 0) AS PAY_IN_VOLUME,
+  COALESCE(EP.PAY_OUT_VOLUME, 0) AS PAY_OUT_VOLUME,
+  COALESCE(EP.FAILED_COUNT, 0) AS FAILED_COUNT,
+  COALESCE(EP.COMPLETED_COUNT, 0) AS COMPLETED_COUNT,
+  COALESCE(EP.PROCESSING_COUNT, 0) AS PROCESSING_COUNT,
+  COALESCE(RP.EVENTS_WITH_RETRIES, 0) AS EVENTS_WITH_RETRIES
+FROM EVENTS_PARTIAL AS EP
+FULL OUTER JOIN RETRIES_PARTIAL AS RP
+  ON EP.TRANSACTION_DATE = RP.TRANSACTION_DATE
+  AND EP.TRANSACTION_HOUR = RP.TRANSACTION_HOUR
@@ -0,0 +1,40 @@
+-- event_time_series derivado de los agregados parciales acumulados
+SELECT
+  EP.TRANSACTION_DATE,
+  EP.TRANSACTION_HOUR,
+
+  -- Timestamp combinado para PowerBI
+  EP.TRANSACTION_DATE + INTERVAL '1 hour' * EP.TRANSACTION_HOUR AS TIMESTAMP,
+
+  -- Volúmenes
+  EP.TOTAL_EVENTS,
+  EP.TOTAL_VOLUME,
+  EP.PAY_IN_VOLUME,
+  EP.PAY_OUT_VOLUME,
+  EP.PAY_IN_COUNT,
+  EP.PAY_OUT_COUNT,
+
+  -- Tasas calculadas
+  ROUND(EP.FAILED_COUNT * 100.0 / NULLIF(EP.TOTAL_EVENTS, 0), 2) AS FAILURE_RATE,
+  ROUND(EP.PAY_IN_COUNT * 100.0 / NULLIF(EP.TOTAL_EVENTS, 0), 2) AS PAY_IN_RATIO,
+
+  -- Status counts
+  EP.COMPLETED_COUNT,
+  EP.FAILED_COUNT,
+  EP.PROCESSING_COUNT,
+
+  -- Retry metrics
+  COALESCE(EP.EVENTS_WITH_RETRIES, 0) AS EVENTS_WITH_RETRIES,
+  COALESCE(RP.TOTAL_RETRIES, 0) AS TOTAL_RETRIES,
+  COALESCE(RP.SUCCESSFUL_RETRIES, 0) AS SUCCESSFUL_RETRIES,
+
+  -- Retry rate
+  ROUND(COALESCE(EP.EVENTS_WITH_RETRIES, 0) * 100.0 / NULLIF(EP.TOTAL_EVENTS, 0), 2) AS RETRY_RATE
+
+FROM EVENT_TIME_SERIES_PARTIAL AS EP
+LEFT JOIN RETRY_TIME_SERIES_PARTIAL AS RP
+  ON EP.TRANSACTION_DATE = RP.RETRY_DATE
+  AND EP.TRANSACTION_HOUR = RP.RETRY_HOUR
+-- Solo horas con eventos, como en event_time_series.sql
+WHERE EP.TOTAL_EVENTS > 0
+ORDER BY EP.TRANSACTION_DATE, EP.TRANSACTION_HOUR
@@ -0,0 +1,74 @@
+-- Cubo horario de eventos: agregados sumables por
+-- (CLIENT_ID, TRANSACTION_DATE, TRANSACTION_HOUR, TYPE, STATUS, CURRENCY).
+-- Cualquier grano más grueso (día/semana/mes × subconjunto de dimensiones)
+-- se obtiene sumando estas filas (ver SQLAnalytics.query_cube)
+WITH EVENTS_PARTIAL AS (
+    SELECT
+        E.CLIENT_ID,
+        DATE(E.CREATED_AT) AS TRANSACTION_DATE,
+        EXTRACT(HOUR FROM E.CREATED_AT) AS TRANSACTION_HOUR,
+        E.TYPE,
+        E.STATUS,
+        E.CURRENCY,
+
+        COUNT(E.EVENT_ID) AS TOTAL_EVENTS,
+        SUM(E.AMOUNT) AS TOTAL_VOLUME,
+        COUNT(E.AMOUNT) AS AMOUNT_COUNT,
+
+        -- Delay (suma y conteo en lugar de AVG)
+        SUM(
+            CASE
+                WHEN E.COMPLETED_AT IS NOT NULL AND E.CREATED_AT IS NOT NULL
+                THEN EXTRACT(EPOCH FROM (E.COMPLETED_AT - E.CREATED_AT)) / 3600.0
+                ELSE NULL
+            END
+        ) AS DELAY_SUM,
+        COUNT(
+            CASE
+                WHEN E.COMPLETED_AT IS NOT NULL AND E.CREATED_AT IS NOT NULL THEN 1
+                ELSE NULL
+            END
+        ) AS DELAY_COUNT
+    FROM EVENTS_DELTA AS E
+    GROUP BY 1, 2, 3, 4, 5, 6
+),
+RETRY_PARTIAL AS (
+    -- Retries en la celda de su evento (no en la hora del retry)
+    SELECT
+        P.CLIENT_ID,
+        DATE(P.CREATED_AT) AS TRANSACTION_DATE,
+        EXTRACT(HOUR FROM P.CREATED_AT) AS TRANSACTION_HOUR,
+        P.TYPE,
+        P.STATUS,
+        P.CURRENCY,
+        COUNT(P.RETRY_ID) AS TOTAL_RETRIES,
+        SUM(CASE WHEN P.RETRY_STATUS = 'success' THEN 1 ELSE 0 END) AS SUCCESSFUL_RETRIES,
+        SUM(CASE WHEN P.RETRY_STATUS = 'failed' THEN 1 ELSE 0 END) AS FAILED_RETRIES,
+        COUNT(DISTINCT CASE WHEN P.IS_FIRST_RETRY_BATCH THEN P.EVENT_ID END) AS EVENTS_WITH_RETRIES
+    FROM RETRY_PAIRS_DELTA AS P
+    GROUP BY 1, 2, 3, 4, 5, 6
+)
+SELECT
+    COALESCE(EP.CLIENT_ID, RP.CLIENT_ID) AS CLIENT_ID,
+    COALESCE(EP.TRANSACTION_DATE, RP.TRANSACTION_DATE) AS TRANSACTION_DATE,
+    COALESCE(EP.TRANSACTION_HOUR, RP.TRANSACTION_HOUR) AS TRANSACTION_HOUR,
+    COALESCE(EP.TYPE, RP.TYPE) AS TYPE,
+    COALESCE(EP.STATUS, RP.STATUS) AS STATUS,
+    COALESCE(EP.CURRENCY, RP.CURRENCY) AS CURRENCY,
+    COALESCE(EP.TOTAL_EVENTS, 0) AS TOTAL_EVENTS,
+    EP.TOTAL_VOLUME,
+    COALESCE(EP.AMOUNT_COUNT, 0) AS AMOUNT_COUNT,
+    EP.DELAY_SUM,
+    COALESCE(EP.DELAY_COUNT, 0) AS DELAY_COUNT,
+    COALESCE(RP.TOTAL_RETRIES, 0) AS TOTAL_RETRIES,
+    COALESCE(RP.SUCCESSFUL_RETRIES, 0) AS SUCCESSFUL_RETRIES,
+    COALESCE(RP.FAILED_RETRIES, 0) AS FAILED_RETRIES,
+    COALESCE(RP.EVENTS_WITH_RETRIES, 0) AS EVENTS_WITH_RETRIES
+FROM EVENTS_PARTIAL AS EP
+FULL OUTER JOIN RETRY_PARTIAL AS RP
+    ON EP.CLIENT_ID = RP.CLIENT_ID
+    AND EP.TRANSACTION_DATE = RP.TRANSACTION_DATE
+    AND EP.TRANSACTION_HOUR = RP.TRANSACTION_HOUR
+    AND EP.TYPE = RP.TYPE
+    AND EP.STATUS = RP.STATUS
+    AND EP.CURRENCY = RP.CURRENCY
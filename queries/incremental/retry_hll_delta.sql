@@ -0,0 +1,20 @@
+-- Sketch HyperLogLog de eventos con retries por (CLIENT_ID, fecha, hora del
+-- evento): cada evento cae en un registro según su hash y guarda el rango
+-- del resto de los bits (ver SQLAnalytics._create_sketch_macros). Se mergea
+-- con MAX por registro, así un evento visto en varios batches o particiones
+-- se cuenta una sola vez (ver SQLAnalytics.query_sketches)
+WITH HASHED AS (
+    SELECT
+        P.CLIENT_ID AS CLIENT_ID,
+        P.CREATED_AT AS CREATED_AT,
+        hll_hash(P.EVENT_ID) AS H
+    FROM RETRY_PAIRS_DELTA AS P
+)
+SELECT
+    CLIENT_ID,
+    DATE(CREATED_AT) AS TRANSACTION_DATE,
+    EXTRACT(HOUR FROM CREATED_AT) AS TRANSACTION_HOUR,
+    hll_register(H) AS REGISTER,
+    MAX(hll_rank(H)) AS RANK
+FROM HASHED
+GROUP BY 1, 2, 3, 4
@@ -0,0 +1,46 @@
+-- Pares EVENTO ⋈ RETRY que aparecen en este batch: el evento es nuevo,
+-- el retry es nuevo, o ambos (sin contarlos dos veces)
+WITH PAIRS_DELTA AS (
+    SELECT
+        E.CLIENT_ID,
+        E.EVENT_ID,
+        E.CREATED_AT,
+        E.TYPE,
+        E.STATUS,
+        E.CURRENCY,
+        R.RETRY_ID,
+        R.RETRY_STATUS
+    FROM EVENTS_DELTA AS E
+    INNER JOIN RETRY_LOGS AS R
+        ON E.EVENT_ID = R.ORIGINAL_EVENT_ID
+
+    UNION ALL
+
+    SELECT
+        E.CLIENT_ID,
+        E.EVENT_ID,
+        E.CREATED_AT,
+        E.TYPE,
+        E.STATUS,
+        E.CURRENCY,
+        R.RETRY_ID,
+        R.RETRY_STATUS
+    FROM RETRY_LOGS_DELTA AS R
+    INNER JOIN EVENTS AS E
+        ON E.EVENT_ID = R.ORIGINAL_EVENT_ID
+    WHERE E.EVENT_ID NOT IN (SELECT EVENT_ID FROM EVENTS_DELTA)
+)
+SELECT
+    P.*,
+    -- El evento pasa a tener retries en este batch si es nuevo, o si no
+    -- tenía ningún retry previo: así EVENTS_WITH_RETRIES es sumable
+    (
+        P.EVENT_ID IN (SELECT EVENT_ID FROM EVENTS_DELTA)
+        OR NOT EXISTS (
+            SELECT 1
+            FROM RETRY_LOGS AS R
+            WHERE R.ORIGINAL_EVENT_ID = P.EVENT_ID
+              AND R.RETRY_ID NOT IN (SELECT RETRY_ID FROM RETRY_LOGS_DELTA)
+        )
+    ) AS IS_FIRST_RETRY_BATCH
+FROM PAIRS_DELTA AS P
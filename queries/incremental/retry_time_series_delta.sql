@@ -0,0 +1,10 @@
+-- Agregados parciales (sumables) por hora del retry
+SELECT
+  DATE(R.RETRY_TIME) AS RETRY_DATE,
+  EXTRACT(HOUR FROM R.RETRY_TIME) AS RETRY_HOUR,
+  COUNT(1) AS TOTAL_RETRIES,
+  SUM(
+      CASE WHEN R.RETRY_STATUS = 'success' THEN 1 ELSE 0 END
+  ) AS SUCCESSFUL_RETRIES
+FROM RETRY_LOGS_DELTA AS R
+GROUP BY 1,2
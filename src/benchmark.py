@@ -0,0 +1,177 @@
+# Stage Benchmark
+import argparse
+import contextlib
+import io
+import json
+import logging
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from datagen import generate
+from load import load_csv
+from metrics import PeakMemory
+from pipeline import DATASETS, DEFAULT_CHUNKSIZE, run_pipeline
+from sql_analytics import SQLAnalytics
+from transform import encode_uuid_keys, standardize_dates, deduplicate_logic
+
+
+# Sizes benchmarked by default (events; retries and clients scale with them)
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# Above this many events the in-memory stages are skipped: only the streaming
+# pipeline and the SQL queries run, which stay bounded in memory
+DEFAULT_IN_MEMORY_LIMIT = 10_000_000
+
+
+def raw_data(work_path: Path, n_events: int, seed: int = 0) -> Tuple[Path, Dict[str, int]]:
+    """
+    Synthetic raw CSVs of `n_events` events under `work_path`, generated once
+    per size and seed; returns the size directory (raw/ inside) and row counts.
+    """
+    size_path = work_path / f"events-{n_events}-seed-{seed}"
+    raw_path = size_path / 'raw'
+    counts_file = raw_path / 'counts.json'
+    if counts_file.exists():
+        return size_path, json.loads(counts_file.read_text())
+    print(f"[Benchmark] Generating {n_events:,} events in {raw_path}")
+    counts = generate(raw_path, n_events, seed=seed)
+    counts_file.write_text(json.dumps(counts))
+    return size_path, counts
+
+
+def time_stage(results: List[dict], size: int, stage: str, rows: int, fn: Callable, quiet: bool = True):
+    """Run `fn()`, append its timing and memory to `results` and return its result"""
+    output = io.StringIO() if quiet else None
+    with PeakMemory() as memory, contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+        start = time.perf_counter()
+        value = fn()
+        seconds = time.perf_counter() - start
+    results.append({
+        'size': size,
+        'stage': stage,
+        'rows': rows,
+        'seconds': round(seconds, 4),
+        'rows_per_sec': round(rows / seconds) if seconds > 0 else None,
+        'peak_rss_mb': round(memory.peak / 2 ** 20, 1),
+        'rss_delta_mb': round((memory.peak - memory.start) / 2 ** 20, 1)
+    })
+    return value
+
+
+def benchmark_size(
+    n_events: int,
+    work_path: Path,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    seed: int = 0,
+    in_memory_limit: int = DEFAULT_IN_MEMORY_LIMIT,
+    quiet: bool = True
+) -> List[dict]:
+    """
+    Purpose:
+      -> Benchmark one size of synthetic data (see datagen.generate):
+         1. In memory, per dataset: load_csv → encode_uuid_keys →
+            standardize_dates → deduplicate_logic → normalize_* (skipped
+            above `in_memory_limit`).
+         2. The streaming pipeline end to end (run_pipeline, `chunksize`).
+         3. Each analytics query of the registry, in dependency order, with
+            the result cache disabled.
+      -> Raw data is generated once per size and seed under `work_path` and
+         reused by later runs.
+    Returns:
+      -> One record per stage: rows, seconds, rows_per_sec, peak_rss_mb.
+    """
+    size_path, counts = raw_data(work_path, n_events, seed)
+    raw_path = size_path / 'raw'
+
+    if quiet:
+        for logger_name in ('load', 'transform', 'pipeline', 'sql_analytics'):
+            logging.getLogger(logger_name).setLevel(logging.WARNING)
+
+    results = []
+    if n_events <= in_memory_limit:
+        for name, config in DATASETS.items():
+            rows = counts[name]
+            df = time_stage(results, n_events, f"{name}.load_csv", rows,
+                            lambda: load_csv(config['file'], raw_path, schema=config['schema']), quiet)
+            df = time_stage(results, n_events, f"{name}.encode_uuid_keys", rows,
+                            lambda: encode_uuid_keys(df, config['uuid_columns'], name), quiet)
+            df = time_stage(results, n_events, f"{name}.standardize_dates", rows,
+                            lambda: standardize_dates(df, config['date_columns'], name), quiet)
+            df = time_stage(results, n_events, f"{name}.deduplicate_logic", rows,
+                            lambda: deduplicate_logic(df, config['subset'], config['sort_by'], name), quiet)
+            time_stage(results, n_events, f"{name}.{config['normalize'].__name__}", len(df),
+                       lambda: config['normalize'](df), quiet)
+            del df
+
+    processed_path = size_path / 'processed'
+    shutil.rmtree(processed_path, ignore_errors=True)
+    time_stage(results, n_events, 'run_pipeline', sum(counts.values()),
+               lambda: run_pipeline(raw_path, processed_path, chunksize), quiet)
+
+    analytics = SQLAnalytics(processed_path, size_path / 'analytics', use_cache=False)
+    try:
+        time_stage(results, n_events, 'sql.load_processed', counts['events'],
+                   analytics.load_processed_to_sql, quiet)
+        for name in analytics.registry.order:
+            success = time_stage(results, n_events, f"sql.{name}", counts['events'],
+                                 lambda: analytics.create_analytics_table(name), quiet)
+            if not success:
+                raise RuntimeError(f"Query '{name}' failed at {n_events:,} events")
+    finally:
+        analytics.close()
+    return results
+
+
+def format_results(results: List[dict]) -> str:
+    """Results as a fixed-width table, one line per size and stage"""
+    header = f"{'size':>12} {'stage':<42} {'rows':>12} {'seconds':>9} {'rows/sec':>12} {'peak MB':>9} {'Δ MB':>8}"
+    lines = [header, '-' * len(header)]
+    for r in results:
+        rate = f"{r['rows_per_sec']:,}" if r['rows_per_sec'] is not None else '-'
+        lines.append(
+            f"{r['size']:>12,} {r['stage']:<42} {r['rows']:>12,} {r['seconds']:>9.3f} "
+            f"{rate:>12} {r['peak_rss_mb']:>9.1f} {r['rss_delta_mb']:>8.1f}"
+        )
+    return '\n'.join(lines)
+
+
+def run_benchmark(
+    sizes: List[int],
+    work_path: Path,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    seed: int = 0,
+    in_memory_limit: int = DEFAULT_IN_MEMORY_LIMIT,
+    json_path: Optional[Path] = None,
+    quiet: bool = True
+) -> List[dict]:
+    """Benchmark every size, print the table and optionally write the records as JSON"""
+    results = []
+    for n_events in sizes:
+        results.extend(benchmark_size(n_events, work_path, chunksize, seed, in_memory_limit, quiet))
+    print(format_results(results))
+    if json_path is not None:
+        json_path.parent.mkdir(parents=True, exist_ok=True)
+        json_path.write_text(json.dumps(results, indent=2))
+        print(f"[Benchmark] Results → {json_path}")
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> List[dict]:
+    """Command line entry point: python src/benchmark.py --sizes 10000 1000000 --work /tmp/bench"""
+    parser = argparse.ArgumentParser(description="Time each ETL and SQL stage on synthetic data.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="events per run")
+    parser.add_argument('--work', type=Path, required=True, help="raw, processed and analytics per size")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--in-memory-limit', type=int, default=DEFAULT_IN_MEMORY_LIMIT)
+    parser.add_argument('--json', type=Path, default=None, help="write the records to this file")
+    parser.add_argument('--verbose', action='store_true', help="keep the output of every stage")
+    args = parser.parse_args(argv)
+    return run_benchmark(args.sizes, args.work, args.chunksize, args.seed, args.in_memory_limit,
+                         args.json, quiet=not args.verbose)
+
+
+if __name__ == '__main__':
+    main()
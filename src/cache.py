@@ -0,0 +1,97 @@
+# Result Cache
+import hashlib
+import json
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+
+# Default bound of the on-disk cache
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ResultCache:
+    """
+    Content-addressed cache of analytics results on disk.
+      -> An entry is keyed by the sha256 of the SQL text plus the fingerprints
+         of the input tables (see `key()`), so it is valid for as long as
+         neither the query nor its inputs change; nothing is ever invalidated.
+      -> Entries are files (the exported result) indexed in index.json with
+         their size and last use. When the total size goes over `max_bytes`
+         the least recently used entries are evicted.
+      -> Hits, misses and evictions are counted for the run report.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.index_file = path / 'index.json'
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        path.mkdir(parents=True, exist_ok=True)
+        self.index = json.loads(self.index_file.read_text()) if self.index_file.exists() else {}
+        # Drop entries whose file was removed by hand
+        self.index = {key: entry for key, entry in self.index.items() if (path / entry['file']).exists()}
+
+    @staticmethod
+    def key(sql: str, inputs: dict) -> str:
+        """sha256 of the SQL text and the (JSON-serializable) input fingerprints"""
+        payload = json.dumps({'sql': sql, 'inputs': inputs}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Path]:
+        """Path of the cached result, or None on a miss"""
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry['last_used'] = time.time()
+            self._save()
+            return self.path / entry['file']
+
+    def put(self, key: str, source: Path) -> Optional[Path]:
+        """Copy `source` into the cache under `key` (None if it cannot fit)"""
+        size = source.stat().st_size
+        if size > self.max_bytes:
+            return None
+        with self.lock:
+            name = f"{key}{source.suffix}"
+            tmp = self.path / (name + '.tmp')
+            shutil.copyfile(source, tmp)
+            tmp.replace(self.path / name)
+            self.index[key] = {'file': name, 'size': size, 'last_used': time.time()}
+            self._evict()
+            self._save()
+            return self.path / name
+
+    def _evict(self) -> None:
+        """Remove least recently used entries until the cache fits `max_bytes`"""
+        total = sum(entry['size'] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            entry = self.index.pop(key)
+            (self.path / entry['file']).unlink(missing_ok=True)
+            total -= entry['size']
+            self.evictions += 1
+
+    def _save(self) -> None:
+        tmp = self.index_file.with_name(self.index_file.name + '.tmp')
+        tmp.write_text(json.dumps(self.index, indent=2))
+        tmp.replace(self.index_file)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.index),
+                'bytes': sum(entry['size'] for entry in self.index.values())
+            }
@@ -0,0 +1,231 @@
+# Synthetic Data
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Optional
+
+from transform import ALLOWED_SECTORS, EVENT_STATUSES, EVENT_TYPES, RETRY_STATUSES, VALID_TIERS
+
+
+# Rows generated and appended per write (bounds memory for 100M+ events)
+DEFAULT_CHUNKSIZE = 1_000_000
+
+CURRENCIES = ['USD', 'EUR', 'COP', 'MXN']
+ERROR_CODES = ['TIMEOUT', 'BANK_REJECT', 'KYC_BLOCKED', 'LIMIT_EXCEEDED']
+COUNTRIES = [
+    'AR', 'BR', 'CL', 'CO', 'MX', 'PE', 'US', 'CA', 'ES', 'PT', 'FR', 'DE', 'IT', 'GB', 'NL',
+    'SE', 'LT', 'BA', 'ME', 'KZ', 'NZ', 'AE', 'BW', 'SN', 'SO', 'BH', 'JM', 'GY', 'CV', 'KG'
+]
+STATUS_WEIGHTS = [0.10, 0.15, 0.65, 0.10]
+
+# Dirt injected at `dirt` rate, mirroring what the normalize_* functions clean
+BAD_CURRENCIES = ['usd', 'Eur ', 'US', 'EURO', '$$$']
+BAD_COUNTRIES = ['co', 'XYZ', 'Colombia', '1']
+BAD_UUIDS = ['not-a-uuid', '1234', 'zzzzzzzz-zzzz-zzzz-zzzz-zzzzzzzzzzzz']
+SECTOR_DIRT = ['', 'unknown', 'Credit', ' RETAIL ', 'agro']
+TIER_DIRT = ['', 'Basic', 'PREMIUM ', 'gold']
+
+START = np.datetime64('2025-01-01T00:00')
+MINUTES = 151 * 24 * 60  # 2025-01-01 → 2025-05-31
+
+
+def random_uuids(rng: np.random.Generator, n: int) -> np.ndarray:
+    """n random version-4 UUID strings, built byte-wise without a Python loop"""
+    raw = rng.integers(0, 256, (n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    digits = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+    hex_chars = np.empty((n, 32), dtype=np.uint8)
+    hex_chars[:, 0::2] = digits[raw >> 4]
+    hex_chars[:, 1::2] = digits[raw & 0x0F]
+    text = np.full((n, 36), ord('-'), dtype=np.uint8)
+    for start, end, offset in ((0, 8, 0), (8, 12, 9), (12, 16, 14), (16, 20, 19), (20, 32, 24)):
+        text[:, offset:offset + end - start] = hex_chars[:, start:end]
+    return text.view('S36').ravel().astype('U36').astype(object)
+
+
+def _dirty(rng: np.random.Generator, values: np.ndarray, rate: float, choices: list) -> np.ndarray:
+    """Replace a `rate` fraction of `values` with random `choices`"""
+    mask = rng.random(len(values)) < rate
+    values = values.astype(object)
+    values[mask] = rng.choice(np.array(choices, dtype=object), mask.sum())
+    return values
+
+
+def _mixed_case(rng: np.random.Generator, values: np.ndarray, rate: float) -> np.ndarray:
+    """Upper-case or pad a `rate` fraction of `values` ('Completed', ' FAILED')"""
+    values = values.astype(object)
+    mask = rng.random(len(values)) < rate
+    upper = mask & (rng.random(len(values)) < 0.5)
+    values[upper] = np.char.upper(values[upper].astype(str)).astype(object)
+    padded = mask & ~upper
+    values[padded] = np.char.add(' ', np.char.capitalize(values[padded].astype(str))).astype(object)
+    return values
+
+
+def _null(rng: np.random.Generator, values: np.ndarray, rate: float) -> np.ndarray:
+    """Blank out a `rate` fraction of `values` (written as empty CSV fields)"""
+    values = values.astype(object)
+    values[rng.random(len(values)) < rate] = None
+    return values
+
+
+def generate_clients(rng: np.random.Generator, n_clients: int, dirt: float) -> pd.DataFrame:
+    """Clients with missing/unknown sectors, mixed-case tiers and punctuated names"""
+    ids = np.array([f"C{i:04d}" for i in range(n_clients)], dtype=object)
+    names = np.char.add(
+        rng.choice(['Levy', 'Miller', 'Rush', 'Sanders', 'Bell', 'Cox', 'Torres', 'Conley'], n_clients),
+        rng.choice([' PLC', ' and Sons', '-Bryant', ' Ltd', ', Ramos and Barrett', '_Group', '.Inc'], n_clients)
+    )
+    sign_up = START - rng.integers(0, 365, n_clients).astype('timedelta64[D]')
+    return pd.DataFrame({
+        'client_id': ids,
+        'client_name': names,
+        'sector': _dirty(rng, rng.choice(list(ALLOWED_SECTORS), n_clients), max(dirt, 0.2), SECTOR_DIRT),
+        'contract_tier': _dirty(rng, rng.choice(list(VALID_TIERS), n_clients), max(dirt, 0.15), TIER_DIRT),
+        'sign_up_date': np.datetime_as_string(sign_up.astype('datetime64[D]')),
+        'notes': _null(rng, rng.choice(['Key account', 'Form race left every determine.', 'Pilot'], n_clients), 0.5)
+    })
+
+
+def generate_events(
+    rng: np.random.Generator,
+    n: int,
+    n_clients: int,
+    dirt: float,
+    previous_ids: Optional[np.ndarray] = None
+) -> pd.DataFrame:
+    """
+    One chunk of events.
+      -> Dirt: bad currencies and countries, mixed-case type/status, failed
+         events without error_code, null keys and duplicate event_ids (copies
+         of rows of this chunk or of `previous_ids`, so duplicates also cross
+         chunk boundaries).
+    """
+    created = START + rng.integers(0, MINUTES, n).astype('timedelta64[m]')
+    status = rng.choice(EVENT_STATUSES, n, p=STATUS_WEIGHTS).astype(object)
+    done = np.isin(status, ['completed', 'failed'])
+    completed = created + rng.exponential(45, n).astype('timedelta64[m]')
+    error_code = np.where(status == 'failed', rng.choice(ERROR_CODES, n), None).astype(object)
+    error_code[(status == 'failed') & (rng.random(n) < dirt * 5)] = None
+
+    df = pd.DataFrame({
+        'event_id': _null(rng, random_uuids(rng, n), dirt / 10),
+        'client_id': _null(rng, np.char.add('C', np.char.zfill(rng.integers(0, n_clients, n).astype(str), 4)), dirt / 10),
+        'type': _mixed_case(rng, rng.choice(EVENT_TYPES, n), dirt),
+        'amount': np.round(rng.uniform(10, 10_000, n), 2),
+        'currency': _dirty(rng, rng.choice(CURRENCIES, n), dirt, BAD_CURRENCIES),
+        'status': _mixed_case(rng, status, dirt),
+        'error_code': error_code,
+        'created_at': pd.Series(created).where(rng.random(n) >= dirt / 10),
+        'completed_at': pd.Series(completed).where(done),
+        'origin_country': _dirty(rng, rng.choice(COUNTRIES, n), dirt, BAD_COUNTRIES),
+        'destination_country': _dirty(rng, rng.choice(COUNTRIES, n), dirt, BAD_COUNTRIES)
+    })
+
+    # Duplicate event_ids: later copies of earlier rows
+    n_dup = min(int(n * dirt), n - 1)
+    if n_dup:
+        df = df.iloc[:n - n_dup]
+        dup = df.sample(n_dup, random_state=int(rng.integers(2 ** 31)), replace=True).copy()
+        if previous_ids is not None and len(previous_ids):
+            cross = rng.random(n_dup) < 0.5
+            dup.loc[cross, 'event_id'] = rng.choice(previous_ids, cross.sum())
+        dup['created_at'] = dup['created_at'] + pd.to_timedelta(rng.integers(0, 120, n_dup), unit='m')
+        df = pd.concat([df, dup], ignore_index=True)
+    return df
+
+
+def generate_retries(rng: np.random.Generator, events: pd.DataFrame, ratio: float, dirt: float) -> pd.DataFrame:
+    """
+    Retries for a `ratio` of the failed/completed events of a chunk.
+      -> Dirt: malformed UUIDs, null keys, attempts out of 1-3, mixed-case
+         statuses, duplicate retry_ids and orphans (unknown original_event_id).
+    """
+    source = events[events['event_id'].notna() & events['created_at'].notna()]
+    n = int(len(events) * ratio)
+    if source.empty or not n:
+        return pd.DataFrame(columns=['retry_id', 'original_event_id', 'retry_attempt', 'retry_status', 'retry_time'])
+    picks = source.iloc[rng.integers(0, len(source), n)]
+    original = picks['event_id'].to_numpy(dtype=object)
+    orphans = rng.random(n) < dirt
+    original[orphans] = random_uuids(rng, int(orphans.sum()))
+
+    attempt = rng.integers(1, 4, n).astype(object)
+    bad_attempt = rng.random(n) < dirt
+    attempt[bad_attempt] = rng.choice(np.array([0, 4, 'x'], dtype=object), bad_attempt.sum())
+    df = pd.DataFrame({
+        'retry_id': _dirty(rng, random_uuids(rng, n), dirt / 2, BAD_UUIDS),
+        'original_event_id': _null(rng, _dirty(rng, original, dirt / 2, BAD_UUIDS), dirt / 10),
+        'retry_attempt': attempt,
+        'retry_status': _mixed_case(rng, rng.choice(RETRY_STATUSES, n), dirt),
+        'retry_time': picks['created_at'].to_numpy() + rng.integers(1, 600, n).astype('timedelta64[m]')
+    })
+    n_dup = min(int(n * dirt), n - 1)
+    if n_dup:
+        df = df.iloc[:n - n_dup]
+        dup = df.sample(n_dup, random_state=int(rng.integers(2 ** 31)), replace=True)
+        df = pd.concat([df, dup], ignore_index=True)
+    return df
+
+
+def generate(
+    raw_path: Path,
+    n_events: int,
+    n_clients: Optional[int] = None,
+    retry_ratio: float = 0.1,
+    dirt: float = 0.01,
+    seed: int = 0,
+    chunksize: int = DEFAULT_CHUNKSIZE
+) -> dict:
+    """
+    Purpose:
+      -> Write clients.csv, events.csv and retry_logs.csv to `raw_path` with
+         the raw schemas and the dirt the ETL cleans, for any size (10k to
+         100M+ events): events and retries are generated and appended in
+         chunks of `chunksize`, so memory does not grow with `n_events`.
+      -> `dirt` is the base rate of each kind of dirt; the output is
+         deterministic for a given `seed`.
+    Returns:
+      -> Rows written per file.
+    """
+    rng = np.random.default_rng(seed)
+    raw_path.mkdir(parents=True, exist_ok=True)
+    n_clients = n_clients or max(60, n_events // 250)
+
+    clients = generate_clients(rng, n_clients, dirt)
+    clients.to_csv(raw_path / 'clients.csv', index=False)
+
+    counts = {'clients': len(clients), 'events': 0, 'retry_logs': 0}
+    previous_ids = None
+    for offset in range(0, n_events, chunksize):
+        n = min(chunksize, n_events - offset)
+        events = generate_events(rng, n, n_clients, dirt, previous_ids)
+        retries = generate_retries(rng, events, retry_ratio, dirt)
+        first = offset == 0
+        events.to_csv(raw_path / 'events.csv', mode='w' if first else 'a', header=first, index=False)
+        retries.to_csv(raw_path / 'retry_logs.csv', mode='w' if first else 'a', header=first, index=False)
+        previous_ids = events['event_id'].dropna().to_numpy()[:10_000]
+        counts['events'] += len(events)
+        counts['retry_logs'] += len(retries)
+        print(f"[Datagen] {counts['events']:,}/{n_events:,} events, {counts['retry_logs']:,} retries")
+    return counts
+
+
+def main(argv=None) -> dict:
+    """Command line entry point: python src/datagen.py --events 10000000 --out /tmp/raw"""
+    parser = argparse.ArgumentParser(description="Generate synthetic raw CSVs with realistic dirt.")
+    parser.add_argument('--events', type=int, required=True)
+    parser.add_argument('--out', type=Path, required=True)
+    parser.add_argument('--clients', type=int, default=None)
+    parser.add_argument('--retry-ratio', type=float, default=0.1)
+    parser.add_argument('--dirt', type=float, default=0.01)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args(argv)
+    return generate(args.out, args.events, args.clients, args.retry_ratio, args.dirt, args.seed, args.chunksize)
+
+
+if __name__ == '__main__':
+    main()
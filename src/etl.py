@@ -0,0 +1,339 @@
+# ETL Runner
+import argparse
+import logging
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from load import csv_byte_ranges, load_csv_range
+from metrics import RunMetrics, measure, measure_frame, measure_iter
+from pipeline import (
+    DATASETS,
+    DEFAULT_CHUNKSIZE,
+    ORPHAN_ACTIONS,
+    PROCESSED_FORMATS,
+    STREAMABLE,
+    ProcessedWriter,
+    load_processed_keys,
+    process_dataset,
+    read_processed_column,
+    read_spill,
+    run_pipeline,
+    spill_by_key,
+    stream_dataset
+)
+from transform import (
+    standardize_dates,
+    deduplicate_logic,
+    encode_uuid_keys,
+    cross_reference_retries,
+    report_stats
+)
+from transform_sql import run_duckdb
+
+
+# Transform engines selectable per run: pandas (run_pipeline / run_parallel)
+# or DuckDB SQL over the raw CSVs (transform_sql.run_duckdb)
+ENGINES = ('pandas', 'duckdb')
+
+# Raw byte range parsed by one task of the split phase (bounds its memory)
+MAX_RANGE_BYTES = 64 * 1024 * 1024
+
+BASE_PATH = Path(__file__).resolve().parents[1]
+
+logger = logging.getLogger(__name__)
+
+
+def _merge_stats(results: List[dict]) -> dict:
+    """Sum the counters returned by several tasks"""
+    merged = {}
+    for stats in results:
+        for key, value in stats.items():
+            merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def _measured(measured: bool, fn: Callable, *args) -> Tuple[dict, Optional[dict]]:
+    """
+    Run `fn(*args)` in a worker process, with its own RunMetrics when
+    `measured`; returns the result and the stages it recorded
+    """
+    metrics = RunMetrics() if measured else None
+    result = fn(*args, metrics=metrics)
+    return result, metrics.stages if metrics is not None else None
+
+
+def _collect(future, metrics: Optional[RunMetrics]) -> dict:
+    """Result of a _measured task, merging its stages into `metrics`"""
+    result, stages = future.result()
+    if metrics is not None and stages:
+        metrics.merge(stages)
+    return result
+
+
+def run_dataset(
+    name: str,
+    raw_path: Path,
+    processed_path: Path,
+    chunksize: Optional[int],
+    fmt: str,
+    orphans: Optional[str],
+    metrics: Optional[RunMetrics] = None
+) -> dict:
+    """One dataset end to end in a single process (streaming when possible)"""
+    if chunksize is not None and name in STREAMABLE:
+        return stream_dataset(name, raw_path, processed_path, chunksize, fmt, orphans, metrics)
+    return process_dataset(name, raw_path, processed_path, fmt, orphans, metrics)
+
+
+def split_range(
+    name: str,
+    raw_path: Path,
+    columns: List[str],
+    start: int,
+    end: int,
+    range_id: int,
+    n_shards: int,
+    spill_path: Path,
+    chunksize: Optional[int],
+    metrics: Optional[RunMetrics] = None
+) -> dict:
+    """
+    Purpose:
+      -> Split phase of a sharded run: parse one byte range of the raw CSV,
+         encode its UUID keys, standardize its dates and spill every chunk to the shard of its key
+         (hash of event_id % n_shards), so all copies of a key meet in one shard.
+      -> Spill files are named range-<range>-<chunk>.pkl; reading them in name
+         order restores the input order inside each shard.
+    Returns:
+      -> Counters of the range ('rows_in', UUID and date counters).
+    """
+    config = DATASETS[name]
+    key = config['subset'][0]
+    stats = {'rows_in': 0}
+    chunks = measure_iter(metrics, f"{name}.load_csv",
+                          load_csv_range(config['file'], raw_path, columns, start, end, chunksize,
+                                         config['schema']))
+    for part, chunk in enumerate(chunks):
+        stats['rows_in'] += len(chunk)
+        chunk = measure_frame(metrics, f"{name}.encode_uuid_keys", encode_uuid_keys,
+                              chunk, config['uuid_columns'], name, stats=stats)
+        chunk = measure_frame(metrics, f"{name}.standardize_dates", standardize_dates,
+                              chunk, config['date_columns'], name, stats=stats)
+        with measure(metrics, f"{name}.spill", len(chunk)):
+            spill_by_key(chunk, key, n_shards, spill_path, f"range-{range_id:05d}-{part:05d}")
+    return stats
+
+
+def process_shard(
+    name: str,
+    processed_path: Path,
+    shard: int,
+    spill_path: Path,
+    chunksize: Optional[int],
+    metrics: Optional[RunMetrics] = None
+) -> dict:
+    """
+    Purpose:
+      -> Shard phase of a sharded run: dedup the shard with keep-earliest
+         (exact, since every copy of its keys is here), normalize it and write
+         it to the staging path of the dataset as part-s<shard>-... files.
+    Returns:
+      -> Counters of the shard, including 'rows_out'.
+    """
+    config = DATASETS[name]
+    stats = {}
+    with measure(metrics, f"{name}.read_spill") as record:
+        df = read_spill(spill_path, shard)
+        record['rows_out'] = 0 if df is None else len(df)
+    if df is None:
+        return stats
+    df = measure_frame(metrics, f"{name}.deduplicate_logic", deduplicate_logic,
+                       df, config['subset'], config['sort_by'], name, stats=stats, preserve_order=True)
+
+    writer = ProcessedWriter(name, processed_path, 'parquet', shard=shard)
+    size = chunksize or max(len(df), 1)
+    for offset in range(0, len(df), size):
+        chunk = measure_frame(metrics, f"{name}.{config['normalize'].__name__}", config['normalize'],
+                              df.iloc[offset:offset + size], stats=stats)
+        with measure(metrics, f"{name}.write", len(chunk)):
+            writer.write(chunk)
+    stats['rows_out'] = writer.rows
+    return stats
+
+
+def run_sharded(
+    pool: ProcessPoolExecutor,
+    name: str,
+    raw_path: Path,
+    processed_path: Path,
+    n_shards: int,
+    chunksize: Optional[int] = DEFAULT_CHUNKSIZE,
+    metrics: Optional[RunMetrics] = None
+) -> dict:
+    """
+    Purpose:
+      -> Process a streamable dataset across the processes of `pool`:
+         1. Split: the raw CSV is cut into line-aligned byte ranges; each task
+            parses one range and spills its rows by key hash into `n_shards`.
+         2. Shards: each task dedups, normalizes and writes one shard.
+         3. Merge: the staged dataset is committed once every shard succeeded.
+      -> The merge is deterministic: shard membership depends only on the key,
+         rows keep input order inside a shard and files are named by shard,
+         so the same input gives the same files for any number of workers.
+      -> With `metrics`, the stages of every task are merged into it and the
+         whole dataset is recorded as stage '<name>'.
+    Returns:
+      -> Counters summed over every task.
+    """
+    config = DATASETS[name]
+    size = (raw_path / config['file']).stat().st_size
+    n_ranges = max(n_shards, -(-size // MAX_RANGE_BYTES))
+    columns, ranges = csv_byte_ranges(config['file'], raw_path, n_ranges)
+
+    processed_path.mkdir(parents=True, exist_ok=True)
+    spill_path = processed_path / f".spill-{name}"
+    shutil.rmtree(spill_path, ignore_errors=True)
+    writer = ProcessedWriter(name, processed_path, 'parquet')
+    measured = metrics is not None
+    with measure(metrics, name) as record:
+        try:
+            split = [
+                pool.submit(_measured, measured, split_range, name, raw_path, columns, start, end, i,
+                            n_shards, spill_path, chunksize)
+                for i, (start, end) in enumerate(ranges)
+            ]
+            stats = _merge_stats([_collect(future, metrics) for future in split])
+            shards = [
+                pool.submit(_measured, measured, process_shard, name, processed_path, shard, spill_path, chunksize)
+                for shard in range(n_shards)
+            ]
+            stats = _merge_stats([stats] + [_collect(future, metrics) for future in shards])
+            output = writer.commit()
+        except Exception:
+            writer.rollback()
+            raise
+        finally:
+            shutil.rmtree(spill_path, ignore_errors=True)
+        record.update(rows_in=stats.get('rows_in'), rows_out=stats.get('rows_out', 0), counters=dict(stats),
+                      shards=n_shards, ranges=len(ranges))
+
+    report_stats(stats, name)
+    logger.info(f"[Parallel] {name}: {stats.get('rows_out', 0)} rows in {n_shards} shards "
+                f"({len(ranges)} ranges) → {output}")
+    return stats
+
+
+def report_orphans(processed_path: Path, fmt: str = 'parquet', metrics: Optional[RunMetrics] = None) -> dict:
+    """Count processed retries whose original_event_id is not a processed event"""
+    stats = {}
+    with measure(metrics, 'retry_logs.check_orphans', stats=stats) as record:
+        df = read_processed_column('retry_logs', 'original_event_id', processed_path, fmt).to_frame()
+        cross_reference_retries(df, load_processed_keys('events', processed_path, fmt), stats=stats)
+        record['rows_in'] = len(df)
+    return stats
+
+
+def run_parallel(
+    raw_path: Path,
+    processed_path: Path,
+    chunksize: Optional[int] = DEFAULT_CHUNKSIZE,
+    fmt: str = 'parquet',
+    orphans: Optional[str] = 'report',
+    workers: Optional[int] = None,
+    shards: Optional[int] = None,
+    metrics: Optional[RunMetrics] = None
+) -> dict:
+    """
+    Purpose:
+      -> Run the three dataset pipelines at the same time on a process pool of
+         `workers` processes (default: every core). They do not depend on each
+         other until analytics, except for the orphan check of retry logs.
+      -> Events are sharded across the pool by event_id hash (see run_sharded);
+         `shards` defaults to `workers`. The dedup key is event_id rather
+         than client_id, so every copy of an event lands in the same shard.
+      -> Sharded writes need the Parquet layer; with fmt='csv' events run as
+         one streaming task.
+      -> `orphans`: 'report' counts them after both datasets are written;
+         'quarantine' runs retry logs after events; None skips the check.
+      -> `metrics` receives the stages recorded inside every worker process.
+    Returns:
+      -> Counters per dataset.
+    """
+    if fmt not in PROCESSED_FORMATS:
+        raise ValueError(f"Unknown processed format '{fmt}'. Options: {list(PROCESSED_FORMATS)}")
+    if orphans is not None and orphans not in ORPHAN_ACTIONS:
+        raise ValueError(f"Unknown orphan action '{orphans}'. Options: {list(ORPHAN_ACTIONS)}")
+    workers = workers or os.cpu_count() or 1
+    shards = shards or workers
+    processed_path.mkdir(parents=True, exist_ok=True)
+    results = {}
+
+    measured = metrics is not None
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        clients = pool.submit(_measured, measured, run_dataset, 'clients', raw_path, processed_path,
+                              chunksize, fmt, None)
+        retries = None
+        if orphans != 'quarantine':
+            retries = pool.submit(_measured, measured, run_dataset, 'retry_logs', raw_path, processed_path,
+                                  chunksize, fmt, None)
+
+        if fmt == 'parquet' and shards > 1:
+            results['events'] = run_sharded(pool, 'events', raw_path, processed_path, shards, chunksize, metrics)
+        else:
+            results['events'] = _collect(pool.submit(
+                _measured, measured, run_dataset, 'events', raw_path, processed_path, chunksize, fmt, None
+            ), metrics)
+
+        if retries is None:
+            retries = pool.submit(_measured, measured, run_dataset, 'retry_logs', raw_path, processed_path,
+                                  chunksize, fmt, orphans)
+        results['retry_logs'] = _collect(retries, metrics)
+        results['clients'] = _collect(clients, metrics)
+
+    if orphans == 'report':
+        results['retry_logs'].update(report_orphans(processed_path, fmt, metrics))
+        logger.info(f"[Parallel] retry_logs: {results['retry_logs']['orphan_retries']} orphan retries")
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    """Command line entry point: python src/etl.py --workers 32"""
+    parser = argparse.ArgumentParser(description="Run the ETL from data/raw to the processed layer.")
+    parser.add_argument('--raw', type=Path, default=BASE_PATH / 'data' / 'raw')
+    parser.add_argument('--processed', type=Path, default=BASE_PATH / 'data' / 'processed')
+    parser.add_argument('--format', choices=PROCESSED_FORMATS, default='parquet')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE,
+                        help="rows per chunk (0 processes each dataset as one frame)")
+    parser.add_argument('--orphans', choices=ORPHAN_ACTIONS + ('none',), default='report')
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processes, or DuckDB threads (default: every core; 1 runs sequentially)")
+    parser.add_argument('--shards', type=int, default=None,
+                        help="event shards (default: --workers)")
+    parser.add_argument('--engine', choices=ENGINES, default='pandas')
+    parser.add_argument('--memory-limit', default=None,
+                        help="DuckDB engine: memory before spilling to disk (e.g. 8GB)")
+    parser.add_argument('--metrics', type=Path, default=None,
+                        help="write the stage metrics of the run as JSON in this directory")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    chunksize = args.chunksize or None
+    orphans = None if args.orphans == 'none' else args.orphans
+    metrics = RunMetrics('etl') if args.metrics is not None else None
+    if args.engine == 'duckdb':
+        results = run_duckdb(args.raw, args.processed, args.format, orphans, args.workers, args.memory_limit, metrics)
+    elif args.workers == 1:
+        results = run_pipeline(args.raw, args.processed, chunksize, args.format, orphans, metrics)
+    else:
+        results = run_parallel(args.raw, args.processed, chunksize, args.format, orphans, args.workers,
+                               args.shards, metrics)
+    if metrics is not None:
+        logger.info(f"[Metrics] {metrics.write(args.metrics)}")
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,362 @@
 # Functions Load
+import csv
+import io
+import logging
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
 
 
-def load_csv(file_name: str, base_path: Path) -> pd.DataFrame:
+NA_VALUES = ['', 'NULL', 'null', 'NaN', 'nan']
+
+# Low-cardinality text: parsed dictionary-encoded, loaded as pandas Categorical
+CODE = pa.dictionary(pa.int32(), pa.string())
+
+# Declared raw schema per dataset: only these columns are parsed (the rest,
+# like clients 'notes', is pruned at parse time), each with its own type.
+# Dates and retry_attempt stay text: standardize_dates and the normalizers
+# parse them and count what does not parse instead of failing the load.
+RAW_SCHEMAS: Dict[str, Dict[str, pa.DataType]] = {
+    'clients': {
+        'client_id': pa.string(),
+        'client_name': pa.string(),
+        'sector': CODE,
+        'contract_tier': CODE,
+        'sign_up_date': pa.string()
+    },
+    'events': {
+        'event_id': pa.string(),
+        'client_id': CODE,
+        'type': CODE,
+        'amount': pa.float64(),
+        'currency': CODE,
+        'status': CODE,
+        'error_code': CODE,
+        'created_at': pa.string(),
+        'completed_at': pa.string(),
+        'origin_country': CODE,
+        'destination_country': CODE
+    },
+    'retry_logs': {
+        'retry_id': pa.string(),
+        'original_event_id': pa.string(),
+        'retry_attempt': pa.string(),
+        'retry_status': CODE,
+        'retry_time': pa.string()
+    }
+}
+
+# Bytes per parse block; blocks are parsed in parallel by Arrow's thread pool
+BLOCK_SIZE = 8 << 20
+
+# Bytes handed to one streaming reader: Arrow reads its source ahead of the
+# consumer, so a longer byte range is parsed in pieces of at most this size
+MAX_READ_BYTES = 64 << 20
+
+logger = logging.getLogger(__name__)
+
+Schema = Optional[Dict[str, pa.DataType]]
+
+
+class CSVSchemaError(ValueError):
+    """
+    A CSV that does not match its declared schema
+    - `errors` maps each offending column to what was wrong with it
+      (missing from the header, or values that do not convert to its type)
+    """
+
+    def __init__(self, file_name: str, errors: Dict[str, str]):
+        self.file_name = file_name
+        self.errors = errors
+        details = '; '.join(f"'{column}': {error}" for column, error in errors.items())
+        super().__init__(f"Schema errors in {file_name}: {details}")
+
+
+def load_csv(
+    file_name: str,
+    base_path: Path,
+    chunksize: Optional[int] = None,
+    schema: Schema = None
+) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
     """
     Upload a CSV from the local path
-    - Verifies file existence  
-    - Handles read and parse errors
+    - Verifies file existence
+    - Parses with Arrow's multithreaded reader; with a declared `schema`
+      (see RAW_SCHEMAS) only its columns are read, each with its pinned type,
+      and columns that are missing or do not convert raise CSVSchemaError
+    - Without `schema`, every column is read with inferred types
     - Reports upload summary
+    - With `chunksize`, returns an iterator of DataFrames of at most
+      `chunksize` rows instead of a single frame (streaming mode)
     """
     path = base_path / file_name
     if not path.exists():
         raise FileNotFoundError(f"File not found: {path}")
+    with open(path, newline='') as f:
+        header = next(csv.reader(f), [])
+    _check_header(file_name, header, schema)
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=BLOCK_SIZE)
+    if chunksize is not None:
+        return _iter_csv_chunks([(file_name, lambda: path)], file_name, read_options, schema, chunksize)
     try:
-        df = pd.read_csv(path, na_values=['', 'NULL', 'null', 'NaN', 'nan'], keep_default_na=False)
-        print(f"[Load CSV] Cargado {file_name}: {df.shape[0]} rows, {df.shape[1]} columns.")
-        return df
-    except Exception as e:
-        raise RuntimeError(f"Error reading {file_name}: {e}")
+        table = pa_csv.read_csv(path, read_options=read_options, convert_options=_convert_options(schema))
+    except pa.ArrowInvalid as e:
+        raise _read_error(lambda: path, file_name, read_options, schema, e) from e
+    df = _to_pandas(table, 0)
+    logger.info(f"[Load CSV] Cargado {file_name}: {df.shape[0]} rows, {df.shape[1]} columns.")
+    return df
+
+
+def _iter_csv_chunks(
+    sources: List[Tuple[str, Callable[[], object]]],
+    file_name: str,
+    read_options: pa_csv.ReadOptions,
+    schema: Schema,
+    chunksize: int
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield chunks of exactly `chunksize` rows (the last one shorter) from
+    Arrow's streaming reader over each (name, source) of `sources` in turn,
+    with the same NA handling and error reporting as the single-frame path
+    (errors name the source). The index runs on across chunks and sources,
+    like pd.read_csv(chunksize=...).
+    """
+    rows = 0
+    n_chunks = 0
+    pending, pending_rows = [], 0
+    for source_name, source in sources:
+        try:
+            reader = pa_csv.open_csv(source(), read_options=read_options, convert_options=_convert_options(schema))
+            for batch in reader:
+                while batch.num_rows:
+                    take = min(chunksize - pending_rows, batch.num_rows)
+                    pending.append(batch.slice(0, take))
+                    pending_rows += take
+                    batch = batch.slice(take)
+                    if pending_rows == chunksize:
+                        yield _to_pandas(pa.Table.from_batches(pending), rows)
+                        rows += pending_rows
+                        n_chunks += 1
+                        pending, pending_rows = [], 0
+        except pa.ArrowInvalid as e:
+            raise _read_error(source, source_name, read_options, schema, e) from e
+    if pending_rows:
+        yield _to_pandas(pa.Table.from_batches(pending), rows)
+        rows += pending_rows
+        n_chunks += 1
+    logger.info(f"[Load CSV] Streamed {file_name}: {rows} rows in {n_chunks} chunks of ≤{chunksize}.")
+
+
+def _convert_options(schema: Schema) -> pa_csv.ConvertOptions:
+    """Arrow conversion: load_csv NA strings, and with `schema` only its columns at its types"""
+    if schema is None:
+        return pa_csv.ConvertOptions(null_values=NA_VALUES, strings_can_be_null=True)
+    return pa_csv.ConvertOptions(
+        column_types=schema,
+        include_columns=list(schema),
+        null_values=NA_VALUES,
+        strings_can_be_null=True
+    )
+
+
+def _to_pandas(table: pa.Table, start: int) -> pd.DataFrame:
+    """Arrow table → DataFrame indexed from `start`, releasing Arrow buffers as columns convert"""
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    df.index = pd.RangeIndex(start, start + len(df))
+    return df
+
+
+def _check_header(file_name: str, header: List[str], schema: Schema) -> None:
+    """Raise CSVSchemaError for declared columns the CSV does not have"""
+    missing = [column for column in (schema or {}) if column not in header]
+    if missing:
+        raise CSVSchemaError(file_name, {column: "missing from the header" for column in missing})
+
+
+def _read_error(
+    source: Callable[[], object],
+    file_name: str,
+    read_options: pa_csv.ReadOptions,
+    schema: Schema,
+    error: Exception
+) -> Exception:
+    """
+    Error to raise for a failed parse: CSVSchemaError naming every numeric
+    column with values that do not convert to its pinned type (how many, and
+    the first one with its data row), or a ValueError for malformed rows.
+    """
+    typed = {
+        column: dtype for column, dtype in (schema or {}).items()
+        if pa.types.is_integer(dtype) or pa.types.is_floating(dtype)
+    }
+    if not typed:
+        return ValueError(f"Error reading {file_name}: {error}")
+
+    # Re-read only the typed columns as text and convert each one on its own
+    options = pa_csv.ConvertOptions(
+        column_types={column: pa.string() for column in typed},
+        include_columns=list(typed),
+        null_values=NA_VALUES,
+        strings_can_be_null=True
+    )
+    invalid = {column: 0 for column in typed}
+    first = {}
+    row = 0
+    try:
+        for batch in pa_csv.open_csv(source(), read_options=read_options, convert_options=options):
+            for column, dtype in typed.items():
+                text = batch.column(column)
+                try:
+                    text.cast(dtype)
+                    continue
+                except pa.ArrowInvalid:
+                    text = text.to_pandas()
+                # Values Arrow rejects: the ones that are not numbers (or not
+                # whole numbers for integer types)
+                converted = pd.to_numeric(text, errors='coerce')
+                if pa.types.is_integer(dtype):
+                    converted = converted.where(converted % 1 == 0)
+                bad = text.notna() & converted.isna()
+                if bad.any():
+                    invalid[column] += int(bad.sum())
+                    if column not in first:
+                        position = int(bad.to_numpy().argmax())
+                        first[column] = (text.iloc[position], row + position + 1)
+            row += batch.num_rows
+    except pa.ArrowInvalid:
+        # Malformed rows: not a column error
+        return ValueError(f"Error reading {file_name}: {error}")
+    errors = {
+        column: f"{count} value(s) not {typed[column]}, first {first[column][0]!r} at data row {first[column][1]}"
+        for column, count in invalid.items() if count
+    }
+    if not errors:
+        return ValueError(f"Error reading {file_name}: {error}")
+    return CSVSchemaError(file_name, errors)
+
+
+def csv_byte_ranges(file_name: str, base_path: Path, n_ranges: int) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """
+    Split a CSV into `n_ranges` byte ranges aligned to line starts, so each
+    range can be parsed by a different process (see load_csv_range)
+    - Returns the header columns and the (start, end) offsets of the data rows
+    - Assumes no quoted field spans several lines (true for events and retry logs)
+    """
+    path = base_path / file_name
+    if not path.exists():
+        raise FileNotFoundError(f"File not found: {path}")
+    size = path.stat().st_size
+    with open(path, 'rb') as f:
+        header = f.readline()
+        data_start = f.tell()
+        bounds = [data_start]
+        for i in range(1, n_ranges):
+            f.seek(max(data_start + (size - data_start) * i // n_ranges - 1, bounds[-1]))
+            f.readline()
+            bounds.append(min(max(f.tell(), bounds[-1]), size))
+        bounds.append(size)
+    columns = pd.read_csv(io.BytesIO(header), nrows=0).columns.tolist()
+    ranges = [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+    return columns, ranges
+
+
+def csv_unread_range(file_name: str, base_path: Path, offset: Optional[int] = None) -> Tuple[List[str], int, int]:
+    """
+    Header columns and the (start, end) byte range of the rows of an
+    append-only CSV that come after `offset` (None: from the first data row)
+    - `end` is just past the last newline, so a row still being written is
+      left for the next read
+    - Raises ValueError if `offset` is past the end of the file or not at the
+      start of a row (the file was rewritten, not appended to)
+    """
+    path = base_path / file_name
+    if not path.exists():
+        raise FileNotFoundError(f"File not found: {path}")
+    size = path.stat().st_size
+    with open(path, 'rb') as f:
+        header = f.readline()
+        start = f.tell() if offset is None else offset
+        if start > size:
+            raise ValueError(f"{file_name} is shorter ({size} bytes) than its consumed offset {start}")
+        if start > len(header):
+            f.seek(start - 1)
+            if f.read(1) != b'\n':
+                raise ValueError(f"Offset {start} of {file_name} is not at the start of a row")
+        # Back from the end of the file to the last complete row
+        end = position = size
+        while position > start:
+            block = min(1 << 16, position - start)
+            f.seek(position - block)
+            newline = f.read(block).rfind(b'\n')
+            if newline >= 0:
+                end = position - block + newline + 1
+                break
+            position -= block
+        else:
+            end = start
+    columns = pd.read_csv(io.BytesIO(header), nrows=0).columns.tolist()
+    return columns, start, end
+
+
+def load_csv_range(
+    file_name: str,
+    base_path: Path,
+    columns: List[str],
+    start: int,
+    end: int,
+    chunksize: Optional[int] = None,
+    schema: Schema = None
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the rows of one byte range of a CSV (see csv_byte_ranges) in chunks
+    of at most `chunksize` rows, with the same NA handling, schema and error
+    reporting as load_csv
+    - The range is streamed from the file in line-aligned pieces of at most
+      MAX_READ_BYTES, never held whole, so memory follows `chunksize` and not
+      the size of the range
+    """
+    path = base_path / file_name
+    _check_header(file_name, columns, schema)
+    if end <= start:
+        return
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=BLOCK_SIZE, column_names=columns)
+    with open(path, 'rb') as f:
+        sources = [
+            (f"{file_name} [{piece_start}:{piece_end}]", lambda s=piece_start, e=piece_end: _FileRange(f, s, e))
+            for piece_start, piece_end in _split_range(f, start, end, MAX_READ_BYTES)
+        ]
+        yield from _iter_csv_chunks(sources, f"{file_name} [{start}:{end}]",
+                                    read_options, schema, chunksize or end - start)
+
+
+def _split_range(f, start: int, end: int, max_bytes: int) -> List[Tuple[int, int]]:
+    """Bytes `start` to `end` of the open binary file `f` as line-aligned pieces of about `max_bytes`"""
+    bounds = [start]
+    while end - bounds[-1] > max_bytes:
+        f.seek(bounds[-1] + max_bytes - 1)
+        f.readline()
+        if f.tell() >= end:
+            break
+        bounds.append(f.tell())
+    bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class _FileRange(io.RawIOBase):
+    """Read-only stream over bytes `start` to `end` of the open binary file `f`"""
+
+    def __init__(self, f, start: int, end: int):
+        super().__init__()
+        f.seek(start)
+        self.f = f
+        self.remaining = end - start
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = self.f.readinto(memoryview(buffer)[:max(self.remaining, 0)])
+        self.remaining -= n
+        return n
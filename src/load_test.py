@@ -0,0 +1,183 @@
+# Service Load Test
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from benchmark import raw_data
+from pipeline import DEFAULT_CHUNKSIZE, run_pipeline
+from service import AnalyticsService, LATENCY_TARGETS_MS, serve
+
+
+# Share of client_summary requests for ids that do not exist (404 path)
+UNKNOWN_CLIENT_SHARE = 0.05
+
+
+def build_requests(service: AnalyticsService, n_requests: int, window_hours: int, seed: int = 0) -> List[tuple]:
+    """
+    A shuffled mix of requests over the served data, half per endpoint:
+      -> ('client_summary', client_id), a share of them unknown ids.
+      -> ('event_time_series', start, end), windows of `window_hours` hours
+         starting at a random hour of the served range.
+    """
+    conn = service.analytics.conn
+    client_ids = [row[0] for row in conn.execute("SELECT client_id FROM serve_client_summary").fetchall()]
+    first, last = conn.execute('SELECT min("TIMESTAMP"), max("TIMESTAMP") FROM serve_event_time_series').fetchone()
+    if not client_ids or first is None:
+        raise RuntimeError("The serving tables are empty: nothing to load test")
+
+    rng = random.Random(seed)
+    hours = max(int((pd.Timestamp(last) - pd.Timestamp(first)) / pd.Timedelta(hours=1)), 1)
+    requests = []
+    for i in range(n_requests):
+        if i % 2 == 0:
+            if rng.random() < UNKNOWN_CLIENT_SHARE:
+                client_id = f"unknown-{rng.randrange(10 ** 9)}"
+            else:
+                client_id = rng.choice(client_ids)
+            requests.append(('client_summary', client_id))
+        else:
+            start = pd.Timestamp(first) + pd.Timedelta(hours=rng.randrange(hours))
+            requests.append(('event_time_series', start, start + pd.Timedelta(hours=window_hours)))
+    rng.shuffle(requests)
+    return requests
+
+
+def in_process_client(service: AnalyticsService) -> Callable[[tuple], None]:
+    """Send a request straight to the service methods"""
+    def send(request: tuple) -> None:
+        getattr(service, request[0])(*request[1:])
+    return send
+
+
+def http_client(base_url: str) -> Callable[[tuple], None]:
+    """Send a request to the HTTP service at `base_url` (404 for unknown clients is expected)"""
+    def send(request: tuple) -> None:
+        if request[0] == 'client_summary':
+            url = f"{base_url}/client_summary/{urllib.parse.quote(request[1], safe='')}"
+        else:
+            query = urllib.parse.urlencode({'start': request[1].isoformat(), 'end': request[2].isoformat()})
+            url = f"{base_url}/event_time_series?{query}"
+        try:
+            with urllib.request.urlopen(url) as response:
+                json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code != 404:
+                raise
+    return send
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p95/p99 of latencies in ms"""
+    values = pd.Series(samples, dtype=float)
+    return {f"p{q}_ms": round(float(values.quantile(q / 100)), 3) for q in (50, 95, 99)}
+
+
+def run_load(send: Callable[[tuple], None], requests: List[tuple], concurrency: int) -> Dict[str, dict]:
+    """
+    Fire `requests` from `concurrency` threads and time each one as the client
+    sees it (queueing and HTTP included); returns count and percentiles per endpoint.
+    """
+    latencies = {name: [] for name in LATENCY_TARGETS_MS}
+    lock = threading.Lock()
+
+    def timed(request: tuple) -> None:
+        start = time.perf_counter()
+        send(request)
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies[request[0]].append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, requests))
+    seconds = time.perf_counter() - started
+
+    report = {
+        name: {'count': len(samples), **percentiles(samples)}
+        for name, samples in latencies.items() if samples
+    }
+    print(f"[LoadTest] {len(requests):,} requests in {seconds:.2f}s "
+          f"({len(requests) / seconds:,.0f} req/s, concurrency {concurrency})")
+    return report
+
+
+def format_report(title: str, report: Dict[str, dict]) -> str:
+    """Report as a fixed-width table, one line per endpoint (target and verdict when present)"""
+    header = f"{title:<20} {'count':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'target':>9}  ok"
+    lines = [header, '-' * len(header)]
+    for name, r in report.items():
+        target = f"{r['target_p99_ms']:>9.1f}  {'yes' if r['ok'] else 'NO'}" if 'ok' in r else f"{'-':>9}  -"
+        lines.append(
+            f"{name:<20} {r['count']:>8,} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f} {target}"
+        )
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, dict]:
+    """Command line entry point: python src/load_test.py --work /tmp/load --events 100000 --http"""
+    parser = argparse.ArgumentParser(description="Load test the analytics service against its p99 targets.")
+    parser.add_argument('--work', type=Path, required=True, help="raw, processed and analytics data")
+    parser.add_argument('--events', type=int, default=100_000, help="synthetic events to generate")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=20_000)
+    parser.add_argument('--concurrency', type=int, default=os.cpu_count() or 1,
+                        help="client threads (above the core count, client latency is mostly queueing)")
+    parser.add_argument('--window-hours', type=int, default=24, help="event_time_series range per request")
+    parser.add_argument('--http', action='store_true', help="go through the HTTP server instead of in process")
+    parser.add_argument('--json', type=Path, default=None, help="write the report to this file")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+
+    size_path, _ = raw_data(args.work, args.events, args.seed)
+    processed_path = size_path / 'processed'
+    shutil.rmtree(processed_path, ignore_errors=True)
+    run_pipeline(size_path / 'raw', processed_path, DEFAULT_CHUNKSIZE)
+
+    service = AnalyticsService(processed_path, size_path / 'analytics')
+    server = None
+    try:
+        requests = build_requests(service, args.requests, args.window_hours, args.seed)
+        if args.http:
+            server = serve(service, port=0)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            send = http_client(f"http://127.0.0.1:{server.server_port}")
+        else:
+            send = in_process_client(service)
+        # Warm every thread's cursor before timing
+        run_load(send, requests[:args.concurrency * 10], args.concurrency)
+        service.reset_latencies()
+        client = run_load(send, requests, args.concurrency)
+        report = service.latency_report()
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        service.close()
+
+    print(format_report('client', client))
+    print(format_report('service', report))
+    if args.json is not None:
+        args.json.parent.mkdir(parents=True, exist_ok=True)
+        args.json.write_text(json.dumps({'client': client, 'service': report}, indent=2))
+    if not all(r['ok'] for r in report.values()):
+        print("[LoadTest] p99 target missed")
+        sys.exit(1)
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+# Run Metrics
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# Operators kept per query from a DuckDB profile, by operator time
+HOT_OPERATORS = 5
+
+
+def current_rss() -> Optional[int]:
+    """Resident set size of this process in bytes (None where /proc is missing)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class PeakMemory:
+    """
+    Peak RSS while the block runs, sampled every `interval` seconds by a
+    background thread.
+      -> Without /proc (macOS) falls back to ru_maxrss, the peak of the whole
+         process, which only grows: later stages then report the running max.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.start = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss() or 0)
+
+    def __enter__(self) -> 'PeakMemory':
+        rss = current_rss()
+        if rss is None:
+            self.start = self.peak = self._max_rss()
+            return self
+        self.start = self.peak = rss
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self._thread is None:
+            self.peak = self._max_rss()
+            return
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss() or 0)
+
+    @staticmethod
+    def _max_rss() -> int:
+        # ru_maxrss is in KB on Linux and in bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if os.uname().sysname == 'Darwin' else max_rss * 1024
+
+
+def hot_operators(profile: dict, limit: int = HOT_OPERATORS) -> List[dict]:
+    """The `limit` slowest operators of a DuckDB JSON profile (EXPLAIN ANALYZE tree)"""
+    operators = []
+    stack = list(profile.get('children', []))
+    while stack:
+        node = stack.pop()
+        stack.extend(node.get('children', []))
+        operators.append({
+            'operator': node.get('operator_name') or node.get('operator_type'),
+            'seconds': round(node.get('operator_timing', 0.0), 6),
+            'rows': node.get('operator_cardinality')
+        })
+    return sorted(operators, key=lambda op: op['seconds'], reverse=True)[:limit]
+
+
+class RunMetrics:
+    """
+    Wall time, CPU time, peak RSS delta and row counts of the stages of one run.
+      -> `stage(name)` is a context manager yielding a record the caller
+         completes with 'rows_out' (and any extra fields). Stages with the
+         same name accumulate: chunks of a streaming run or the tasks of a
+         sharded one add their times and rows, the RSS delta keeps the max and
+         'calls' counts them.
+      -> `stats`: the data-quality counter dict the stage fills; its values at
+         the end of the last call are stored under 'counters'.
+      -> CPU time and RSS are process-wide, so stages running at the same time
+         on threads overlap. Stages of worker processes are added with merge().
+    """
+
+    def __init__(self, run: str = 'run'):
+        self.run = run
+        self.started_at = datetime.now(timezone.utc)
+        self.stages: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None, stats: Optional[dict] = None) -> Iterator[dict]:
+        record = {'rows_in': rows_in}
+        memory = PeakMemory()
+        with memory:
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            try:
+                yield record
+            finally:
+                record['wall_s'] = time.perf_counter() - wall
+                record['cpu_s'] = time.process_time() - cpu
+        record['rss_delta_mb'] = (memory.peak - memory.start) / 2 ** 20
+        record['peak_rss_mb'] = memory.peak / 2 ** 20
+        if stats is not None:
+            record['counters'] = dict(stats)
+        self.add(name, record)
+
+    def add(self, name: str, record: dict) -> None:
+        """Accumulate one call of stage `name`"""
+        with self.lock:
+            current = self.stages.setdefault(name, {'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0})
+            current['calls'] += record.get('calls', 1)
+            for key, value in record.items():
+                if value is None or key == 'calls':
+                    continue
+                if key in ('wall_s', 'cpu_s', 'rows_in', 'rows_out'):
+                    current[key] = current.get(key, 0) + value
+                elif key in ('rss_delta_mb', 'peak_rss_mb'):
+                    current[key] = max(current.get(key, 0.0), value)
+                else:
+                    current[key] = value
+
+    def merge(self, stages: Dict[str, dict]) -> None:
+        """Add the stages recorded by another RunMetrics (e.g. in a worker process)"""
+        for name, record in stages.items():
+            self.add(name, record)
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            stages = []
+            for name, record in self.stages.items():
+                entry = {'stage': name, **record}
+                for key in ('wall_s', 'cpu_s', 'rss_delta_mb', 'peak_rss_mb'):
+                    if key in entry:
+                        entry[key] = round(entry[key], 4 if key.endswith('_s') else 1)
+                rows = entry.get('rows_in') or entry.get('rows_out')
+                entry['rows_per_sec'] = round(rows / entry['wall_s']) if rows and entry['wall_s'] > 0 else None
+                stages.append(entry)
+        return {
+            'run': self.run,
+            'started_at': self.started_at.isoformat(),
+            'finished_at': datetime.now(timezone.utc).isoformat(),
+            'stages': stages
+        }
+
+    def write(self, directory: Path) -> Path:
+        """Write the run as <run>-<started_at>.json in `directory`"""
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{self.run}-{self.started_at.strftime('%Y%m%dT%H%M%S')}.json"
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_text(json.dumps(self.to_dict(), indent=2, default=str))
+        tmp.replace(path)
+        return path
+
+
+def measure(metrics: Optional[RunMetrics], name: str, rows_in: Optional[int] = None, stats: Optional[dict] = None):
+    """`metrics.stage(...)`, or a throwaway record when the run is not measured"""
+    if metrics is None:
+        return nullcontext({})
+    return metrics.stage(name, rows_in, stats)
+
+
+def measure_iter(metrics: Optional[RunMetrics], name: str, chunks: Iterator) -> Iterator:
+    """Yield the chunks of `chunks`, measuring the production of each one as stage `name`"""
+    if metrics is None:
+        yield from chunks
+        return
+    chunks = iter(chunks)
+    while True:
+        with metrics.stage(name) as record:
+            chunk = next(chunks, None)
+            record['rows_out'] = len(chunk) if chunk is not None else None
+        if chunk is None:
+            return
+        yield chunk
+
+
+def measure_frame(metrics: Optional[RunMetrics], name: str, fn: Callable, df, *args, **kwargs):
+    """`fn(df, *args, **kwargs)` measured as stage `name`, with the frame's rows in and out"""
+    with measure(metrics, name, len(df)) as record:
+        df = fn(df, *args, **kwargs)
+        record['rows_out'] = len(df)
+    return df
@@ -0,0 +1,679 @@
+# Pipeline ETL
+import json
+import logging
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Optional
+
+from load import RAW_SCHEMAS, csv_unread_range, load_csv, load_csv_range
+from metrics import RunMetrics, measure, measure_frame, measure_iter
+from state import KeyStore, OffsetStore, WatermarkStore
+from transform import (
+    standardize_dates,
+    deduplicate_logic,
+    decode_uuids,
+    encode_uuids,
+    encode_uuid_keys,
+    normalize_clients_metadata,
+    normalize_events_metadata,
+    normalize_retry_logs_metadata,
+    cross_reference_retries,
+    report_stats,
+    UUID_DTYPE
+)
+
+
+# Rows per chunk in streaming mode (~100 MB of pandas memory for events)
+DEFAULT_CHUNKSIZE = 250_000
+
+# Per-dataset configuration of the ETL steps
+DATASETS = {
+    'clients': {
+        'file': 'clients.csv',
+        'schema': RAW_SCHEMAS['clients'],
+        'date_columns': ['sign_up_date'],
+        'subset': ['client_id'],
+        'uuid_columns': [],
+        'sort_by': 'sign_up_date',
+        'normalize': normalize_clients_metadata
+    },
+    'events': {
+        'file': 'events.csv',
+        'schema': RAW_SCHEMAS['events'],
+        'date_columns': ['created_at', 'completed_at'],
+        'subset': ['event_id'],
+        'uuid_columns': ['event_id'],
+        'sort_by': 'created_at',
+        'normalize': normalize_events_metadata,
+        'partition': ('created_at', 'created_month')
+    },
+    'retry_logs': {
+        'file': 'retry_logs.csv',
+        'schema': RAW_SCHEMAS['retry_logs'],
+        'date_columns': ['retry_time'],
+        'subset': ['retry_id'],
+        'uuid_columns': ['retry_id', 'original_event_id'],
+        'sort_by': 'retry_time',
+        'normalize': normalize_retry_logs_metadata,
+        'partition': ('retry_time', 'retry_month')
+    }
+}
+
+# Datasets whose normalizer can accumulate counters across chunks
+STREAMABLE = ('events', 'retry_logs')
+
+PROCESSED_FORMATS = ('parquet', 'csv')
+
+# What to do with retries whose original_event_id is not a processed event:
+#   'report'     → count them and keep them
+#   'quarantine' → move them to processed/quarantine/retry_logs/
+ORPHAN_ACTIONS = ('report', 'quarantine')
+
+logger = logging.getLogger(__name__)
+
+
+def _remove(path: Path) -> None:
+    """Delete a file or a directory tree, if it exists"""
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        path.unlink()
+
+
+def processed_target(name: str, processed_path: Path, fmt: str = 'parquet') -> Path:
+    """
+    Location of a dataset in the processed layer:
+      -> parquet + partitioned dataset: directory (processed/events/)
+      -> parquet otherwise: single file (processed/clients.parquet)
+      -> csv: single file (processed/events.csv)
+    """
+    if fmt not in PROCESSED_FORMATS:
+        raise ValueError(f"Unknown processed format '{fmt}'. Options: {list(PROCESSED_FORMATS)}")
+    if fmt == 'csv':
+        return processed_path / DATASETS[name]['file']
+    if 'partition' in DATASETS[name]:
+        return processed_path / name
+    return processed_path / f"{name}.parquet"
+
+
+def _storage_schema(schema: pa.Schema) -> pa.Schema:
+    """`schema` with UUID extension fields as their binary(16) storage, as from_pandas builds them"""
+    for i, field in enumerate(schema):
+        if isinstance(field.type, pa.BaseExtensionType):
+            schema = schema.set(i, field.with_type(field.type.storage_type))
+    return schema
+
+
+def _with_uuid_type(table: pa.Table, columns: list) -> pa.Table:
+    """
+    Mark the binary(16) `columns` as UUIDs, so Parquet stores them with the
+    UUID logical type. Their pandas metadata becomes plain object, which any
+    reader can rebuild (pd.read_parquet gives uuid.UUID values).
+    """
+    metadata = table.schema.metadata
+    pandas_metadata = table.schema.pandas_metadata
+    for column in columns:
+        i = table.schema.get_field_index(column)
+        if i >= 0 and table.schema.field(i).type == pa.binary(16):
+            chunks = [pa.ExtensionArray.from_storage(pa.uuid(), chunk) for chunk in table.column(i).chunks]
+            table = table.set_column(i, pa.field(column, pa.uuid()), pa.chunked_array(chunks, pa.uuid()))
+            for entry in pandas_metadata['columns'] if pandas_metadata else []:
+                if entry['name'] == column:
+                    entry.update(pandas_type='object', numpy_type='object', metadata=None)
+    if pandas_metadata:
+        metadata = {**metadata, b'pandas': json.dumps(pandas_metadata).encode()}
+    return table.replace_schema_metadata(metadata)
+
+
+def read_processed_column(name: str, column: str, processed_path: Path, fmt: str = 'parquet') -> pd.Series:
+    """
+    One column of a processed dataset, read alone from disk. UUID columns come
+    back as UUID_DTYPE whether they were stored as Parquet UUIDs or as text.
+    """
+    target = processed_target(name, processed_path, fmt)
+    if fmt == 'csv':
+        values = pd.read_csv(target, usecols=[column])[column]
+        return encode_uuids(values) if column in DATASETS[name]['uuid_columns'] else values
+    values = pq.read_table(target, columns=[column]).column(column)
+    if isinstance(values.type, pa.BaseExtensionType):
+        values = pa.chunked_array([chunk.storage for chunk in values.chunks], values.type.storage_type)
+    values = values.to_pandas(types_mapper=pd.ArrowDtype) if values.type == pa.binary(16) else values.to_pandas()
+    return values.rename(column)
+
+
+class ProcessedWriter:
+    """
+    Incremental writer for one dataset of the processed layer.
+      -> 'parquet': typed Parquet; events and retry logs are Hive-partitioned
+         by the month of their timestamp (events/created_month=2025-01/...),
+         so DuckDB can prune files on date predicates.
+      -> 'csv': one text file, as the notebook used to write.
+    UUID keys (the dataset's 'uuid_columns') are written as the Parquet UUID
+    logical type, or as canonical text in CSV.
+    Full runs write to a staging path that `commit()` swaps in, so a failed
+    run never leaves a half-written dataset behind. With `batch_id` the writer
+    appends to the existing dataset instead (files named batch-<id>-...), and
+    `rollback()` removes whatever this batch wrote.
+    With `shard`, several writers (one per process) fill the staging path of a
+    full run side by side (files named part-s<shard>-...); the staging path is
+    then created and committed by a writer without `shard`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        processed_path: Path,
+        fmt: str = 'parquet',
+        batch_id: Optional[str] = None,
+        shard: Optional[int] = None
+    ):
+        self.name = name
+        self.fmt = fmt
+        self.config = DATASETS[name]
+        self.batch_id = batch_id
+        self.shard = shard
+        self.target = processed_target(name, processed_path, fmt)
+        self.schema = None
+        self.files = []
+        self.initial_size = 0
+        self.chunks = 0
+        self.rows = 0
+
+        processed_path.mkdir(parents=True, exist_ok=True)
+        if shard is not None and (fmt != 'parquet' or 'partition' not in self.config or batch_id is not None):
+            raise ValueError(f"Sharded writes need a partitioned Parquet full run, got {name} as {fmt}")
+        if batch_id is None:
+            self.output = self.target.with_name(self.target.name + '.tmp')
+            if shard is None:
+                _remove(self.output)
+        else:
+            if fmt == 'parquet' and 'partition' not in self.config:
+                raise ValueError(f"{self.name} is a single Parquet file and cannot be appended to")
+            self.output = self.target
+            # Keep the column types of the files already in the dataset
+            existing = next(self.target.rglob('*.parquet'), None) if self.target.is_dir() else None
+            if existing is not None:
+                _, partition_col = self.config['partition']
+                schema = pq.read_schema(existing)
+                self.schema = schema.append(pa.field(partition_col, pa.string()))
+            if fmt == 'csv' and self.target.exists():
+                self.initial_size = self.target.stat().st_size
+
+    def write(self, df: pd.DataFrame) -> None:
+        """Append one processed chunk"""
+        if self.fmt == 'csv':
+            header = not self.chunks and not self.initial_size
+            mode = 'w' if not self.chunks and self.batch_id is None else 'a'
+            # Text layer: UUID keys in their canonical form
+            df = df.assign(**{column: decode_uuids(df[column])
+                              for column in self.config['uuid_columns'] if df[column].dtype == UUID_DTYPE})
+            df.to_csv(self.output, mode=mode, header=header, index=False)
+        elif 'partition' in self.config:
+            column, partition_col = self.config['partition']
+            months = pd.to_datetime(df[column], utc=True, errors='coerce').dt.strftime('%Y-%m')
+            df = df.assign(**{partition_col: months.fillna('unknown')})
+            # Every chunk is written with the schema of the first one, so all
+            # files of the dataset share one set of column types
+            table = self._table(df)
+            self.schema = table.schema
+            if self.batch_id is not None:
+                prefix = f"batch-{self.batch_id}"
+            elif self.shard is not None:
+                prefix = f"part-s{self.shard:03d}"
+            else:
+                prefix = 'part'
+            pq.write_to_dataset(
+                table,
+                self.output,
+                partition_cols=[partition_col],
+                basename_template=f"{prefix}-{self.chunks:05d}-{{i}}.parquet",
+                file_visitor=lambda written: self.files.append(Path(written.path))
+            )
+        else:
+            if self.chunks:
+                raise ValueError(f"{self.name} is written as a single Parquet file, not in chunks")
+            pq.write_table(self._table(df), self.output)
+        self.chunks += 1
+        self.rows += len(df)
+
+    def _table(self, df: pd.DataFrame) -> pa.Table:
+        """Arrow table of a chunk, with the schema of the previous chunks and UUID keys typed as such"""
+        schema = _storage_schema(self.schema) if self.schema is not None else None
+        table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+        return _with_uuid_type(table, self.config['uuid_columns'])
+
+    def commit(self) -> Path:
+        """Replace the previous output with the staged one (no-op when appending)"""
+        if self.batch_id is not None:
+            return self.target
+        if self.shard is not None:
+            raise ValueError("Shard writers are committed by the writer that owns the staging path")
+        if not self.output.exists():
+            raise ValueError(f"No rows were written for {self.name}")
+        _remove(self.target)
+        self.output.rename(self.target)
+        return self.target
+
+    def rollback(self) -> None:
+        """Discard everything written by this writer"""
+        if self.batch_id is None:
+            _remove(self.output)
+        elif self.fmt == 'csv':
+            if self.initial_size:
+                with open(self.output, 'r+b') as f:
+                    f.truncate(self.initial_size)
+            else:
+                _remove(self.output)
+        else:
+            for path in self.files:
+                _remove(path)
+
+
+def load_processed_keys(name: str, processed_path: Path, fmt: str = 'parquet') -> pd.Index:
+    """
+    Unique key column (event_id / retry_id) of a processed dataset as a
+    pd.Index, whose hash table is built once and reused by every lookup.
+    Only that column is read from disk (see read_processed_column).
+    """
+    key = DATASETS[name]['subset'][0]
+    values = read_processed_column(name, key, processed_path, fmt)
+    return pd.Index(pd.unique(values.dropna()))
+
+
+def spill_shards(path: Path, chunksize: int, start: int = 0, end: Optional[int] = None) -> int:
+    """
+    Number of key shards that keeps each one at about `chunksize` rows of the
+    CSV at `path` (its bytes `start` to `end`), estimated from the line
+    length of their first megabyte
+    """
+    end = path.stat().st_size if end is None else end
+    with open(path, 'rb') as f:
+        f.seek(start)
+        sample = f.read(min(1 << 20, end - start))
+    bytes_per_row = len(sample) / max(sample.count(b'\n'), 1)
+    return max(1, -(-int((end - start) / max(bytes_per_row, 1)) // chunksize))
+
+
+def spill_by_key(chunk: pd.DataFrame, key: str, n_shards: int, spill_path: Path, name: str) -> None:
+    """
+    Spill the rows of `chunk` to the shard of their key (hash of `key` %
+    `n_shards`) as spill_path/shard-<shard>/<name>.pkl, so every copy of a key
+    lands in the same shard. Names must sort in input order (see read_spill).
+    """
+    shards = pd.util.hash_pandas_object(chunk[key], index=False).to_numpy() % n_shards
+    for shard, rows in chunk.groupby(shards, sort=True):
+        shard_dir = spill_path / f"shard-{shard:03d}"
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        rows.to_pickle(shard_dir / f"{name}.pkl")
+
+
+def read_spill(spill_path: Path, shard: int) -> Optional[pd.DataFrame]:
+    """Rows spilled to `shard` in input order, or None if it got none"""
+    files = sorted((spill_path / f"shard-{shard:03d}").glob('*.pkl'))
+    if not files:
+        return None
+    return pd.concat([pd.read_pickle(path) for path in files], ignore_index=True)
+
+
+def _check_orphans(
+    df: pd.DataFrame,
+    event_index: pd.Index,
+    orphans: str,
+    quarantine_dir: Path,
+    part: int,
+    stats: Optional[dict] = None
+) -> pd.DataFrame:
+    """Cross-reference retries with the processed events and apply `orphans`"""
+    if orphans not in ORPHAN_ACTIONS:
+        raise ValueError(f"Unknown orphan action '{orphans}'. Options: {list(ORPHAN_ACTIONS)}")
+    matched, orphan_rows = cross_reference_retries(df, event_index, stats=stats)
+    if orphans == 'report':
+        return df
+    if not orphan_rows.empty:
+        quarantine_dir.mkdir(parents=True, exist_ok=True)
+        # Same UUID typing as the processed layer, so any Parquet reader can load it
+        table = pa.Table.from_pandas(orphan_rows, preserve_index=False)
+        pq.write_table(_with_uuid_type(table, DATASETS['retry_logs']['uuid_columns']),
+                       quarantine_dir / f"part-{part:05d}.parquet")
+    return matched
+
+
+def stream_dataset(
+    name: str,
+    raw_path: Path,
+    processed_path: Path,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    fmt: str = 'parquet',
+    orphans: Optional[str] = 'report',
+    metrics: Optional[RunMetrics] = None
+) -> dict:
+    """
+    Purpose:
+      -> Run load → encode_uuid_keys → standardize_dates → deduplicate_logic →
+         normalize_* on one dataset with peak memory set by `chunksize` and not
+         by input size, writing the result to the processed layer (see
+         ProcessedWriter).
+      -> UUID keys are 16-byte values (UUID_DTYPE) from the first step on.
+      -> Data-quality counters are summed across chunks and reported once.
+    Deduplication:
+      -> Keep-earliest by `sort_by`, exactly as on the whole frame: loaded
+         chunks are spilled to disk by key hash (processed/.spill-<name>/),
+         in shards of about `chunksize` rows, so every copy of a key meets in
+         one shard. Each shard is then deduplicated and normalized on its
+         own, like the shards of etl.run_sharded. No key set is kept in memory.
+    Orphan retries:
+      -> For retry_logs, `orphans` ('report', 'quarantine' or None to skip)
+         controls the semi-join against the already processed events.
+    Metrics:
+      -> With `metrics`, every step is recorded as stage '<name>.<step>'
+         summed over the chunks and shards, and the whole dataset as stage
+         '<name>' with its counters.
+    Returns:
+      -> The accumulated counters, including 'rows_in' and 'rows_out'.
+    """
+    if name not in STREAMABLE:
+        raise ValueError(f"Dataset '{name}' has no streaming mode. Options: {list(STREAMABLE)}")
+    config = DATASETS[name]
+    writer = ProcessedWriter(name, processed_path, fmt)
+    key = config['subset'][0]
+    n_shards = spill_shards(raw_path / config['file'], chunksize)
+    spill_path = processed_path / f".spill-{name}"
+    shutil.rmtree(spill_path, ignore_errors=True)
+    stats = {'rows_in': 0}
+
+    check_orphans = name == 'retry_logs' and orphans is not None
+    if check_orphans:
+        event_index = load_processed_keys('events', processed_path, fmt)
+        quarantine_dir = processed_path / 'quarantine' / name
+        _remove(quarantine_dir)
+
+    chunks = measure_iter(metrics, f"{name}.load_csv",
+                          load_csv(config['file'], raw_path, chunksize=chunksize, schema=config['schema']))
+    with measure(metrics, name, stats=stats) as record:
+        try:
+            for part, chunk in enumerate(chunks):
+                stats['rows_in'] += len(chunk)
+                chunk = measure_frame(metrics, f"{name}.encode_uuid_keys", encode_uuid_keys,
+                                      chunk, config['uuid_columns'], name, stats=stats)
+                chunk = measure_frame(metrics, f"{name}.standardize_dates", standardize_dates,
+                                      chunk, config['date_columns'], name, stats=stats)
+                with measure(metrics, f"{name}.spill", len(chunk)):
+                    spill_by_key(chunk, key, n_shards, spill_path, f"chunk-{part:05d}")
+
+            for shard in range(n_shards):
+                with measure(metrics, f"{name}.read_spill") as read:
+                    df = read_spill(spill_path, shard)
+                    read['rows_out'] = 0 if df is None else len(df)
+                if df is None:
+                    continue
+                df = measure_frame(metrics, f"{name}.deduplicate_logic", deduplicate_logic,
+                                   df, config['subset'], config['sort_by'], name, stats=stats, preserve_order=True)
+                df = measure_frame(metrics, f"{name}.{config['normalize'].__name__}", config['normalize'],
+                                   df, stats=stats)
+                if check_orphans:
+                    df = measure_frame(metrics, f"{name}.check_orphans", _check_orphans,
+                                       df, event_index, orphans, quarantine_dir, shard, stats=stats)
+                with measure(metrics, f"{name}.write", len(df)):
+                    writer.write(df)
+
+            # Only replace the previous output once every shard was written
+            output = writer.commit()
+        except Exception:
+            writer.rollback()
+            raise
+        finally:
+            shutil.rmtree(spill_path, ignore_errors=True)
+        stats['rows_out'] = writer.rows
+        record.update(rows_in=stats['rows_in'], rows_out=writer.rows, shards=n_shards)
+
+    report_stats(stats, name)
+    logger.info(f"[Pipeline] {name}: {writer.rows} rows in {n_shards} shards → {output}")
+    return stats
+
+
+def process_dataset(
+    name: str,
+    raw_path: Path,
+    processed_path: Path,
+    fmt: str = 'parquet',
+    orphans: Optional[str] = 'report',
+    metrics: Optional[RunMetrics] = None
+) -> dict:
+    """
+    Purpose:
+      -> Run load → encode_uuid_keys → standardize_dates → deduplicate_logic →
+         normalize_* on a whole dataset in memory and write it to the
+         processed layer.
+      -> For retry_logs, `orphans` is applied against the processed events
+         (see ORPHAN_ACTIONS; None skips the check).
+      -> With `metrics`, each step is recorded as stage '<name>.<step>' and
+         the whole dataset as stage '<name>' (see stream_dataset).
+    Returns:
+      -> The counters of the dataset, including 'rows_in' and 'rows_out'.
+    """
+    config = DATASETS[name]
+    stats = {}
+    with measure(metrics, name, stats=stats) as record:
+        with measure(metrics, f"{name}.load_csv") as load:
+            df = load_csv(config['file'], raw_path, schema=config['schema'])
+            load['rows_out'] = len(df)
+        stats['rows_in'] = len(df)
+        df = measure_frame(metrics, f"{name}.encode_uuid_keys", encode_uuid_keys,
+                           df, config['uuid_columns'], name, stats=stats)
+        df = measure_frame(metrics, f"{name}.standardize_dates", standardize_dates,
+                           df, config['date_columns'], name, stats=stats)
+        df = measure_frame(metrics, f"{name}.deduplicate_logic", deduplicate_logic,
+                           df, config['subset'], config['sort_by'], name, stats=stats)
+        df = measure_frame(metrics, f"{name}.{config['normalize'].__name__}", config['normalize'],
+                           df, stats=stats)
+        if name == 'retry_logs' and orphans is not None:
+            quarantine_dir = processed_path / 'quarantine' / name
+            _remove(quarantine_dir)
+            event_index = load_processed_keys('events', processed_path, fmt)
+            df = measure_frame(metrics, f"{name}.check_orphans", _check_orphans,
+                               df, event_index, orphans, quarantine_dir, 0, stats=stats)
+
+        with measure(metrics, f"{name}.write", len(df)):
+            writer = ProcessedWriter(name, processed_path, fmt)
+            writer.write(df)
+            output = writer.commit()
+        stats['rows_out'] = len(df)
+        record.update(rows_in=stats['rows_in'], rows_out=len(df))
+
+    report_stats(stats, name)
+    logger.info(f"[Pipeline] {name}: {len(df)} rows → {output}")
+    return stats
+
+
+def run_pipeline(
+    raw_path: Path,
+    processed_path: Path,
+    chunksize: Optional[int] = DEFAULT_CHUNKSIZE,
+    fmt: str = 'parquet',
+    orphans: Optional[str] = 'report',
+    metrics: Optional[RunMetrics] = None
+) -> dict:
+    """
+    Purpose:
+      -> Process the three datasets end to end. Clients are small and run in
+         memory; events and retry logs stream in chunks of `chunksize` rows
+         (None processes every dataset as a single frame, like the notebook).
+      -> `fmt` selects the processed layer: 'parquet' (default) or 'csv'.
+      -> `orphans` sets how retries without a processed event are handled
+         (see ORPHAN_ACTIONS; None skips the check).
+      -> `metrics` records the stages of every dataset (see RunMetrics).
+    Returns:
+      -> Counters per dataset.
+    """
+    processed_path.mkdir(parents=True, exist_ok=True)
+    results = {}
+    for name in DATASETS:
+        if chunksize is not None and name in STREAMABLE:
+            results[name] = stream_dataset(name, raw_path, processed_path, chunksize, fmt, orphans, metrics)
+        else:
+            results[name] = process_dataset(name, raw_path, processed_path, fmt, orphans, metrics)
+    return results
+
+
+def ingest_incremental(
+    name: str,
+    raw_path: Path,
+    writer: ProcessedWriter,
+    watermarks: WatermarkStore,
+    keys: KeyStore,
+    offsets: OffsetStore,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    raw_file: Optional[str] = None,
+    metrics: Optional[RunMetrics] = None
+) -> dict:
+    """
+    Purpose:
+      -> Process only the raw rows of `name` appended since the last run (the
+         bytes past its offset in `offsets`) and append them to the processed
+         layer through `writer` (one batch), so cost follows the new rows and
+         not the history of the raw file.
+    Deduplication:
+      -> Keep-earliest inside the batch: its chunks are spilled by key hash
+         and every shard is deduplicated whole, as in stream_dataset.
+      -> The KeyStore then decides what is new: keys already written are
+         dropped, so across batches the copy ingested first wins (the
+         processed layer is append-only).
+      -> Nothing is dropped by timestamp: rows older than the watermark with a
+         new key are late arrivals, ingested and counted as 'late_rows'.
+    Metrics:
+      -> Stages as in stream_dataset, with the batch as stage '<name>'.
+    Returns:
+      -> Counters of the batch; 'watermark' holds the new high watermark and
+         'offset' the end of the consumed bytes.
+    """
+    config = DATASETS[name]
+    file_name = raw_file or config['file']
+    key = config['subset'][0]
+    sort_by = config['sort_by']
+    watermark = watermarks.get(name)
+    columns, start, end = csv_unread_range(file_name, raw_path, offsets.get(file_name))
+    stats = {'rows_in': 0, 'duplicates': 0, 'late_rows': 0}
+    high = watermark
+
+    n_shards = spill_shards(raw_path / file_name, chunksize, start, end)
+    spill_path = writer.target.parent / f".spill-{name}"
+    shutil.rmtree(spill_path, ignore_errors=True)
+    chunks = measure_iter(metrics, f"{name}.load_csv",
+                          load_csv_range(file_name, raw_path, columns, start, end, chunksize, config['schema']))
+    with measure(metrics, name, stats=stats) as record:
+        try:
+            for part, chunk in enumerate(chunks):
+                stats['rows_in'] += len(chunk)
+                chunk = measure_frame(metrics, f"{name}.encode_uuid_keys", encode_uuid_keys,
+                                      chunk, config['uuid_columns'], name, stats=stats)
+                chunk = measure_frame(metrics, f"{name}.standardize_dates", standardize_dates,
+                                      chunk, config['date_columns'], name, stats=stats)
+                with measure(metrics, f"{name}.spill", len(chunk)):
+                    spill_by_key(chunk, key, n_shards, spill_path, f"chunk-{part:05d}")
+
+            for shard in range(n_shards):
+                with measure(metrics, f"{name}.read_spill") as read:
+                    df = read_spill(spill_path, shard)
+                    read['rows_out'] = 0 if df is None else len(df)
+                if df is None:
+                    continue
+                df = measure_frame(metrics, f"{name}.deduplicate_logic", deduplicate_logic,
+                                   df, config['subset'], sort_by, name, stats=stats, preserve_order=True)
+                mask_seen = keys.seen(name, df[key])
+                stats['duplicates'] += int(mask_seen.sum())
+                df = df[~mask_seen]
+                if df.empty:
+                    continue
+
+                df = measure_frame(metrics, f"{name}.{config['normalize'].__name__}", config['normalize'],
+                                   df, stats=stats)
+                if df.empty:
+                    continue
+                if name == 'retry_logs':
+                    # Report only: the event of a retry may still arrive in a later batch
+                    mask_known = keys.seen('events', df['original_event_id'])
+                    stats['orphan_retries'] = stats.get('orphan_retries', 0) + int((~mask_known).sum())
+                if watermark is not None:
+                    stats['late_rows'] += int((df[sort_by] < watermark).sum())
+                with measure(metrics, f"{name}.write", len(df)):
+                    writer.write(df)
+                    keys.add(name, df[key])
+
+                shard_high = pd.to_datetime(df[sort_by], utc=True, errors='coerce').max()
+                if pd.notna(shard_high) and (high is None or shard_high > high):
+                    high = shard_high
+        finally:
+            shutil.rmtree(spill_path, ignore_errors=True)
+
+        stats['rows_out'] = writer.rows
+        record.update(rows_in=stats['rows_in'], rows_out=writer.rows)
+    stats['watermark'] = high
+    stats['offset'] = end
+    return stats
+
+
+def run_incremental(
+    raw_path: Path,
+    processed_path: Path,
+    state_path: Path,
+    chunksize: int = DEFAULT_CHUNKSIZE,
+    fmt: str = 'parquet',
+    batch_id: Optional[str] = None,
+    metrics: Optional[RunMetrics] = None
+) -> dict:
+    """
+    Purpose:
+      -> Incremental ETL run: events and retry logs only process the rows
+         appended to their raw file since the last run and append them to
+         the processed layer as batch `batch_id`; clients (small) are fully
+         refreshed.
+      -> State lives in `state_path`: offsets.json (bytes of each raw file
+         already consumed), watermarks.json and keys.sqlite (the persistent
+         index of every event_id / retry_id already written).
+    Consistency:
+      -> If any source fails, the files of this batch and the new keys are
+         discarded and offsets and watermarks stay where they were. Keys are
+         committed before offsets are saved, so a crash in between only makes
+         the next run re-read rows that the KeyStore then drops.
+      -> `metrics` records the stages of every dataset (see RunMetrics).
+    Returns:
+      -> Counters per dataset plus the 'batch_id' of this run.
+    """
+    batch_id = batch_id or pd.Timestamp.now(tz='UTC').strftime('%Y%m%dT%H%M%S')
+    watermarks = WatermarkStore(state_path / 'watermarks.json')
+    offsets = OffsetStore(state_path / 'offsets.json')
+    keys = KeyStore(state_path / 'keys.sqlite')
+    writers = {name: ProcessedWriter(name, processed_path, fmt, batch_id=batch_id) for name in STREAMABLE}
+    results = {'batch_id': batch_id}
+
+    try:
+        for name in STREAMABLE:
+            results[name] = ingest_incremental(name, raw_path, writers[name], watermarks, keys, offsets,
+                                               chunksize, metrics=metrics)
+    except Exception:
+        for writer in writers.values():
+            writer.rollback()
+        keys.rollback()
+        keys.close()
+        raise
+
+    keys.commit()
+    keys.close()
+    for name in STREAMABLE:
+        offsets.set(DATASETS[name]['file'], results[name]['offset'])
+        if results[name]['watermark'] is not None:
+            watermarks.set(name, results[name]['watermark'])
+    offsets.save()
+    watermarks.save()
+
+    for name in STREAMABLE:
+        report_stats({k: v for k, v in results[name].items() if k not in ('watermark', 'offset')}, name)
+        logger.info(f"[Incremental] {name}: batch {batch_id}, {results[name]['rows_out']} new rows, "
+                    f"watermark {results[name]['watermark']}")
+
+    # Clients are a small dimension: full refresh
+    results['clients'] = process_dataset('clients', raw_path, processed_path, fmt, None, metrics)
+    return results
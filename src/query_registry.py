@@ -0,0 +1,135 @@
+# Query Registry
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+# Optional header of a query file, before the first SQL line:
+#   -- output: client_summary.csv
+#   -- depends: events_enriched, clients_enriched
+#   -- description: resumen de clientes
+#   -- export: false
+HEADER_LINE = re.compile(r"^--\s*(?P<key>output|depends|description|export)\s*:\s*(?P<value>.*?)\s*$", re.IGNORECASE)
+
+
+class QueryRegistry:
+    """
+    Every `.sql` file of a queries directory, with the metadata of its header
+    (see HEADER_LINE), as a dependency DAG.
+      -> A query is named by its file stem. `depends` lists the queries whose
+         result it reads as a table of the same name.
+      -> `export: false` marks an intermediate stage: it is materialized for
+         its dependents but not written to the output.
+      -> `run()` executes queries concurrently as soon as their dependencies
+         succeeded, on at most `max_workers` threads.
+    """
+
+    def __init__(self, queries_path: Path):
+        self.queries_path = queries_path
+        self.queries = self._discover()
+        self.order = self._topological_order()
+
+    def _discover(self) -> Dict[str, dict]:
+        queries = {}
+        for sql_file in sorted(self.queries_path.glob('*.sql')):
+            meta = {}
+            for line in sql_file.read_text(encoding='utf-8').splitlines():
+                if not line.strip():
+                    continue
+                match = HEADER_LINE.match(line.strip())
+                if match is None:
+                    if line.strip().startswith('--'):
+                        continue
+                    break
+                meta[match.group('key').lower()] = match.group('value')
+
+            name = sql_file.stem
+            depends = [dep.strip() for dep in meta.get('depends', '').split(',') if dep.strip()]
+            queries[name] = {
+                'sql_file': sql_file.name,
+                'output_file': meta.get('output', f"{name}.csv"),
+                'depends': depends,
+                'description': meta.get('description', name),
+                'export': meta.get('export', 'true').lower() not in ('false', 'no', '0')
+            }
+
+        for name, query in queries.items():
+            missing = [dep for dep in query['depends'] if dep not in queries]
+            if missing:
+                raise ValueError(f"Query '{name}' depends on unknown queries: {missing}")
+        return queries
+
+    def _topological_order(self) -> List[str]:
+        """Queries ordered so that dependencies come first (ties by name)"""
+        pending = {name: set(query['depends']) for name, query in self.queries.items()}
+        order = []
+        while pending:
+            ready = sorted(name for name, deps in pending.items() if not deps)
+            if not ready:
+                raise ValueError(f"Dependency cycle between queries: {sorted(pending)}")
+            for name in ready:
+                del pending[name]
+                order.append(name)
+            for deps in pending.values():
+                deps.difference_update(ready)
+        return order
+
+    def resolve(self, name: str) -> str:
+        """Query name from its name, file name or output file name"""
+        if name in self.queries:
+            return name
+        for query_name, query in self.queries.items():
+            if name in (query['sql_file'], query['output_file']):
+                return query_name
+        raise KeyError(f"Query '{name}' not found. Options: {self.order}")
+
+    def exported(self) -> List[str]:
+        return [name for name in self.order if self.queries[name]['export']]
+
+    def dependents(self, name: str) -> List[str]:
+        return [other for other in self.order if name in self.queries[other]['depends']]
+
+    def upstream(self, names: List[str]) -> List[str]:
+        """`names` plus all their transitive dependencies, in topological order"""
+        needed = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.queries[name]['depends'])
+        return [name for name in self.order if name in needed]
+
+    def run(
+        self,
+        names: List[str],
+        execute: Callable[[str], bool],
+        max_workers: Optional[int] = None
+    ) -> Dict[str, bool]:
+        """
+        Purpose:
+          -> Call `execute(name)` for every query of `names` (closed under
+             dependencies by the caller) on a thread pool; a query starts as
+             soon as all of its dependencies in `names` returned True.
+          -> A query whose dependency failed is not executed and reported False.
+        Returns:
+          -> {name: success}
+        """
+        waiting = {name: [dep for dep in self.queries[name]['depends'] if dep in names] for name in names}
+        results = {}
+        running = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while waiting or running:
+                for name in [name for name, deps in waiting.items() if all(dep in results for dep in deps)]:
+                    deps = waiting.pop(name)
+                    if all(results[dep] for dep in deps):
+                        running[pool.submit(execute, name)] = name
+                    else:
+                        results[name] = False
+                if not running:
+                    continue
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        return results
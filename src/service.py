@@ -0,0 +1,258 @@
+# Analytics Service
+import argparse
+import datetime
+import decimal
+import json
+import logging
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+import numpy as np
+import pandas as pd
+
+from sql_analytics import SQLAnalytics, _sql_literal
+
+
+# p99 latency target per endpoint, in milliseconds, measured inside the service (checked by load_test.py)
+LATENCY_TARGETS_MS = {
+    'client_summary': 5.0,
+    'event_time_series': 20.0
+}
+
+# Latest latencies kept per endpoint for the percentiles
+LATENCY_WINDOW = 100_000
+
+# Precomputed table per endpoint: registry query → (table, indexed key)
+SERVING_TABLES = {
+    'client_summary': ('serve_client_summary', 'client_id'),
+    'event_time_series': ('serve_event_time_series', 'TIMESTAMP')
+}
+
+# Statements prepared once per cursor; arguments are SQL literals
+STATEMENTS = {
+    'client_summary': "SELECT * FROM serve_client_summary WHERE client_id = $1",
+    'event_time_series': (
+        'SELECT * FROM serve_event_time_series '
+        'WHERE "TIMESTAMP" >= $1 AND "TIMESTAMP" < $2 ORDER BY "TIMESTAMP"'
+    )
+}
+
+logger = logging.getLogger(__name__)
+
+
+def _timestamp_literal(value) -> str:
+    """Any pd.Timestamp input as a naive UTC TIMESTAMP literal (the series' TIMESTAMP type)"""
+    ts = pd.Timestamp(value)
+    if pd.isna(ts):
+        raise ValueError(f"Invalid timestamp: {value!r}")
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert('UTC').tz_localize(None)
+    return f"TIMESTAMP {_sql_literal(ts.isoformat(sep=' '))}"
+
+
+def _json_default(value):
+    """JSON encoding of the DuckDB values json does not know"""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    return str(value)
+
+
+class AnalyticsService:
+    """
+    Low-latency reads over the analytics tables, in process or over HTTP (serve).
+      -> One warm SQLAnalytics connection holds client_summary and
+         event_time_series as precomputed tables, sorted and indexed by their
+         lookup key (see SQLAnalytics.materialize_query).
+      -> Each thread reads through its own cursor, where STATEMENTS are
+         prepared once; `refresh()` rebuilds the tables aside, swaps them in
+         one transaction and makes every cursor prepare them again.
+      -> Every call records its latency; `latency_report()` gives p50/p95/p99
+         per endpoint against LATENCY_TARGETS_MS.
+    """
+
+    def __init__(self, processed_path: Path, output_path: Path, database_path: Optional[Path] = None):
+        self.analytics = SQLAnalytics(processed_path, output_path, database_path, use_cache=False)
+        self.latencies = {name: deque(maxlen=LATENCY_WINDOW) for name in STATEMENTS}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.refresh()
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        Rebuild the serving tables from the processed layer; returns rows per table
+        - Every table is built under a staging name while reads go on against
+          the current ones, then all of them are swapped in one transaction
+          (see SQLAnalytics.swap_staged), so a read never sees a missing table
+          or tables from two different loads
+        """
+        with self.lock:
+            self.analytics.load_processed_to_sql()
+            for name, (table, key) in SERVING_TABLES.items():
+                self.analytics.stage_query(name, table, key)
+            swapped = self.analytics.swap_staged(dict(SERVING_TABLES.values()))
+            rows = {name: swapped[table] for name, (table, _) in SERVING_TABLES.items()}
+            self.generation += 1
+        logger.info(f"[Service] Serving tables ready: {rows}")
+        return rows
+
+    def _cursor(self):
+        """This thread's cursor, with STATEMENTS prepared for the current tables"""
+        local = self.local
+        if getattr(local, 'generation', None) != self.generation:
+            with self.lock:
+                if getattr(local, 'cursor', None) is not None:
+                    local.cursor.close()
+                local.cursor = self.analytics.conn.cursor()
+                for name, sql in STATEMENTS.items():
+                    local.cursor.execute(f"PREPARE {name} AS {sql}")
+                local.generation = self.generation
+        return local.cursor
+
+    def _execute(self, name: str, *literals: str) -> List[dict]:
+        """Run prepared statement `name` and return its rows as dicts, timing the call"""
+        start = time.perf_counter()
+        cursor = self._cursor()
+        cursor.execute(f"EXECUTE {name}({', '.join(literals)})")
+        columns = [column[0] for column in cursor.description]
+        rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        self.latencies[name].append((time.perf_counter() - start) * 1000)
+        return rows
+
+    def client_summary(self, client_id: str) -> Optional[dict]:
+        """client_summary row of `client_id`, or None if the client is unknown"""
+        rows = self._execute('client_summary', _sql_literal(client_id))
+        return rows[0] if rows else None
+
+    def event_time_series(self, start, end) -> List[dict]:
+        """event_time_series hours in [start, end) (UTC when naive), in time order"""
+        return self._execute('event_time_series', _timestamp_literal(start), _timestamp_literal(end))
+
+    def latency_report(self) -> Dict[str, dict]:
+        """Latency percentiles (ms) per endpoint over the latest LATENCY_WINDOW calls"""
+        report = {}
+        for name, values in self.latencies.items():
+            samples = np.fromiter(list(values), dtype=float)
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99]) if len(samples) else (np.nan,) * 3
+            report[name] = {
+                'count': len(samples),
+                'p50_ms': round(float(p50), 3),
+                'p95_ms': round(float(p95), 3),
+                'p99_ms': round(float(p99), 3),
+                'target_p99_ms': LATENCY_TARGETS_MS[name],
+                'ok': bool(len(samples)) and float(p99) <= LATENCY_TARGETS_MS[name]
+            }
+        return report
+
+    def reset_latencies(self) -> None:
+        """Forget the recorded latencies (e.g. after a warm-up)"""
+        for values in self.latencies.values():
+            values.clear()
+
+    def close(self) -> None:
+        self.analytics.close()
+
+
+def make_handler(service: AnalyticsService):
+    """
+    HTTP routes over `service`:
+      GET  /client_summary/<client_id>
+      GET  /event_time_series?start=2025-02-01T00:00&end=2025-02-08T00:00
+      GET  /stats      (latency_report)
+      POST /refresh    (rebuild the serving tables)
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send(self, status: int, body) -> None:
+            payload = json.dumps(body, default=_json_default).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [unquote(part) for part in url.path.strip('/').split('/')]
+            params = parse_qs(url.query)
+            try:
+                if len(parts) == 2 and parts[0] == 'client_summary':
+                    row = service.client_summary(parts[1])
+                    if row is None:
+                        self._send(404, {'error': f"Unknown client_id '{parts[1]}'"})
+                    else:
+                        self._send(200, row)
+                elif parts == ['event_time_series']:
+                    if 'start' not in params or 'end' not in params:
+                        raise ValueError("'start' and 'end' are required")
+                    self._send(200, service.event_time_series(params['start'][0], params['end'][0]))
+                elif parts == ['stats']:
+                    self._send(200, service.latency_report())
+                else:
+                    self._send(404, {'error': f"Unknown route {url.path}"})
+            except ValueError as e:
+                self._send(400, {'error': str(e)})
+            except Exception as e:
+                self._send_error(e)
+
+        def do_POST(self):
+            try:
+                if urlparse(self.path).path.strip('/') == 'refresh':
+                    self._send(200, service.refresh())
+                else:
+                    self._send(404, {'error': f"Unknown route {self.path}"})
+            except Exception as e:
+                self._send_error(e)
+
+        def _send_error(self, error: Exception) -> None:
+            """Unexpected failure: logged with its traceback, answered as a JSON 500"""
+            logger.exception(f"[Service] {self.command} {self.path} failed")
+            self._send(500, {'error': f"{type(error).__name__}: {error}"})
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return Handler
+
+
+def serve(service: AnalyticsService, host: str = '127.0.0.1', port: int = 8765) -> ThreadingHTTPServer:
+    """HTTP server over `service` (one thread per connection); call serve_forever() on it"""
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    logger.info(f"[Service] Listening on http://{host}:{server.server_port}")
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point: python src/service.py --processed data/processed --port 8765"""
+    parser = argparse.ArgumentParser(description="Serve client_summary and event_time_series over HTTP.")
+    parser.add_argument('--processed', type=Path, default=Path('/app/data/processed'))
+    parser.add_argument('--output', type=Path, default=Path('/app/data/analytics'))
+    parser.add_argument('--database', type=Path, default=None, help="warehouse .duckdb file (warm restarts)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    service = AnalyticsService(args.processed, args.output, args.database)
+    server = serve(service, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
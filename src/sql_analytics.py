@@ -1,21 +1,226 @@
 # SQL Analytics Infrastructure
+import argparse
 import pandas as pd
+import pyarrow as pa
 import duckdb
+import json
+import re
+import time
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import logging
+import shutil
+
+from cache import DEFAULT_MAX_BYTES, ResultCache
+from metrics import RunMetrics, hot_operators, measure
+from query_registry import QueryRegistry
+from transform import CATEGORY_DTYPES
+
+
+def _sql_literal(value) -> str:
+    """Literal de string SQL (paths incluidos) con comillas escapadas"""
+    return "'" + str(value).replace("'", "''") + "'"
+
 
 class SQLAnalytics:
-    def __init__(self, processed_data_path: Path, output_path: Path):
+    # Tablas base del processed layer
+    TABLES = ('clients', 'events', 'retry_logs')
+
+    # Columnas de fecha: el fallback CSV las declara TIMESTAMPTZ para que las
+    # queries no tengan que castear strings
+    TIMESTAMP_COLUMNS = {
+        'clients': ['sign_up_date'],
+        'events': ['created_at', 'completed_at'],
+        'retry_logs': ['retry_time']
+    }
+
+    # Claves UUID: en Parquet llegan como UUID (tipo lógico); el fallback CSV
+    # las declara UUID para que los joins comparen 16 bytes y no texto
+    UUID_COLUMNS = {
+        'events': ['event_id'],
+        'retry_logs': ['retry_id', 'original_event_id']
+    }
+
+    # Columnas categóricas → tipos ENUM de DuckDB (mismas categorías que
+    # transform.CATEGORY_DTYPES), comparadas como códigos enteros
+    ENUM_COLUMNS = {
+        'clients': {'sector': 'sector_enum', 'contract_tier': 'contract_tier_enum'},
+        'events': {'type': 'event_type_enum', 'status': 'event_status_enum'},
+        'retry_logs': {'retry_status': 'retry_status_enum'}
+    }
+
+    # Formatos de exportación directa desde DuckDB (COPY)
+    EXPORT_FORMATS = ('csv', 'parquet')
+
+    # Alias históricos de create_analytics_table
+    TABLE_ALIASES = {
+        'client': 'client_summary',
+        'event': 'event_time_series'
+    }
+
+    # Orden físico de las tablas materializadas (modo warehouse): las claves de
+    # join y agrupación quedan contiguas y los zone maps podan por cliente/fecha
+    WAREHOUSE_ORDER = {
+        'clients': ['client_id'],
+        'events': ['client_id', 'created_at', 'event_id'],
+        'retry_logs': ['original_event_id', 'retry_time']
+    }
+
+    # Agregados parciales sumables (mantenimiento incremental) y sus claves
+    PARTIALS = {
+        'client_summary_partial': {
+            'sql_file': 'client_summary_delta.sql',
+            'keys': ['CLIENT_ID']
+        },
+        'event_time_series_partial': {
+            'sql_file': 'event_time_series_delta.sql',
+            'keys': ['TRANSACTION_DATE', 'TRANSACTION_HOUR']
+        },
+        'retry_time_series_partial': {
+            'sql_file': 'retry_time_series_delta.sql',
+            'keys': ['RETRY_DATE', 'RETRY_HOUR']
+        },
+        'events_cube': {
+            'sql_file': 'events_cube_delta.sql',
+            'keys': ['CLIENT_ID', 'TRANSACTION_DATE', 'TRANSACTION_HOUR', 'TYPE', 'STATUS', 'CURRENCY']
+        }
+    }
+
+    # Cubo horario (events_cube): dimensiones agrupables, granos de tiempo y
+    # medidas sumables (conteos enteros salvo CUBE_SUMS); las tasas se derivan
+    # de las sumas en cada consulta
+    CUBE_DIMENSIONS = ('CLIENT_ID', 'TYPE', 'STATUS', 'CURRENCY')
+    CUBE_GRAINS = {
+        'hour': "TRANSACTION_DATE + INTERVAL '1 hour' * TRANSACTION_HOUR",
+        'day': "TRANSACTION_DATE",
+        'week': "CAST(date_trunc('week', TRANSACTION_DATE) AS DATE)",
+        'month': "CAST(date_trunc('month', TRANSACTION_DATE) AS DATE)"
+    }
+    CUBE_MEASURES = (
+        'TOTAL_EVENTS', 'TOTAL_VOLUME', 'AMOUNT_COUNT', 'DELAY_SUM', 'DELAY_COUNT',
+        'TOTAL_RETRIES', 'SUCCESSFUL_RETRIES', 'FAILED_RETRIES', 'EVENTS_WITH_RETRIES'
+    )
+    CUBE_SUMS = ('TOTAL_VOLUME', 'DELAY_SUM')
+    CUBE_RATIOS = {
+        'FAILURE_RATE': "ROUND(SUM(CASE WHEN STATUS = 'failed' THEN TOTAL_EVENTS ELSE 0 END) * 100.0 "
+                        "/ NULLIF(SUM(TOTAL_EVENTS), 0), 2)",
+        'PAY_IN_RATIO': "ROUND(SUM(CASE WHEN TYPE = 'pay_in' THEN TOTAL_EVENTS ELSE 0 END) * 100.0 "
+                        "/ NULLIF(SUM(TOTAL_EVENTS), 0), 2)",
+        'RETRY_RATE': "ROUND(SUM(EVENTS_WITH_RETRIES) * 100.0 / NULLIF(SUM(TOTAL_EVENTS), 0), 2)",
+        'AVG_DELAY_HOURS': "SUM(DELAY_SUM) / NULLIF(SUM(DELAY_COUNT), 0)"
+    }
+
+    # Modo aproximado (approx_metrics): sketches mergeables por (CLIENT_ID,
+    # fecha, hora). HyperLogLog de eventos con retries (MAX por registro) y
+    # cuantiles del delay en buckets logarítmicos (suma de conteos)
+    SKETCH_PARTIALS = {
+        'retry_hll_sketch': {
+            'sql_file': 'retry_hll_delta.sql',
+            'keys': ['CLIENT_ID', 'TRANSACTION_DATE', 'TRANSACTION_HOUR', 'REGISTER'],
+            'merge': 'max'
+        },
+        'delay_sketch': {
+            'sql_file': 'delay_sketch_delta.sql',
+            'keys': ['CLIENT_ID', 'TRANSACTION_DATE', 'TRANSACTION_HOUR', 'BUCKET']
+        }
+    }
+    SKETCH_DIMENSIONS = ('CLIENT_ID',)
+    # 2^12 registros: error estándar ~1.6% en conteos distintos
+    HLL_PRECISION = 12
+    # Error relativo máximo de cada percentil de delay
+    DELAY_RELATIVE_ACCURACY = 0.01
+    # Desplazamiento de los índices de bucket: positivos para delays > 0,
+    # negativos (espejo) para delays < 0 y 0 para delay nulo
+    DELAY_BUCKET_OFFSET = 100_000
+
+    # Tablas finales derivadas de los agregados parciales
+    INCREMENTAL_OUTPUTS = {
+        'client_summary.csv': 'client_summary_final.sql',
+        'event_time_series.csv': 'event_time_series_final.sql'
+    }
+
+    # Archivos de un batch incremental: batch-<id>-<chunk>-<i>.parquet
+    BATCH_FILE = re.compile(r"^batch-(?P<batch_id>.+)-\d{5}-\d+\.parquet$")
+
+    def __init__(
+        self,
+        processed_data_path: Path,
+        output_path: Path,
+        database_path: Optional[Path] = None,
+        use_cache: bool = True,
+        cache_max_bytes: int = DEFAULT_MAX_BYTES,
+        max_workers: Optional[int] = None,
+        export_format: str = 'csv',
+        metrics: Optional[RunMetrics] = None,
+        profile: bool = False,
+        approx_metrics: bool = False
+    ):
+        """
+        Args:
+            processed_data_path (Path): processed layer (Parquet o CSV)
+            output_path (Path): destino de las tablas analíticas
+            database_path (Path, opcional): archivo .duckdb del modo warehouse.
+                Las tablas base se materializan en él y las ejecuciones
+                siguientes las reutilizan mientras sus fuentes no cambien.
+                Sin él, DuckDB in-memory con vistas sobre el processed layer.
+            use_cache (bool): reutilizar resultados de create_analytics_table
+                mientras no cambien ni la query ni sus inputs (ver ResultCache)
+            cache_max_bytes (int): tamaño máximo de output/cache/ (LRU)
+            max_workers (int, opcional): hilos para ejecutar queries independientes
+            export_format (str): 'csv' o 'parquet'; las tablas analíticas se
+                escriben con COPY de DuckDB, sin pasar por pandas
+            metrics (RunMetrics, opcional): registra cada query como etapa
+                'sql.<query>' (wall, CPU, RSS, filas) y la carga del processed layer
+            profile (bool): guardar el profile JSON de DuckDB (EXPLAIN ANALYZE)
+                de cada query en output/profiles/ y sus operadores más lentos
+                en la etapa de metrics
+            approx_metrics (bool): mantener también los sketches SKETCH_PARTIALS
+                con los agregados parciales (ver query_sketches)
+        """
         self.processed_path = processed_data_path
         self.output_path = output_path
+        self.database_path = database_path
+        if export_format not in self.EXPORT_FORMATS:
+            raise ValueError(f"Formato de exportación '{export_format}' no válido. Opciones: {list(self.EXPORT_FORMATS)}")
+        self.export_format = export_format
+        self.metrics = metrics
+        self.profile = profile
         self.output_path.mkdir(exist_ok=True)
         
         # Path para consultas SQL
         self.queries_path = Path(__file__).parent.parent / 'queries' / 'DML'
+        self.incremental_queries_path = self.queries_path.parent / 'incremental'
+
+        # Registro de queries (headers -- output/depends) y etapas materializadas
+        self.registry = QueryRegistry(self.queries_path)
+        self.materialized = set()
+        self.max_workers = max_workers
+
+        # Estado de los agregados parciales y profiles de DuckDB
+        self.partials = {**self.PARTIALS, **self.SKETCH_PARTIALS} if approx_metrics else self.PARTIALS
+        self.partials_path = self.output_path / 'partials'
+        self.profiles_path = self.output_path / 'profiles'
+
+        # Cache de resultados (content-addressed) y DataFrames registrados
+        self.cache = ResultCache(self.output_path / 'cache', cache_max_bytes) if use_cache else None
+        self.registered_frames = {}
+        # Claves de cache calculadas antes de ejecutar cada query (ver _serve_from_cache)
+        self.cache_keys = {}
         
-        # Inicializar DuckDB in-memory
-        self.conn = duckdb.connect(':memory:')
+        # Inicializar DuckDB (in-memory o warehouse persistente)
+        if database_path is None:
+            self.conn = duckdb.connect(':memory:')
+        else:
+            database_path.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = duckdb.connect(str(database_path))
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS warehouse_sources ("
+                "table_name VARCHAR PRIMARY KEY, files VARCHAR, loaded_at TIMESTAMPTZ)"
+            )
+        # Los timestamps del processed layer están en UTC
+        self.conn.execute("SET TimeZone = 'UTC'")
+        self._create_enum_types()
+        self._create_sketch_macros()
         
         # Setup logging
         logging.basicConfig(level=logging.INFO)
@@ -26,33 +231,199 @@ class SQLAnalytics:
         self.logger.info(f"📁 Output: {self.output_path}")
         self.logger.info(f"📄 Queries: {self.queries_path}")
     
-    def load_csvs_to_sql(self):
-        """CSV → DF → SQL Tables"""
-        self.logger.info("📥 Cargando CSVs a tablas SQL...")
-        
-        csv_files = {
-            'clients': 'clients.csv',
-            'events': 'events.csv', 
-            'retry_logs': 'retry_logs.csv'
-        }
-        
-        for table_name, csv_file in csv_files.items():
-            csv_path = self.processed_path / csv_file
-            if csv_path.exists():
-                df = pd.read_csv(csv_path)
-                self.df_to_sql(df, table_name)
-                self.logger.info(f"✅ {table_name}: {len(df)} rows cargadas")
+    def load_processed_to_sql(self):
+        """
+        Processed layer → SQL views (sin pasar por pandas)
+
+        Cada tabla es una vista sobre un scan de DuckDB, en este orden de preferencia:
+          1. Dataset Parquet particionado (processed/events/created_month=YYYY-MM/...)
+          2. Archivo Parquet (processed/clients.parquet)
+          3. CSV (processed/events.csv)
+        Las consultas leen los archivos en sitio, con pushdown de proyección y de
+        predicados (las particiones por mes se podan con filtros de fecha).
+
+        En modo warehouse (database_path) cada tabla se materializa en el
+        archivo .duckdb, ordenada por WAREHOUSE_ORDER (ver _materialize_table).
+        """
+        self.logger.info("📥 Registrando processed layer como tablas SQL...")
+        # Las etapas materializadas dependen de las tablas base
+        self.materialized = set()
+
+        for table_name in self.TABLES:
+            scan = self._processed_scan(table_name)
+            if scan is None:
+                self.logger.warning(f"⚠️ {table_name} no encontrado en {self.processed_path}")
+                continue
+            select = self._typed_select(table_name)
+            with measure(self.metrics, f"sql.load.{table_name}"):
+                if self.database_path is not None:
+                    self._materialize_table(table_name, select, scan)
+                    continue
+                self.conn.execute(f"CREATE OR REPLACE VIEW {table_name} AS {select} FROM {scan}")
+            self.logger.info(f"✅ {table_name}: {scan}")
+
+    def _typed_select(self, table_name: str) -> str:
+        """SELECT que castea las columnas categóricas a sus tipos ENUM"""
+        enums = self.ENUM_COLUMNS.get(table_name, {})
+        replace = ', '.join(f"CAST({col} AS {enum}) AS {col}" for col, enum in enums.items())
+        return f"SELECT * REPLACE ({replace})" if replace else "SELECT *"
+
+    def _source_files(self, table_name: str) -> Dict[str, list]:
+        """Huella de la fuente de una tabla: {archivo: [tamaño, mtime_ns]}"""
+        dataset_dir = self.processed_path / table_name
+        if dataset_dir.is_dir():
+            paths = self._dataset_files(table_name)
+        else:
+            paths = [
+                path for path in (self.processed_path / f"{table_name}.parquet",
+                                  self.processed_path / f"{table_name}.csv")
+                if path.exists()
+            ][:1]
+        files = {}
+        for path in paths:
+            stat = path.stat()
+            files[str(path.resolve())] = [stat.st_size, stat.st_mtime_ns]
+        return files
+
+    def _materialize_table(self, table_name: str, select: str, scan: str):
+        """
+        Tabla materializada del modo warehouse, recargada solo si cambió su fuente
+
+        Compara la huella actual de los archivos con la guardada en
+        warehouse_sources:
+          - Igual → se reutiliza la tabla tal cual (arranque en caliente)
+          - Solo archivos nuevos en un dataset particionado (batches del ETL
+            incremental) → se insertan únicamente esas filas
+          - Cualquier otro cambio → recarga completa ordenada por WAREHOUSE_ORDER
+        """
+        start = time.perf_counter()
+        files = self._source_files(table_name)
+        row = self.conn.execute(
+            "SELECT files FROM warehouse_sources WHERE table_name = ?", [table_name]
+        ).fetchone()
+        stored = json.loads(row[0]) if row else None
+        kind = self.conn.execute(
+            "SELECT table_type FROM information_schema.tables WHERE table_name = ?", [table_name]
+        ).fetchone()
+        materialized = kind is not None and kind[0] == 'BASE TABLE'
+
+        if materialized and stored == files:
+            self.logger.info(f"⚡ {table_name}: reutilizada desde {self.database_path.name}")
+            return
+
+        order = ', '.join(self.WAREHOUSE_ORDER[table_name])
+        new_files = [path for path in files if stored is not None and path not in stored]
+        appendable = (
+            materialized
+            and stored is not None
+            and (self.processed_path / table_name).is_dir()
+            and all(files.get(path) == value for path, value in stored.items())
+        )
+        self.conn.execute("BEGIN TRANSACTION")
+        try:
+            if appendable:
+                file_list = ', '.join(_sql_literal(path) for path in new_files)
+                self.conn.execute(
+                    f"INSERT INTO {table_name} BY NAME {select} "
+                    f"FROM read_parquet([{file_list}], hive_partitioning = true) ORDER BY {order}"
+                )
+                action = f"{len(new_files)} archivo(s) nuevo(s) insertado(s)"
             else:
-                self.logger.warning(f"⚠️ {csv_file} no encontrado")
+                if kind is not None and kind[0] == 'VIEW':
+                    self.conn.execute(f"DROP VIEW {table_name}")
+                self.conn.execute(f"CREATE OR REPLACE TABLE {table_name} AS {select} FROM {scan} ORDER BY {order}")
+                action = "recarga completa"
+            self.conn.execute(
+                "INSERT OR REPLACE INTO warehouse_sources VALUES (?, ?, now())",
+                [table_name, json.dumps(files)]
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        elapsed = time.perf_counter() - start
+        self.logger.info(f"🧱 {table_name}: {action} ({elapsed:.2f}s)")
+
+    def _create_enum_types(self):
+        """Crear los tipos ENUM de las columnas categóricas"""
+        for columns in self.ENUM_COLUMNS.values():
+            for column, enum in columns.items():
+                exists = self.conn.execute(
+                    "SELECT 1 FROM duckdb_types() WHERE type_name = ?", [enum]
+                ).fetchone()
+                if exists:
+                    # Ya creado en el warehouse persistente
+                    continue
+                values = ', '.join(_sql_literal(value) for value in CATEGORY_DTYPES[column].categories)
+                self.conn.execute(f"CREATE TYPE {enum} AS ENUM ({values})")
+
+    def _create_sketch_macros(self):
+        """
+        Macros de los sketches (SKETCH_PARTIALS)
+
+        HyperLogLog: hash md5 de 64 bits del valor (estable entre versiones de
+        DuckDB, los sketches se persisten); los HLL_PRECISION bits bajos eligen
+        el registro y el rango es la posición del primer 1 en el resto.
+
+        Delay: bucket i de ceil(log_γ(x)) con γ = (1 + a) / (1 - a), a =
+        DELAY_RELATIVE_ACCURACY; el valor representativo 2·γ^i / (γ + 1) está
+        a menos de a (relativo) de cualquier x del bucket.
+        """
+        p = self.HLL_PRECISION
+        accuracy = self.DELAY_RELATIVE_ACCURACY
+        gamma = (1 + accuracy) / (1 - accuracy)
+        offset = self.DELAY_BUCKET_OFFSET
+        index = f"GREATEST(CAST(ceil(ln(abs(x)) / ln({gamma!r})) AS INTEGER) + {offset}, 1)"
+        power = f"pow({gamma!r}, abs(b) - {offset})"
+        self.conn.execute(
+            "CREATE OR REPLACE MACRO hll_hash(value) AS md5_number_upper(CAST(value AS VARCHAR))"
+        )
+        self.conn.execute(f"CREATE OR REPLACE MACRO hll_register(h) AS CAST(h % {2 ** p} AS SMALLINT)")
+        self.conn.execute(
+            f"CREATE OR REPLACE MACRO hll_rank(h) AS CAST("
+            f"CASE WHEN h >> {p} = 0 THEN {65 - p} ELSE {65 - p} - length(bin(h >> {p})) END AS TINYINT)"
+        )
+        self.conn.execute(
+            f"CREATE OR REPLACE MACRO delay_bucket(x) AS "
+            f"CASE WHEN x = 0 THEN 0 WHEN x > 0 THEN {index} ELSE -{index} END"
+        )
+        self.conn.execute(
+            f"CREATE OR REPLACE MACRO delay_value(b) AS "
+            f"CASE WHEN b = 0 THEN 0.0 ELSE sign(b) * 2 * {power} / {gamma + 1!r} END"
+        )
+
+    def load_csvs_to_sql(self):
+        """Compatibilidad: ahora delega en load_processed_to_sql"""
+        self.load_processed_to_sql()
+
+    def _processed_scan(self, table_name: str) -> Optional[str]:
+        """Expresión de scan de DuckDB para una tabla del processed layer"""
+        dataset_dir = self.processed_path / table_name
+        parquet_file = self.processed_path / f"{table_name}.parquet"
+        csv_file = self.processed_path / f"{table_name}.csv"
+
+        if dataset_dir.is_dir():
+            return f"read_parquet({_sql_literal(dataset_dir / '**' / '*.parquet')}, hive_partitioning = true)"
+        if parquet_file.exists():
+            return f"read_parquet({_sql_literal(parquet_file)})"
+        if csv_file.exists():
+            types = ', '.join(
+                [f"{_sql_literal(col)}: 'TIMESTAMPTZ'" for col in self.TIMESTAMP_COLUMNS.get(table_name, [])] +
+                [f"{_sql_literal(col)}: 'UUID'" for col in self.UUID_COLUMNS.get(table_name, [])]
+            )
+            return f"read_csv_auto({_sql_literal(csv_file)}, header = true, types = {{{types}}})"
+        return None
     
     def df_to_sql(self, df: pd.DataFrame, table_name: str):
         """DF → SQL Table"""
         self.conn.register(table_name, df)
+        # Huella de contenido para la cache de resultados
+        self.registered_frames[table_name] = int(pd.util.hash_pandas_object(df, index=False).sum())
         self.logger.debug(f"📊 Tabla '{table_name}' registrada en SQL")
     
-    def _load_sql_query(self, sql_filename: str) -> str:
+    def _load_sql_query(self, sql_filename: str, queries_path: Optional[Path] = None) -> str:
         """Cargar consulta SQL desde archivo"""
-        sql_file = self.queries_path / sql_filename
+        sql_file = (queries_path or self.queries_path) / sql_filename
         
         if not sql_file.exists():
             raise FileNotFoundError(f"❌ Archivo SQL no encontrado: {sql_file}")
@@ -64,7 +435,7 @@ class SQLAnalytics:
         return query
     
     def sql_to_df(self, query: str) -> pd.DataFrame:
-        """SQL Query → DF"""
+        """SQL Query → DF (materializa el resultado completo en pandas)"""
         try:
             df = self.conn.execute(query).df()
             self.logger.debug(f"🔍 Query ejecutado: {len(df)} rows retornadas")
@@ -73,6 +444,57 @@ class SQLAnalytics:
             self.logger.error(f"❌ Error en query SQL: {e}")
             raise
     
+    def export_query(
+        self,
+        query: str,
+        filename: str,
+        fmt: Optional[str] = None,
+        cursor: Optional[duckdb.DuckDBPyConnection] = None
+    ) -> int:
+        """
+        SQL Query → archivo, directo desde DuckDB (COPY, escritor paralelo)
+
+        El resultado nunca se materializa en pandas. Se escribe a un archivo
+        temporal que reemplaza al final, así un lector nunca ve un archivo a
+        medio escribir.
+
+        Args:
+            query (str): consulta SQL
+            filename (str): archivo dentro de output_path (el sufijo se ajusta a `fmt`)
+            fmt (str, opcional): 'csv' o 'parquet' (default: export_format)
+            cursor: cursor de DuckDB a usar (default: la conexión principal)
+
+        Returns:
+            int: filas exportadas
+        """
+        fmt = fmt or self.export_format
+        if fmt not in self.EXPORT_FORMATS:
+            raise ValueError(f"Formato de exportación '{fmt}' no válido. Opciones: {list(self.EXPORT_FORMATS)}")
+        output_path = self.output_path / Path(filename).with_suffix(f".{fmt}").name
+        tmp = output_path.with_name(output_path.name + '.tmp')
+        options = "FORMAT csv, HEADER" if fmt == 'csv' else "FORMAT parquet"
+        rows = (cursor or self.conn).execute(f"COPY ({query}) TO {_sql_literal(tmp)} ({options})").fetchone()[0]
+        tmp.replace(output_path)
+
+        size_mb = output_path.stat().st_size / (1024 * 1024)
+        self.logger.info(f"💾 {output_path.name}: {rows} rows exportadas ({size_mb:.2f} MB)")
+        return rows
+
+    def stream_batches(self, query: str, batch_size: int = 100_000) -> Iterator[pa.RecordBatch]:
+        """
+        SQL Query → record batches de Arrow de hasta `batch_size` filas
+
+        Para consumidores que necesitan las filas en Python sin materializar el
+        resultado completo. Usa su propio cursor, que se cierra al agotar (o
+        descartar) el generador.
+        """
+        cursor = self.conn.cursor()
+        try:
+            reader = cursor.execute(query).fetch_record_batch(batch_size)
+            yield from reader
+        finally:
+            cursor.close()
+
     def df_to_csv(self, df: pd.DataFrame, filename: str):
         """DF → CSV"""
         output_path = self.output_path / filename
@@ -86,118 +508,298 @@ class SQLAnalytics:
         Crear tabla analítica de forma parametrizada con manejo de errores
         
         Args:
-            table_type (str): Tipo de tabla a crear ('client' o 'event')
+            table_type (str): Query del registro (nombre, archivo .sql o CSV de
+                salida); 'client' y 'event' se mantienen como alias
             
         Returns:
             bool: True si se creó exitosamente, False si hubo error
         """
-        
-        # Mapeo de configuraciones por tipo de tabla
-        table_configs = {
-            'client': {
-                'sql_file': 'client_summary.sql',
-                'output_file': 'client_summary.csv',
-                'description': 'resumen de clientes'
-            },
-            'event': {
-                'sql_file': 'event_time_series.sql', 
-                'output_file': 'event_time_series.csv',
-                'description': 'series temporales de eventos'
-            }
-        }
-        
-        # Validar tipo de tabla
-        if table_type not in table_configs:
-            self.logger.error(f"❌ Tipo de tabla '{table_type}' no válido. Opciones: {list(table_configs.keys())}")
+        try:
+            name = self.registry.resolve(self.TABLE_ALIASES.get(table_type, table_type))
+        except KeyError as e:
+            self.logger.error(f"❌ Tipo de tabla '{table_type}' no válido: {e}")
             return False
-            
-        config = table_configs[table_type]
-        
+
+        if self._serve_from_cache(name):
+            return True
+
+        # Etapas intermedias que aún no se materializaron
+        for dependency in self.registry.upstream([name])[:-1]:
+            if dependency not in self.materialized and not self._execute_query(dependency):
+                return False
+        return self._execute_query(name)
+
+    def materialize_query(self, table_type: str, table_name: str, key: str) -> int:
+        """
+        Resultado de una query del registro como tabla indexada de la conexión
+
+        Pensada para lecturas puntuales (ver service.AnalyticsService): la
+        tabla queda ordenada por `key` (los zone maps podan los rangos) y con
+        un índice ART sobre `key` (búsquedas por igualdad). Se construye aparte
+        (stage_query) y se reemplaza en una transacción (swap_staged), así los
+        lectores nunca ven una tabla a medio crear.
+
+        Args:
+            table_type (str): query del registro (como en create_analytics_table)
+            table_name (str): tabla de destino
+            key (str): columna de orden e índice
+
+        Returns:
+            int: filas de la tabla
+        """
+        self.stage_query(table_type, table_name, key)
+        return self.swap_staged({table_name: key})[table_name]
+
+    def stage_query(self, table_type: str, table_name: str, key: str) -> int:
+        """
+        Construye el resultado de una query del registro en `<table_name>_new`,
+        ordenado por `key`, sin tocar `table_name` (ver swap_staged)
+
+        Returns:
+            int: filas de la tabla en staging
+        """
+        name = self.registry.resolve(self.TABLE_ALIASES.get(table_type, table_type))
+        for dependency in self.registry.upstream([name])[:-1]:
+            if dependency not in self.materialized and not self._execute_query(dependency):
+                raise RuntimeError(f"❌ Falló la etapa '{dependency}' de {name}")
+        query = self._load_sql_query(self.registry.queries[name]['sql_file'])
+
+        staging = f"{table_name}_new"
+        with measure(self.metrics, f"sql.materialize.{name}") as record:
+            self.conn.execute(f'CREATE OR REPLACE TABLE {staging} AS SELECT * FROM ({query}) ORDER BY "{key}"')
+            rows = self.conn.execute(f"SELECT COUNT(*) FROM {staging}").fetchone()[0]
+            record['rows_out'] = rows
+        return rows
+
+    def swap_staged(self, tables: Dict[str, str]) -> Dict[str, int]:
+        """
+        Reemplaza cada tabla por su `<tabla>_new` (ver stage_query) y la indexa
+        por su clave, todas en una sola transacción: los lectores ven todas las
+        tablas anteriores o todas las nuevas, nunca una mezcla ni una tabla
+        ausente
+
+        Args:
+            tables (Dict[str, str]): tabla de destino → columna del índice
+
+        Returns:
+            Dict[str, int]: filas por tabla
+        """
+        # DuckDB no renombra tablas con índices: se indexa tras el swap, en la misma transacción
+        self.conn.execute("BEGIN TRANSACTION")
         try:
-            self.logger.info(f"🔨 Creando tabla de {config['description']}...")
-            
-            # Cargar query SQL
+            for table_name, key in tables.items():
+                self.conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+                self.conn.execute(f"ALTER TABLE {table_name}_new RENAME TO {table_name}")
+                self.conn.execute(f'CREATE INDEX {table_name}_key ON {table_name} ("{key}")')
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        rows = {}
+        for table_name, key in tables.items():
+            rows[table_name] = self.conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+            self.logger.info(f"📇 {table_name}: {rows[table_name]} rows indexadas por {key}")
+        return rows
+
+    def _cache_key(self, name: str) -> str:
+        """Clave de cache: texto SQL de la query y de sus dependencias + inputs"""
+        sql = '\n'.join(
+            self._load_sql_query(self.registry.queries[query]['sql_file'])
+            for query in self.registry.upstream([name])
+        )
+        return ResultCache.key(sql, {'inputs': self._input_fingerprints(), 'format': self.export_format})
+
+    def _serve_from_cache(self, name: str) -> bool:
+        """
+        Copiar el resultado cacheado al output (True si hubo hit)
+
+        La clave se calcula una sola vez, antes de ejecutar nada, y queda en
+        `cache_keys` para que _execute_query guarde el resultado con ella.
+        """
+        config = self.registry.queries[name]
+        if self.cache is None or not config['export']:
+            return False
+        try:
+            key = self._cache_key(name)
+        except FileNotFoundError:
+            return False
+        self.cache_keys[name] = key
+        cached = self.cache.get(key)
+        if cached is None:
+            return False
+        output_file = self._output_file(name)
+        with measure(self.metrics, f"sql.{name}") as record:
+            shutil.copyfile(cached, output_file)
+            record['cached'] = True
+        self.logger.info(f"🗄️ {output_file.name}: servida desde cache")
+        return True
+
+    def _output_file(self, name: str) -> Path:
+        """Archivo de salida de una query exportable, con el sufijo de export_format"""
+        output_file = Path(self.registry.queries[name]['output_file']).with_suffix(f".{self.export_format}")
+        return self.output_path / output_file.name
+
+    def _execute_query(self, name: str) -> bool:
+        """
+        Ejecutar una query del registro en su propio cursor de DuckDB
+
+        Las queries con dependientes se materializan como tabla con su nombre
+        (los cursores no comparten tablas TEMP); las exportables se escriben en
+        el output y se guardan en la cache. Seguro para correr en paralelo.
+
+        Con `profile`, se perfila la sentencia que calcula la query (el CREATE
+        de una etapa, si no el COPY del export).
+        """
+        config = self.registry.queries[name]
+        cursor = self.conn.cursor()
+        try:
+            # Clave tomada antes de ejecutar (la de _serve_from_cache, si la hubo)
+            key = self.cache_keys.pop(name, None)
+            if key is None and self.cache is not None and config['export']:
+                key = self._cache_key(name)
+            self.logger.info(f"🔨 Creando {config['description']}...")
             query = self._load_sql_query(config['sql_file'])
             self.logger.debug(f"📄 Query cargada desde {config['sql_file']}")
-            
-            # Ejecutar query y convertir a DataFrame
-            df = self.sql_to_df(query)
-            self.logger.info(f"✅ Query ejecutada: {len(df)} rows generadas")
-            
-            # Exportar a CSV
-            self.df_to_csv(df, config['output_file'])
-            self.logger.info(f"💾 Tabla {config['output_file']} creada exitosamente")
-            
+
+            with measure(self.metrics, f"sql.{name}") as record:
+                profile_file = self._start_profile(cursor, name)
+                if self.registry.dependents(name):
+                    record['rows_out'] = cursor.execute(f"CREATE OR REPLACE TABLE {name} AS {query}").fetchone()[0]
+                    self._finish_profile(cursor, name, profile_file, record)
+                    profile_file = None
+                    self.materialized.add(name)
+                    self.logger.info(f"🧩 Etapa {name} materializada")
+                    query = f"SELECT * FROM {name}"
+                if not config['export']:
+                    return True
+
+                # Ejecutar y exportar directo desde DuckDB
+                rows = self.export_query(query, config['output_file'], cursor=cursor)
+                record['rows_out'] = rows
+                self._finish_profile(cursor, name, profile_file, record)
+            self.logger.info(f"✅ Query ejecutada: {rows} rows generadas")
+            output_file = self._output_file(name)
+            self.logger.info(f"💾 Tabla {output_file.name} creada exitosamente")
+            if self.cache is not None:
+                self.cache.put(key, output_file)
             return True
-            
+
         except FileNotFoundError as e:
             self.logger.error(f"❌ Archivo SQL no encontrado: {e}")
             return False
-            
+
         except Exception as e:
-            self.logger.error(f"❌ Error creando tabla {table_type}: {str(e)}")
+            self.logger.error(f"❌ Error creando tabla {name}: {str(e)}")
             self.logger.debug(f"📋 Detalles del error: {type(e).__name__}")
             return False
 
-    
+        finally:
+            cursor.close()
+
+    def _start_profile(self, cursor: duckdb.DuckDBPyConnection, name: str) -> Optional[Path]:
+        """Activar el profiling JSON de DuckDB en el cursor de una query (si `profile`)"""
+        if not self.profile:
+            return None
+        self.profiles_path.mkdir(parents=True, exist_ok=True)
+        profile_file = self.profiles_path / f"{name}.json"
+        cursor.execute("PRAGMA enable_profiling = 'json'")
+        cursor.execute(f"SET profiling_output = {_sql_literal(profile_file)}")
+        return profile_file
+
+    def _finish_profile(
+        self,
+        cursor: duckdb.DuckDBPyConnection,
+        name: str,
+        profile_file: Optional[Path],
+        record: dict
+    ):
+        """Desactivar el profiling y agregar los operadores más lentos a la etapa"""
+        if profile_file is None:
+            return
+        cursor.execute("PRAGMA disable_profiling")
+        profile = json.loads(profile_file.read_text())
+        operators = hot_operators(profile)
+        record['profile'] = str(profile_file)
+        record['hot_operators'] = operators
+        if operators:
+            top = operators[0]
+            self.logger.info(f"🔬 {name}: operador más lento {top['operator']} ({top['seconds']:.3f}s, "
+                             f"{top['rows']} rows) → {profile_file.name}")
+
+    def _input_fingerprints(self) -> dict:
+        """Huella de las tablas base: archivos (tamaño, mtime) o hash de DataFrames registrados"""
+        return {
+            table: self.registered_frames[table] if table in self.registered_frames else self._source_files(table)
+            for table in self.TABLES
+        }
+
     def show_table_info(self):
         """Mostrar información de las tablas cargadas"""
         self.logger.info("📋 Información de tablas SQL:")
         
-        tables = ['clients', 'events', 'retry_logs']
-        for table in tables:
+        for table in self.TABLES:
             try:
                 info = self.conn.execute(f"SELECT COUNT(1) as rows FROM {table}").fetchone()
                 columns = self.conn.execute(f"DESCRIBE {table}").df()
                 
-                print(f"\n📊 Tabla: {table}")
-                print(f"   Rows: {info[0]:,}")
-                print(f"   Columns: {len(columns)}")
-                print(f"   Schema: {', '.join(columns['column_name'].tolist())}")
+                self.logger.info(f"📊 Tabla: {table} | Rows: {info[0]:,} | Columns: {len(columns)} | "
+                                 f"Schema: {', '.join(columns['column_name'].tolist())}")
                 
             except Exception as e:
-                print(f"❌ Error accediendo tabla {table}: {e}")
+                self.logger.error(f"❌ Error accediendo tabla {table}: {e}")
 
     
-    def generate_analytics_tables(self) -> dict:
+    def generate_analytics_tables(self, max_workers: Optional[int] = None) -> dict:
         """
         Generar todas las tablas analíticas con reporte de resultados
+
+        Cada query exportable de queries/DML (ver QueryRegistry) se sirve desde
+        la cache o se ejecuta; las independientes corren en paralelo, cada una
+        en su cursor de DuckDB, con hasta `max_workers` hilos. La cache se
+        consulta primero para todas: si todas son hits no se cargan las tablas
+        base ni se toca DuckDB.
         
         Returns:
-            dict: Reporte de éxito/fallo de cada tabla generada
+            dict: Reporte de éxito/fallo de cada tabla generada, por nombre de query
         """
         self.logger.info("🎯 Generando tablas analíticas...")
-        print("=" * 50)
-        
-        # 1. Cargar datos base
-        self.load_csvs_to_sql()
-        
-        # 2. Mostrar info de tablas
-        self.show_table_info()
-        
-        # 3. Crear tablas analíticas con reporte de resultados
-        results = {}
-        tables_to_create = ['client', 'event']
-        
-        print(f"\n🔨 Creando {len(tables_to_create)} tablas analíticas...")
-        print("-" * 30)
-        
-        for table_type in tables_to_create:
-            success = self.create_analytics_table(table_type)
-            results[table_type] = success
-            
-            # Mostrar resultado inmediato
+        targets = self.registry.exported()
+        self.logger.info(f"🔨 Creando {len(targets)} tablas analíticas...")
+
+        # 1. Servir desde la cache (las claves solo dependen del SQL y de la
+        #    huella de los archivos de entrada)
+        results = {name: True for name in targets if self._serve_from_cache(name)}
+        pending = [name for name in targets if name not in results]
+        if pending:
+            # 2. Cargar datos base y mostrar info de tablas
+            self.load_processed_to_sql()
+            self.show_table_info()
+
+            # 3. Ejecutar el DAG de las restantes (con sus etapas) en paralelo
+            executed = self.registry.run(
+                self.registry.upstream(pending),
+                self._execute_query,
+                max_workers or self.max_workers
+            )
+            results.update({name: executed[name] for name in pending})
+        results = {name: results[name] for name in targets}
+
+        for name, success in results.items():
+            # Mostrar resultado
             status_emoji = "✅" if success else "❌"
-            table_name = f"{table_type}_summary.csv" if table_type == 'client' else f"{table_type}_time_series.csv"
-            print(f"{status_emoji} {table_name}: {'ÉXITO' if success else 'FALLO'}")
+            self.logger.info(f"{status_emoji} {self._output_file(name).name}: {'ÉXITO' if success else 'FALLO'}")
         
         # 4. Reporte final
         successful_tables = sum(results.values())
         total_tables = len(results)
         
-        print(f"\n📊 REPORTE FINAL:")
-        print(f"   ✅ Exitosas: {successful_tables}/{total_tables}")
-        print(f"   ❌ Fallidas: {total_tables - successful_tables}/{total_tables}")
+        self.logger.info(f"📊 REPORTE FINAL: ✅ Exitosas: {successful_tables}/{total_tables} | "
+                         f"❌ Fallidas: {total_tables - successful_tables}/{total_tables}")
+        if self.cache is not None:
+            cache_stats = self.cache.stats()
+            self.logger.info(f"🗄️ Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                             f"({cache_stats['entries']} entradas, {cache_stats['bytes'] / (1024 * 1024):.2f} MB, "
+                             f"{cache_stats['evictions']} evicciones)")
         
         if successful_tables == total_tables:
             self.logger.info("🎉 ¡Todas las tablas generadas exitosamente!")
@@ -206,27 +808,407 @@ class SQLAnalytics:
         
         return results
     
+    def refresh_analytics_tables(self) -> dict:
+        """
+        Mantenimiento incremental de client_summary y event_time_series
+
+        Las tablas analíticas se guardan como agregados parciales sumables
+        (conteos, sumas, DELAY_SUM/DELAY_COUNT en lugar de AVG) en
+        output/partials/ (ver refresh_partials). En cada refresco solo se
+        agregan los batches nuevos del ETL incremental y los ratios finales
+        (FAILURE_RATE, RETRY_RATE, PAY_IN_RATIO...) se derivan de los
+        agregados acumulados.
+
+        Returns:
+            dict: modo ('bootstrap', 'incremental' o 'noop'), batches aplicados
+                  y éxito por tabla exportada
+        """
+        self.logger.info("♻️ Refresco incremental de tablas analíticas...")
+        results = self.refresh_partials()
+        if results['mode'] == 'noop':
+            return results
+
+        # Tablas finales
+        for output_file, sql_file in self.INCREMENTAL_OUTPUTS.items():
+            try:
+                query = self._load_sql_query(sql_file, self.incremental_queries_path)
+                with measure(self.metrics, f"sql.{Path(output_file).stem}") as record:
+                    record['rows_out'] = self.export_query(query, output_file)
+                results[output_file] = True
+            except Exception as e:
+                self.logger.error(f"❌ Error derivando {output_file}: {e}")
+                results[output_file] = False
+        return results
+
+    def refresh_partials(self) -> dict:
+        """
+        Agregados parciales (PARTIALS, más SKETCH_PARTIALS con approx_metrics)
+        al día con el processed layer
+
+        Cada parcial es una tabla de la conexión, persistida en output/partials/:
+          1. Se detectan los batches del ETL incremental (archivos batch-<id>-*)
+             aún no aplicados y se exponen como EVENTS_DELTA / RETRY_LOGS_DELTA
+          2. Las consultas de queries/incremental/*_delta.sql agregan solo ese delta
+          3. Solo las filas afectadas se actualizan o insertan (ver _merge_partial)
+        Si no hay estado previo, o los archivos base del processed layer
+        cambiaron (reproceso completo), los parciales se reconstruyen desde cero.
+        Sin batches nuevos, los parciales guardados se cargan tal cual.
+
+        Returns:
+            dict: modo ('bootstrap', 'incremental' o 'noop') y batches aplicados
+        """
+        self.load_processed_to_sql()
+
+        state = self._load_partials_state()
+        files = {table: self._dataset_files(table) for table in ('events', 'retry_logs')}
+        all_files = [path for paths in files.values() for path in paths]
+        base_files = sorted(
+            str(path.relative_to(self.processed_path))
+            for path in all_files if self._batch_id(path) is None
+        )
+        all_batches = sorted({self._batch_id(path) for path in all_files} - {None})
+
+        partial_files = [self.partials_path / f"{name}.parquet" for name in self.partials]
+        bootstrap = (
+            state is None
+            or state.get('base_files') != base_files
+            or not all(path.exists() for path in partial_files)
+        )
+
+        if bootstrap:
+            self.logger.info("🧱 Sin estado válido: reconstruyendo agregados parciales")
+            pending = all_batches
+            self.conn.execute("CREATE OR REPLACE TEMP VIEW EVENTS_DELTA AS SELECT * FROM events")
+            self.conn.execute("CREATE OR REPLACE TEMP VIEW RETRY_LOGS_DELTA AS SELECT * FROM retry_logs")
+        else:
+            # Todos los batches pendientes se aplican juntos: el resto de las
+            # tablas base es exactamente lo que ya está en los parciales
+            for name in self.partials:
+                partial_file = self.partials_path / f"{name}.parquet"
+                self.conn.execute(
+                    f"CREATE OR REPLACE TABLE {name} AS SELECT * FROM read_parquet({_sql_literal(partial_file)})"
+                )
+            pending = [batch for batch in all_batches if batch not in state['applied_batches']]
+            if not pending:
+                self.logger.info("✅ Sin batches nuevos: tablas analíticas al día")
+                return {'mode': 'noop', 'batches': []}
+            for table, delta in (('events', 'EVENTS_DELTA'), ('retry_logs', 'RETRY_LOGS_DELTA')):
+                batch_files = [path for path in files[table] if self._batch_id(path) in pending]
+                self._register_delta_view(delta, table, batch_files)
+            self.logger.info(f"📦 Aplicando {len(pending)} batch(es): {', '.join(pending)}")
+
+        # Pares EVENTO ⋈ RETRY nuevos, compartidos por los deltas
+        query = self._load_sql_query('retry_pairs_delta.sql', self.incremental_queries_path)
+        self.conn.execute(f"CREATE OR REPLACE TEMP TABLE RETRY_PAIRS_DELTA AS {query}")
+
+        for name, config in self.partials.items():
+            query = self._load_sql_query(config['sql_file'], self.incremental_queries_path)
+            with measure(self.metrics, f"sql.{name}"):
+                if bootstrap:
+                    self.conn.execute(f"CREATE OR REPLACE TABLE {name} AS {query}")
+                else:
+                    self.conn.execute(f"CREATE OR REPLACE TEMP TABLE {name}_delta AS {query}")
+                    self._merge_partial(name, f"{name}_delta", config['keys'], config.get('merge', 'sum'))
+
+        # Persistir parciales y estado
+        self.partials_path.mkdir(parents=True, exist_ok=True)
+        for name in self.partials:
+            partial_file = self.partials_path / f"{name}.parquet"
+            self.conn.execute(f"COPY {name} TO {_sql_literal(partial_file)} (FORMAT parquet)")
+        applied = all_batches if bootstrap else sorted(set(state['applied_batches']) | set(pending))
+        self._save_partials_state({'applied_batches': applied, 'base_files': base_files})
+        return {'mode': 'bootstrap' if bootstrap else 'incremental', 'batches': pending}
+
+    def query_cube(
+        self,
+        grain: Optional[str] = 'day',
+        dimensions: Iterable[str] = (),
+        start=None,
+        end=None,
+        filters: Optional[Dict[str, object]] = None,
+        refresh: bool = False
+    ) -> pd.DataFrame:
+        """
+        Consulta multi-grano sobre el cubo horario events_cube
+
+        El cubo guarda medidas sumables por (CLIENT_ID, fecha, hora, TYPE,
+        STATUS, CURRENCY); cualquier grano más grueso se responde sumando sus
+        filas, sin volver a escanear events. Se mantiene con refresh_partials
+        (se construye en la primera consulta si la conexión aún no lo tiene).
+
+        Args:
+            grain (str): 'hour', 'day', 'week' (lunes) o 'month' → columna
+                PERIOD; None agrega todo el rango en una fila por grupo
+            dimensions: subconjunto de CUBE_DIMENSIONS (mayúsculas o minúsculas)
+            start, end: rango [start, end) sobre la hora de creación del evento
+            filters (dict): {dimensión: valor o lista de valores}
+            refresh (bool): aplicar antes los batches nuevos del processed layer
+
+        Returns:
+            pd.DataFrame: PERIOD, dimensiones, CUBE_MEASURES y CUBE_RATIOS
+        """
+        if grain is not None and grain not in self.CUBE_GRAINS:
+            raise ValueError(f"Grano '{grain}' no válido. Opciones: {list(self.CUBE_GRAINS)} o None")
+        dimensions = [self._cube_dimension(dimension) for dimension in dimensions]
+        if refresh or not self._has_table('events_cube'):
+            self.refresh_partials()
+
+        conditions, params = self._cube_filters(start, end, filters)
+
+        # Dimensiones como VARCHAR: ENUM tras un bootstrap, VARCHAR al recargar el parquet
+        keys = [f"{self.CUBE_GRAINS[grain]} AS PERIOD"] if grain is not None else []
+        keys += [f"CAST({dimension} AS VARCHAR) AS {dimension}" for dimension in dimensions]
+        columns = keys + [
+            f"SUM({measure}) AS {measure}" if measure in self.CUBE_SUMS else f"CAST(SUM({measure}) AS BIGINT) AS {measure}"
+            for measure in self.CUBE_MEASURES
+        ]
+        columns += [f"{expr} AS {ratio}" for ratio, expr in self.CUBE_RATIOS.items()]
+        query = f"SELECT {', '.join(columns)} FROM events_cube"
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+        if keys:
+            positions = ', '.join(str(i) for i in range(1, len(keys) + 1))
+            query += f" GROUP BY {positions} ORDER BY {positions}"
+
+        cursor = self.conn.cursor()
+        try:
+            with measure(self.metrics, 'sql.query_cube') as record:
+                df = cursor.execute(query, params).df()
+                record['rows_out'] = len(df)
+        finally:
+            cursor.close()
+        self.logger.debug(f"🧊 events_cube ({grain}, {dimensions}): {len(df)} rows")
+        return df
+
+    def query_sketches(
+        self,
+        grain: Optional[str] = 'day',
+        dimensions: Iterable[str] = (),
+        start=None,
+        end=None,
+        filters: Optional[Dict[str, object]] = None,
+        refresh: bool = False
+    ) -> pd.DataFrame:
+        """
+        Métricas aproximadas a cualquier grano desde los sketches (approx_metrics)
+
+        Los sketches por (CLIENT_ID, fecha, hora) se mergean al agrupar:
+        registros HLL con MAX y buckets de delay sumando conteos. La memoria
+        por grupo queda acotada (2^HLL_PRECISION registros y un bucket por
+        rango de delay), sin importar cuántos eventos cubra el grupo.
+
+        Args:
+            grain, start, end, refresh: como en query_cube
+            dimensions: subconjunto de SKETCH_DIMENSIONS
+            filters (dict): {dimensión de SKETCH_DIMENSIONS: valor o lista}
+
+        Returns:
+            pd.DataFrame: PERIOD, dimensiones, EVENTS_WITH_RETRIES (estimado
+            HLL), DELAY_COUNT y DELAY_P50/P95/P99_HOURS (error relativo ≤
+            DELAY_RELATIVE_ACCURACY)
+        """
+        if self.partials is self.PARTIALS:
+            raise ValueError("query_sketches requiere SQLAnalytics(..., approx_metrics=True)")
+        if grain is not None and grain not in self.CUBE_GRAINS:
+            raise ValueError(f"Grano '{grain}' no válido. Opciones: {list(self.CUBE_GRAINS)} o None")
+        dimensions = [self._cube_dimension(dimension, self.SKETCH_DIMENSIONS) for dimension in dimensions]
+        if refresh or not all(self._has_table(name) for name in self.SKETCH_PARTIALS):
+            self.refresh_partials()
+
+        conditions, params = self._cube_filters(start, end, filters, self.SKETCH_DIMENSIONS)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        keys = [f"{self.CUBE_GRAINS[grain]} AS PERIOD"] if grain is not None else []
+        keys += [f"CAST({dimension} AS VARCHAR) AS {dimension}" for dimension in dimensions]
+        names = (['PERIOD'] if grain is not None else []) + dimensions
+        select_keys = ''.join(f"{key}, " for key in keys)
+        group_keys = ''.join(f"{name}, " for name in names)
+        partition = f"PARTITION BY {', '.join(names)} " if names else ''
+        join = f"FULL OUTER JOIN DELAYS USING ({', '.join(names)})" if names else "CROSS JOIN DELAYS"
+
+        m = 2 ** self.HLL_PRECISION
+        alpha = 0.7213 / (1 + 1.079 / m)
+        # Estimador HLL con corrección de rango bajo (linear counting)
+        raw_estimate = f"{alpha * m * m!r} / (HARMONIC + {m} - NONZERO)"
+        estimate = (
+            f"CASE WHEN {raw_estimate} <= {2.5 * m} AND NONZERO < {m} "
+            f"THEN {m} * ln({m} / ({m} - NONZERO)) ELSE {raw_estimate} END"
+        )
+        # Percentil q: primer bucket cuyo acumulado supera q·(n - 1)
+        percentiles = ''.join(
+            f", delay_value(MIN(CASE WHEN CUM > {q} * (TOTAL - 1) THEN BUCKET END)) AS DELAY_P{int(q * 100)}_HOURS"
+            for q in (0.5, 0.95, 0.99)
+        )
+        query = f"""
+            WITH REGISTERS AS (
+                SELECT {select_keys}REGISTER, MAX(RANK) AS RANK
+                FROM retry_hll_sketch {where}
+                GROUP BY ALL
+            ),
+            DISTINCTS AS (
+                SELECT {group_keys}COUNT(*) AS NONZERO, SUM(pow(2.0, -RANK)) AS HARMONIC
+                FROM REGISTERS
+                GROUP BY ALL
+            ),
+            BUCKETS AS (
+                SELECT {select_keys}BUCKET, SUM(DELAY_COUNT) AS N
+                FROM delay_sketch {where}
+                GROUP BY ALL
+            ),
+            DELAYS AS (
+                SELECT {group_keys}MAX(TOTAL) AS DELAY_COUNT{percentiles}
+                FROM (
+                    SELECT *,
+                        SUM(N) OVER ({partition}ORDER BY BUCKET) AS CUM,
+                        SUM(N) OVER ({partition.strip()}) AS TOTAL
+                    FROM BUCKETS
+                )
+                GROUP BY ALL
+            )
+            SELECT
+                {group_keys}
+                CAST(COALESCE(ROUND({estimate}), 0) AS BIGINT) AS EVENTS_WITH_RETRIES,
+                CAST(COALESCE(DELAY_COUNT, 0) AS BIGINT) AS DELAY_COUNT,
+                DELAY_P50_HOURS, DELAY_P95_HOURS, DELAY_P99_HOURS
+            FROM DISTINCTS
+            {join}
+            {f"ORDER BY {', '.join(names)}" if names else ''}
+        """
+
+        cursor = self.conn.cursor()
+        try:
+            with measure(self.metrics, 'sql.query_sketches') as record:
+                # Cada CTE filtra con los mismos parámetros
+                df = cursor.execute(query, params * 2).df()
+                record['rows_out'] = len(df)
+        finally:
+            cursor.close()
+        self.logger.debug(f"📐 sketches ({grain}, {dimensions}): {len(df)} rows")
+        return df
+
+    def _cube_filters(
+        self,
+        start,
+        end,
+        filters: Optional[Dict[str, object]],
+        allowed: Iterable[str] = CUBE_DIMENSIONS
+    ) -> Tuple[List[str], list]:
+        """Condiciones WHERE y parámetros del rango [start, end) y de los filtros por dimensión"""
+        hour_start = self.CUBE_GRAINS['hour']
+        conditions, params = [], []
+        if start is not None:
+            start = pd.Timestamp(start)
+            # TRANSACTION_DATE primero: poda por zone maps antes de calcular la hora
+            conditions += ["TRANSACTION_DATE >= CAST(? AS DATE)", f"{hour_start} >= ?"]
+            params += [start.date(), start.tz_localize(None) if start.tzinfo is None else start.tz_convert(None)]
+        if end is not None:
+            end = pd.Timestamp(end)
+            conditions += ["TRANSACTION_DATE <= CAST(? AS DATE)", f"{hour_start} < ?"]
+            params += [end.date(), end.tz_localize(None) if end.tzinfo is None else end.tz_convert(None)]
+        for dimension, values in (filters or {}).items():
+            values = list(values) if isinstance(values, (list, tuple, set)) else [values]
+            if not values:
+                raise ValueError(f"Filtro vacío para la dimensión '{dimension}'")
+            conditions.append(f"{self._cube_dimension(dimension, allowed)} IN ({', '.join('?' * len(values))})")
+            params += [str(value) for value in values]
+        return conditions, params
+
+    def _cube_dimension(self, dimension: str, allowed: Iterable[str] = CUBE_DIMENSIONS) -> str:
+        """Nombre de columna del cubo para una dimensión (valida contra `allowed`)"""
+        column = dimension.upper()
+        if column not in allowed:
+            raise ValueError(f"Dimensión '{dimension}' no válida. Opciones: {list(allowed)}")
+        return column
+
+    def _has_table(self, name: str) -> bool:
+        """True si la conexión ya tiene una tabla o vista `name`"""
+        return self.conn.execute(
+            "SELECT 1 FROM information_schema.tables WHERE lower(table_name) = lower(?)", [name]
+        ).fetchone() is not None
+
+    def _dataset_files(self, table_name: str) -> List[Path]:
+        """Archivos Parquet de un dataset particionado del processed layer"""
+        dataset_dir = self.processed_path / table_name
+        return sorted(dataset_dir.rglob('*.parquet')) if dataset_dir.is_dir() else []
+
+    def _batch_id(self, path: Path) -> Optional[str]:
+        """Id del batch incremental que escribió el archivo (None si es de un proceso completo)"""
+        match = self.BATCH_FILE.match(path.name)
+        return match.group('batch_id') if match else None
+
+    def _register_delta_view(self, view_name: str, table_name: str, files: List[Path]):
+        """Vista con solo las filas de los archivos del batch (vacía si no hay)"""
+        if files:
+            file_list = ', '.join(_sql_literal(path) for path in files)
+            scan = f"SELECT * FROM read_parquet([{file_list}], hive_partitioning = true)"
+        else:
+            scan = f"SELECT * FROM {table_name} WHERE false"
+        self.conn.execute(f"CREATE OR REPLACE TEMP VIEW {view_name} AS {scan}")
+
+    def _merge_partial(self, table: str, delta: str, keys: List[str], merge: str = 'sum'):
+        """Sumar (o MAX con merge='max') el delta solo en las filas afectadas e insertar las claves nuevas"""
+        columns = [
+            row[0] for row in self.conn.execute(f"DESCRIBE {delta}").fetchall()
+            if row[0] not in keys
+        ]
+        on = ' AND '.join(f"P.{key} = D.{key}" for key in keys)
+        combine = {'sum': "P.{col} + D.{col}", 'max': "GREATEST(P.{col}, D.{col})"}[merge]
+        sets = ', '.join(
+            f"{col} = COALESCE({combine.format(col=col)}, P.{col}, D.{col})" for col in columns
+        )
+        self.conn.execute(f"UPDATE {table} AS P SET {sets} FROM {delta} AS D WHERE {on}")
+        self.conn.execute(
+            f"INSERT INTO {table} SELECT D.* FROM {delta} AS D "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {table} AS P WHERE {on})"
+        )
+        affected = self.conn.execute(f"SELECT COUNT(*) FROM {delta}").fetchone()[0]
+        self.logger.info(f"🔁 {table}: {affected} filas afectadas")
+
+    def _load_partials_state(self) -> Optional[dict]:
+        state_file = self.partials_path / 'state.json'
+        return json.loads(state_file.read_text()) if state_file.exists() else None
+
+    def _save_partials_state(self, state: dict):
+        state_file = self.partials_path / 'state.json'
+        tmp = state_file.with_name(state_file.name + '.tmp')
+        tmp.write_text(json.dumps(state, indent=2))
+        tmp.replace(state_file)
+
     def close(self):
         """Cerrar conexión DuckDB"""
         self.conn.close()
         self.logger.info("🔌 Conexión DuckDB cerrada")
 
 
-def main():
-    """Función principal"""
-    PROCESSED_DATA = Path('/app/data/processed')
-    ANALYTICS_OUTPUT = Path('/app/data/analytics')
-    
-    analytics = SQLAnalytics(PROCESSED_DATA, ANALYTICS_OUTPUT)
+def main(argv: Optional[List[str]] = None):
+    """Función principal: python src/sql_analytics.py --metrics data/metrics --profile"""
+    parser = argparse.ArgumentParser(description="Generar las tablas analíticas desde el processed layer.")
+    parser.add_argument('--processed', type=Path, default=Path('/app/data/processed'))
+    parser.add_argument('--output', type=Path, default=Path('/app/data/analytics'))
+    parser.add_argument('--format', choices=SQLAnalytics.EXPORT_FORMATS, default='csv')
+    parser.add_argument('--metrics', type=Path, default=None,
+                        help="escribir las métricas por query como JSON en este directorio")
+    parser.add_argument('--profile', action='store_true',
+                        help="guardar el profile de DuckDB (EXPLAIN ANALYZE) de cada query")
+    args = parser.parse_args(argv)
+    PROCESSED_DATA = args.processed
+    ANALYTICS_OUTPUT = args.output
+
+    metrics = RunMetrics('analytics') if args.metrics is not None or args.profile else None
+    analytics = SQLAnalytics(PROCESSED_DATA, ANALYTICS_OUTPUT, export_format=args.format,
+                             metrics=metrics, profile=args.profile)
     
     try:
         results = analytics.generate_analytics_tables()
         
         print(f"\n🎯 Tablas generadas en: {ANALYTICS_OUTPUT}")
         print("=" * 50)
-        for file in sorted(ANALYTICS_OUTPUT.glob('*.csv')):
+        for file in sorted(ANALYTICS_OUTPUT.glob(f"*.{args.format}")):
             size_mb = file.stat().st_size / (1024 * 1024)
             print(f"📄 {file.name:<25} ({size_mb:.2f} MB)")
+        if metrics is not None:
+            metrics_path = metrics.write(args.metrics or ANALYTICS_OUTPUT / 'metrics')
+            print(f"📈 Métricas: {metrics_path}")
+        return results
             
     finally:
         analytics.close()
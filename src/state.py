@@ -0,0 +1,131 @@
+# ETL State
+import json
+import re
+import sqlite3
+import pandas as pd
+from pathlib import Path
+from typing import Optional
+
+from transform import UUID_DTYPE, uuid_isin
+
+
+class _JSONStore:
+    """Per-source values of the incremental ETL, persisted as one JSON file"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.values = json.loads(path.read_text()) if path.exists() else {}
+
+    def save(self) -> None:
+        """Write atomically, so a crash never leaves a truncated file"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        tmp.write_text(json.dumps(self.values, indent=2, sort_keys=True))
+        tmp.replace(self.path)
+
+
+class WatermarkStore(_JSONStore):
+    """
+    Per-source high watermark of the incremental ETL, persisted as JSON:
+      {"events": "2025-05-31T23:59:00+00:00", "retry_logs": "..."}
+    A source's watermark is the greatest `sort_by` timestamp already written to
+    the processed layer. It does not filter input (see OffsetStore): rows
+    older than it are late arrivals, ingested and counted as such.
+    """
+
+    def get(self, name: str) -> Optional[pd.Timestamp]:
+        value = self.values.get(name)
+        return pd.Timestamp(value) if value else None
+
+    def set(self, name: str, value: pd.Timestamp) -> None:
+        self.values[name] = pd.Timestamp(value).isoformat()
+
+
+class OffsetStore(_JSONStore):
+    """
+    Bytes of each raw file already consumed by the incremental ETL, persisted
+    as JSON: {"events.csv": 1048576, "retry_logs.csv": 131072}
+    Raw files are append-only, so the next run parses only the rows after
+    the offset (see load.csv_unread_range).
+    """
+
+    def get(self, file_name: str) -> Optional[int]:
+        return self.values.get(file_name)
+
+    def set(self, file_name: str, offset: int) -> None:
+        self.values[file_name] = int(offset)
+
+
+class KeyStore:
+    """
+    Persistent on-disk index of the keys already written to the processed layer
+    (event_id, retry_id), one SQLite table per source.
+      -> UUID keys (UUID_DTYPE) are stored as 16-byte BLOBs, anything else as
+         TEXT. State written while keys were text cannot match BLOB keys, so
+         it is rejected instead of silently letting duplicates through.
+      -> `seen()` answers membership for a whole batch with one indexed join,
+         so dedup cost follows the batch size and not the history size.
+      -> Additions stay in an open transaction until `commit()`, which the
+         caller runs only after the batch was written; `rollback()` discards
+         them if the run fails.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.conn = sqlite3.connect(str(path))
+        self.conn.execute("PRAGMA journal_mode = WAL")
+
+    @staticmethod
+    def _table(name: str) -> str:
+        if not re.fullmatch(r"[a-z_]+", name):
+            raise ValueError(f"Invalid source name for key store: '{name}'")
+        return f"keys_{name}"
+
+    def _ensure(self, name: str) -> str:
+        table = self._table(name)
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key BLOB PRIMARY KEY) WITHOUT ROWID")
+        key_type = self.conn.execute(f"SELECT type FROM pragma_table_info('{table}') WHERE name = 'key'").fetchone()[0]
+        if key_type != 'BLOB':
+            raise ValueError(f"Key store {self.path} holds {name} keys as {key_type}; "
+                             f"rebuild the incremental state (see docs/SETUP.md)")
+        return table
+
+    @staticmethod
+    def _values(keys: pd.Series) -> pd.Series:
+        """Keys as SQLite values: bytes for UUID_DTYPE, str for anything else"""
+        if keys.dtype == UUID_DTYPE:
+            return keys.astype(object)
+        return keys.astype(str)
+
+    def seen(self, name: str, keys: pd.Series) -> pd.Series:
+        """Boolean mask aligned with `keys`: True where the key is already stored"""
+        table = self._ensure(name)
+        unique_keys = self._values(keys.dropna()).unique()
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS batch_keys (key BLOB PRIMARY KEY) WITHOUT ROWID")
+        self.conn.execute("DELETE FROM batch_keys")
+        self.conn.executemany("INSERT INTO batch_keys VALUES (?)", ((key,) for key in unique_keys))
+        found = [row[0] for row in self.conn.execute(f"SELECT key FROM batch_keys JOIN {table} USING (key)")]
+        if keys.dtype == UUID_DTYPE:
+            return uuid_isin(keys, found)
+        return self._values(keys).isin(found) & keys.notna()
+
+    def add(self, name: str, keys: pd.Series) -> None:
+        table = self._ensure(name)
+        self.conn.executemany(
+            f"INSERT OR IGNORE INTO {table} VALUES (?)",
+            ((key,) for key in self._values(keys.dropna()))
+        )
+
+    def count(self, name: str) -> int:
+        table = self._ensure(name)
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def rollback(self) -> None:
+        self.conn.rollback()
+
+    def close(self) -> None:
+        self.conn.close()
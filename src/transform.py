@@ -1,14 +1,181 @@
 # Functions Transform
+import logging
 import re
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
 from pathlib import Path
+from typing import Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# Allowed values of the low-cardinality columns. They define the fixed
+# categories of the pandas Categorical dtypes below ('unknown' is the
+# fallback) and the DuckDB ENUM types used by SQLAnalytics.
+ALLOWED_SECTORS = {
+    'credit':     'credit',
+    'logistics':  'logistics',
+    'payroll':    'payroll',
+    'retail':     'retail',
+    'services':   'services'
+}
+VALID_TIERS = {
+    'basic':      'basic',
+    'standard':   'standard',
+    'premium':    'premium',
+    'enterprise': 'enterprise'
+}
+EVENT_TYPES = ['pay_in', 'pay_out']
+EVENT_STATUSES = ['created', 'processing', 'completed', 'failed']
+RETRY_STATUSES = ['success', 'failed']
+
+CATEGORY_DTYPES = {
+    'sector':        pd.CategoricalDtype(list(ALLOWED_SECTORS.values()) + ['unknown']),
+    'contract_tier': pd.CategoricalDtype(list(VALID_TIERS.values()) + ['unknown']),
+    'type':          pd.CategoricalDtype(EVENT_TYPES + ['unknown']),
+    'status':        pd.CategoricalDtype(EVENT_STATUSES + ['unknown']),
+    'retry_status':  pd.CategoricalDtype(RETRY_STATUSES + ['unknown'])
+}
+
+# Declared layout of the raw timestamp columns. Values that do not match are
+# retried with pandas' format inference, so a stray layout is not lost.
+DATE_FORMATS = {
+    'sign_up_date': '%Y-%m-%d',
+    'created_at':   '%Y-%m-%d %H:%M:%S',
+    'completed_at': '%Y-%m-%d %H:%M:%S',
+    'retry_time':   '%Y-%m-%d %H:%M:%S'
+}
+
+# Text forms accepted by uuid.UUID: 32 hex digits with optional hyphens,
+# optionally wrapped in braces and/or prefixed with 'urn:uuid:'
+UUID_PATTERN = r"(?:urn:)?(?:uuid:)?\{?(?:-*[0-9a-fA-F]){32}-*\}?"
+
+# In-memory type of the UUID keys (event_id, retry_id, original_event_id):
+# the 16 raw bytes, fixed width, hashed and compared as such. Parquet stores
+# them with the UUID logical type, which DuckDB reads as its UUID type.
+UUID_DTYPE = pd.ArrowDtype(pa.binary(16))
+
+# Hex digit → nibble (0 for anything else; only validated text is decoded)
+_HEX_VALUES = np.zeros(256, dtype=np.uint8)
+for _digits, _offset in ((b'0123456789', 0), (b'abcdef', 10), (b'ABCDEF', 10)):
+    _HEX_VALUES[np.frombuffer(_digits, dtype=np.uint8)] = np.arange(len(_digits), dtype=np.uint8) + _offset
+_HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+
+
+def _report(stats: Optional[dict], key: str, value: int, message: str) -> None:
+    """
+    Purpose:
+      -> Route a data-quality counter to the log when a whole frame is
+         processed at once, or add it to `stats` when the caller is streaming
+         chunks and wants the totals summed across all of them.
+    """
+    if stats is None:
+        logger.info(message)
+    else:
+        stats[key] = stats.get(key, 0) + int(value)
 
 
-def standardize_dates(df: pd.DataFrame, columns: list, df_name: str) -> pd.DataFrame:
+def report_stats(stats: dict, name: str) -> None:
+    """
+    Purpose:
+      -> Log the counters accumulated by a streaming run in one block,
+         using the total input rows as denominator.
+    """
+    total = stats.get('rows_in', 0)
+    for key, value in stats.items():
+        if key == 'rows_in':
+            continue
+        logger.info(f"[Metadata] {name}: {key} = {value}/{total}")
+
+
+def _distinct_strings(values: pd.Series, case: str) -> Tuple[np.ndarray, pd.Series]:
+    """
+    Purpose:
+      -> Factorize a low-cardinality column and case-fold/strip only its
+         distinct values, so the string work is O(#categories), not O(rows).
+    Returns:
+      -> (codes per row, -1 for missing; normalized distinct values)
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    distinct = pd.Series(uniques, dtype=object).astype(str)
+    distinct = distinct.str.lower() if case == 'lower' else distinct.str.upper()
+    return codes, distinct.str.strip()
+
+
+def _to_fixed_category(values: pd.Series, column: str, allowed: dict) -> pd.Series:
+    """
+    Purpose:
+      -> Normalize a column straight into its fixed Categorical dtype
+         (CATEGORY_DTYPES): lowercase, strip, map through `allowed`, and
+         fall back to 'unknown' for anything else, missing values included.
+    """
+    dtype = CATEGORY_DTYPES[column]
+    codes, distinct = _distinct_strings(values, 'lower')
+    unknown = dtype.categories.get_loc('unknown')
+    distinct_codes = dtype.categories.get_indexer(distinct.map(allowed))
+    # Trailing slot for missing values (code -1)
+    distinct_codes = np.append(np.where(distinct_codes >= 0, distinct_codes, unknown), unknown)
+    return pd.Series(pd.Categorical.from_codes(distinct_codes[codes], dtype=dtype), index=values.index)
+
+
+def _to_open_category(values: pd.Series, length: int, invalid: str) -> Tuple[pd.Series, int]:
+    """
+    Purpose:
+      -> Normalize a code column whose value set is open (currency, country):
+         uppercase, strip, and replace codes that are missing or not exactly
+         `length` characters by `invalid`. Stored as a Categorical whose
+         categories are the codes seen.
+    Returns:
+      -> (normalized column, number of rows replaced by `invalid`)
+    """
+    codes, distinct = _distinct_strings(values, 'upper')
+    mask_valid = (distinct.str.len() == length).to_numpy()
+    categories = pd.Index(pd.unique(np.append(distinct[mask_valid].to_numpy(dtype=object), invalid)))
+    invalid_code = categories.get_loc(invalid)
+    distinct_codes = np.where(mask_valid, categories.get_indexer(distinct.where(mask_valid)), invalid_code)
+    # Trailing slot for missing values (code -1)
+    row_codes = np.append(distinct_codes, invalid_code)[codes]
+    n_invalid = int(np.append(~mask_valid, True)[codes].sum())
+    return pd.Series(pd.Categorical.from_codes(row_codes, categories=categories), index=values.index), n_invalid
+
+
+def _parse_dates(values: pd.Series, fmt: Optional[str]) -> pd.Series:
+    """
+    Purpose:
+      -> Parse a timestamp column to UTC datetimes, converting each distinct
+         string once and broadcasting through the factorize codes (minute
+         resolution timestamps repeat heavily).
+      -> Distinct values are parsed with `fmt` first; the ones that do not
+         match fall back to per-value format inference (format='mixed', so
+         one odd layout does not set the format for the others); the rest
+         become NaT.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.to_datetime(values, utc=True).astype('datetime64[ns, UTC]')
+    codes, uniques = pd.factorize(values.astype(object), use_na_sentinel=True)
+    distinct = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    parsed = pd.to_datetime(distinct, format=fmt or 'mixed', utc=True, errors='coerce')
+    unmatched = parsed.isna() & distinct.ne('')
+    if fmt is not None and unmatched.any():
+        parsed[unmatched] = pd.to_datetime(distinct[unmatched], format='mixed', utc=True, errors='coerce')
+    # Trailing slot for missing values (code -1)
+    parsed = pd.DatetimeIndex(parsed).append(pd.DatetimeIndex([pd.NaT], tz='UTC'))
+    return pd.Series(parsed.take(codes), index=values.index).astype('datetime64[ns, UTC]')
+
+
+def standardize_dates(
+    df: pd.DataFrame,
+    columns: list,
+    df_name: str,
+    stats: Optional[dict] = None
+) -> pd.DataFrame:
     """
     Purpose:
       -> Converts the date/time columns to UTC datetime, marking errors as NaT.
+      -> Each column is parsed with its DATE_FORMATS layout (inference as
+         fallback), once per distinct string, via _parse_dates.
     Disclaimer: 
       -> Here we assume that all dates received are expressed in UTC format,
          since we are not clear on the input or the system that creates them. 
@@ -26,10 +193,13 @@ def standardize_dates(df: pd.DataFrame, columns: list, df_name: str) -> pd.DataF
          it would be key to tag those transactions that were complemented with averages
          to understand and improve the system. Today it is not a priority as our 
          validation says we have 0 such cases.
+    Streaming:
+      -> When `stats` is given, null counts are added to it per column instead
+         of being printed, so chunked runs report totals once at the end.
     """
     for column in columns:
         # Parseo a datetime con UTC
-        df[column] = pd.to_datetime(df[column], utc=True, errors='coerce')
+        df[column] = _parse_dates(df[column], DATE_FORMATS.get(column))
 
         # Conteo total de valores no parseados
         total_null = df[column].isna().sum()
@@ -39,12 +209,16 @@ def standardize_dates(df: pd.DataFrame, columns: list, df_name: str) -> pd.DataF
             # Estados donde esperamos fecha de completado
             mask_should_have = ~df['status'].isin(['processing', 'created'])
             null_should_have = df.loc[mask_should_have, column].isna().sum()
-            print(
+            if stats is not None:
+                _report(stats, f"{column}_null", total_null, "")
+            _report(
+                stats, f"{column}_null_unexpected", null_should_have,
                 f"[{df_name}] '{column}': {total_null} nulls "
                 f"({null_should_have} en eventos con status ≠ processing/created)"
             )
         else:
-            print(f"[{df_name}] '{column}': {total_null} valores no parseados")
+            _report(stats, f"{column}_unparsed", total_null,
+                    f"[{df_name}] '{column}': {total_null} valores no parseados")
     return df
 
 
@@ -52,18 +226,34 @@ def deduplicate_logic(
     df: pd.DataFrame,
     subset: list,
     sort_by: str,
-    name: str
+    name: str,
+    stats: Optional[dict] = None,
+    preserve_order: bool = False,
+    winners: Optional[list] = None
 ) -> pd.DataFrame:
     """
     Purpose:
       -> Remove duplicate rows based on the `subset` of key columns,
          keeping the earliest record as determined by `sort_by` ascending.
+      -> One hashed pass (`duplicated(keep=False)`) finds the rows whose key
+         repeats; only those are sorted to pick the winner per key, so the
+         non-duplicate majority is neither sorted nor copied more than once.
+         Ties on `sort_by` keep the first row in input order; missing
+         `sort_by` values lose against any timestamp.
 
     Parameters:
-      df      : Input DataFrame
-      subset  : List of column names to define duplicate groups
-      sort_by : Column name to sort by (earliest first)
-      name    : Logical name for logging (e.g. 'events', 'retries', 'clients')
+      df             : Input DataFrame
+      subset         : List of column names to define duplicate groups
+      sort_by        : Column name to sort by (earliest first)
+      name           : Logical name for logging (e.g. 'events', 'retries', 'clients')
+      stats          : Optional accumulator; when given, the duplicate count is added
+                       to stats['duplicates'] and the number of repeated keys to
+                       stats['duplicate_keys'] instead of being printed
+      preserve_order : True keeps the surviving rows in input order; False (default)
+                       keeps the non-duplicate rows in input order and appends
+                       the winners of the repeated keys, earliest first
+      winners        : Optional list; the index labels of the rows kept for
+                       repeated keys are appended to it
 
     Next Features:
       -> Implement a conflict-resolution mechanism to persist key duplicates
@@ -71,19 +261,42 @@ def deduplicate_logic(
     """
     before = len(df)
 
-    # Ensure sort_by column is datetime or comparable
-    df_sorted = df.sort_values(by=sort_by, ascending=True)
+    # Single hashed pass: every row whose key appears more than once
+    mask_dup = df.duplicated(subset=subset, keep=False).to_numpy()
+    dup_positions = np.flatnonzero(mask_dup)
+
+    # Earliest row per repeated key (stable, so ties keep input order)
+    df_dup = df.iloc[dup_positions]
+    order = np.argsort(df_dup[sort_by].rank(method='first', na_option='bottom').to_numpy(), kind='stable')
+    first = ~df_dup.iloc[order].duplicated(subset=subset, keep='first').to_numpy()
+    win_positions = dup_positions[order[first]]
 
-    # Drop duplicates, keeping the first (earliest) occurrence per subset group
-    df_clean = df_sorted.drop_duplicates(subset=subset, keep='first')
+    if not len(dup_positions):
+        df_clean = df
+    elif preserve_order:
+        mask_keep = ~mask_dup
+        mask_keep[win_positions] = True
+        df_clean = df[mask_keep]
+    else:
+        df_clean = pd.concat([df[~mask_dup], df.iloc[win_positions]])
+
+    if winners is not None:
+        winners.extend(df.index[win_positions])
 
     after = len(df_clean)
-    print(f"[Deduplicate] {name}: {before} → {after} rows (kept earliest by {sort_by})")
+    if stats is not None:
+        _report(stats, 'duplicate_keys', len(win_positions), "")
+    _report(stats, 'duplicates', before - after,
+            f"[Deduplicate] {name}: {before} → {after} rows "
+            f"({len(win_positions)} repeated keys, kept earliest by {sort_by})")
 
     return df_clean
 
 
-def normalize_clients_metadata(df_clients: pd.DataFrame) -> pd.DataFrame:
+def normalize_clients_metadata(
+    df_clients: pd.DataFrame,
+    stats: Optional[dict] = None
+) -> pd.DataFrame:
     """
     Purpose:
       -> Clean and standardize client metadata fields:
@@ -92,49 +305,31 @@ def normalize_clients_metadata(df_clients: pd.DataFrame) -> pd.DataFrame:
             fill others as 'unknown'
          3. 'client_name': remove punctuation (_ . , -), normalize spaces,
             apply Title Case
+    Encoding:
+      -> 'sector' and 'contract_tier' are pandas Categoricals with the fixed
+         categories of CATEGORY_DTYPES; values are normalized once per
+         distinct string and broadcast through the integer codes.
     Next Features:
       -> Enrich sector by web scraping company websites or using GenAI
          to interpret 'notes' and validate category.
+    Streaming:
+      -> When `stats` is given, the 'unknown' counts are added to it instead
+         of being logged, like the other normalize_* functions.
     """
     df = df_clients.copy()
     total = len(df)
   
     # 1) Normalize 'sector' to allowed values
-    allowed_sectors = {
-        'credit':     'credit',
-        'logistics':  'logistics',
-        'payroll':    'payroll',
-        'retail':     'retail',
-        'services':   'services'
-    }
-    df['sector'] = (
-        df['sector']
-        .astype(str)
-        .str.lower()
-        .str.strip()
-        .map(allowed_sectors)
-        .fillna('unknown')
-    )
+    df['sector'] = _to_fixed_category(df['sector'], 'sector', ALLOWED_SECTORS)
     unknown_sector = (df['sector'] == 'unknown').sum()
-    print(f"[Metadata] clients: {unknown_sector}/{total} sectors set to 'unknown'")
+    _report(stats, 'unknown_sector', unknown_sector,
+            f"[Metadata] clients: {unknown_sector}/{total} sectors set to 'unknown'")
 
     # 2) Normalize 'contract_tier'
-    valid_tiers = {
-        'basic':      'basic',
-        'standard':   'standard',
-        'premium':    'premium',
-        'enterprise': 'enterprise'
-    }
-    df['contract_tier'] = (
-        df['contract_tier']
-        .astype(str)
-        .str.lower()
-        .str.strip()
-        .map(valid_tiers)
-        .fillna('unknown')
-    )
+    df['contract_tier'] = _to_fixed_category(df['contract_tier'], 'contract_tier', VALID_TIERS)
     unknown_tier   = (df['contract_tier'] == 'unknown').sum()
-    print(f"[Metadata] clients: {unknown_tier}/{total} tiers set to 'unknown'")
+    _report(stats, 'unknown_contract_tier', unknown_tier,
+            f"[Metadata] clients: {unknown_tier}/{total} tiers set to 'unknown'")
 
     # 3) Normalize 'client_name'
     def clean_name(name: str) -> str:
@@ -150,7 +345,10 @@ def normalize_clients_metadata(df_clients: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def normalize_events_metadata(df_events: pd.DataFrame) -> pd.DataFrame:
+def normalize_events_metadata(
+    df_events: pd.DataFrame,
+    stats: Optional[dict] = None
+) -> pd.DataFrame:
     """
     Purpose:
       -> Clean and standardize events metadata fields:
@@ -168,117 +366,254 @@ def normalize_events_metadata(df_events: pd.DataFrame) -> pd.DataFrame:
          7. 'origin_country' & 'destination_country':
             -> Cast to uppercase & strip
             -> Enforce 2-letter codes (invalid or missing → 'XX') by ISO 3166-1 alpha-2
+    Encoding:
+      -> 'type' and 'status' use the fixed CATEGORY_DTYPES; 'currency',
+         'error_code' and the countries are Categoricals over the values
+         actually seen (open sets), written as dictionary-encoded Parquet.
     Next Features:
       -> Integrate GeoIP lookup for missing country codes
       -> Use GenAI to interpret rare error_codes
+    Streaming:
+      -> When `stats` is given, every counter above is added to it instead of
+         being printed, so chunked runs report totals once at the end.
     """
     df = df_events.copy()
     total = len(df)
 
     # 1) Drop rows missing critical keys
     df = df.dropna(subset=['event_id', 'client_id', 'created_at'])
-    print(f"[Metadata] events: {total} → {len(df)} after dropping missing keys")
+    _report(stats, 'missing_keys', total - len(df),
+            f"[Metadata] events: {total} → {len(df)} after dropping missing keys")
 
     # 2) Normalize client_id
     df['client_id'] = df['client_id'].astype(str).str.strip()
 
     # 3) Normalize type
-    df['type'] = (
-        df['type']
-        .astype(str)
-        .str.lower()
-        .str.strip()
-        .where(lambda s: s.isin(['pay_in','pay_out']), other='unknown')
-    )
+    df['type'] = _to_fixed_category(df['type'], 'type', {t: t for t in EVENT_TYPES})
     mask_type = df['type'] == 'unknown'
     n_bad_types = mask_type.sum()
-    print(f"[Metadata] events: {n_bad_types}/{total} invalid type set to 'unknown'")
+    _report(stats, 'bad_type', n_bad_types,
+            f"[Metadata] events: {n_bad_types}/{total} invalid type set to 'unknown'")
 
 
     # 4) Currency enforcement
-    df['currency'] = df['currency'].astype(str).str.upper().str.strip()
-    mask_currency = df['currency'].str.len() != 3
-    n_bad_currency = mask_currency.sum()
-    df.loc[mask_currency, 'currency'] = 'XXX'
-    print(f"[Metadata] events: {n_bad_currency}/{total} invalid currency codes set to 'XXX'")
+    df['currency'], n_bad_currency = _to_open_category(df['currency'], 3, 'XXX')
+    _report(stats, 'bad_currency', n_bad_currency,
+            f"[Metadata] events: {n_bad_currency}/{total} invalid currency codes set to 'XXX'")
 
     # 5) Normalize status
-    allowed_status = {'created','processing','completed','failed'}
-    df['status'] = (
-        df['status']
-        .astype(str)
-        .str.lower()
-        .str.strip()
-        .where(lambda s: s.isin(allowed_status), other='unknown')
-    )
+    df['status'] = _to_fixed_category(df['status'], 'status', {s: s for s in EVENT_STATUSES})
     mask_status = df['status'] == 'unknown'
     n_bad_status = mask_status.sum()
-    print(f"[Metadata] events: {n_bad_status}/{total} invalid status code set to 'unknown'")
+    _report(stats, 'bad_status', n_bad_status,
+            f"[Metadata] events: {n_bad_status}/{total} invalid status code set to 'unknown'")
 
 
     # 6) Clean error_code
-    df['error_code'] = df['error_code'].astype(str).str.upper().str.strip()
-    mask_failed = df['status'] == 'failed'
-    df.loc[~mask_failed & df['error_code'].isin(['','NONE','NAN']), 'error_code'] = 'NONE'
-    df.loc[ mask_failed & df['error_code'].isin(['','NONE','NAN']), 'error_code'] = 'UNKNOWN'
+    codes, distinct = _distinct_strings(df['error_code'], 'upper')
+    mask_filled = ~distinct.isin(['', 'NONE', 'NAN']).to_numpy()
+    categories = pd.Index(pd.unique(np.append(distinct[mask_filled].to_numpy(dtype=object), ['NONE', 'UNKNOWN'])))
+    # Empty and missing values (trailing slot, code -1) get code -1 here
+    distinct_codes = np.append(categories.get_indexer(distinct.where(mask_filled)), -1)
+    row_codes = distinct_codes[codes]
+    mask_failed = (df['status'] == 'failed').to_numpy()
+    mask_empty = row_codes < 0
+    row_codes[~mask_failed & mask_empty] = categories.get_loc('NONE')
+    row_codes[ mask_failed & mask_empty] = categories.get_loc('UNKNOWN')
+    df['error_code'] = pd.Categorical.from_codes(row_codes, categories=categories)
     mask_error_code = df['status'] == 'unknown'
     n_bad_error_code = mask_error_code.sum()
-    print(f"[Metadata] events: {n_bad_error_code}/{total} invalid error code set to 'unknown'")
+    _report(stats, 'bad_error_code', n_bad_error_code,
+            f"[Metadata] events: {n_bad_error_code}/{total} invalid error code set to 'unknown'")
 
     # 7) Country code enforcement
     for col in ['origin_country','destination_country']:
-        df[col] = df[col].astype(str).str.upper().str.strip()
-        mask_country = df[col].str.len() != 2
-        n_bad_country = mask_country.sum()
-        df.loc[mask_country, col] = 'XX'
-        print(f"[Metadata] events: {n_bad_country}/{total} invalid {col} codes set to 'XX'")
+        df[col], n_bad_country = _to_open_category(df[col], 2, 'XX')
+        _report(stats, f"bad_{col}", n_bad_country,
+                f"[Metadata] events: {n_bad_country}/{total} invalid {col} codes set to 'XX'")
 
     return df
 
 
-def normalize_retry_logs_metadata(df_retry_logs: pd.DataFrame) -> pd.DataFrame:
+def is_valid_uuid(values: pd.Series) -> pd.Series:
+    """
+    Purpose:
+      -> Vectorized UUID format check over a whole column: a single regex
+         match on an Arrow string array instead of building a uuid.UUID per
+         row. Accepts the same text forms as uuid.UUID.
+      -> Keys already encoded as UUID_DTYPE are valid unless missing.
+    Returns:
+      -> Boolean Series aligned with `values` (missing values are invalid).
+    """
+    if values.dtype == UUID_DTYPE:
+        return values.notna()
+    matches = values.astype('string[pyarrow]').str.fullmatch(UUID_PATTERN)
+    return matches.fillna(False).astype(bool)
+
+
+def encode_uuids(values: pd.Series) -> pd.Series:
+    """
+    Purpose:
+      -> Text UUIDs (any form accepted by is_valid_uuid) → UUID_DTYPE, the 16
+         raw bytes. The hex digits are decoded with a lookup table over the
+         whole column at once; invalid and missing values become null.
+    """
+    if values.dtype == UUID_DTYPE:
+        return values
+    text = values.astype('string[pyarrow]')
+    mask_valid = text.str.fullmatch(UUID_PATTERN).fillna(False).to_numpy(dtype=bool)
+    # Validated text only has 'urn:' / 'uuid:' as prefixes, never inside the digits
+    digits = text[mask_valid].str.replace(r"urn:|uuid:|[{}-]", '', regex=True)
+    # Every remaining value is exactly 32 hex digits: read the Arrow data buffer as a matrix
+    array = pa.array(digits).cast(pa.string())
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+    offset = int(np.frombuffer(array.buffers()[1], dtype=np.int32)[array.offset]) if len(array) else 0
+    hex_matrix = np.frombuffer(array.buffers()[2] or b'', dtype=np.uint8)[offset:offset + 32 * len(array)]
+    hex_matrix = _HEX_VALUES[hex_matrix.reshape(-1, 32)]
+    raw = np.zeros((len(values), 16), dtype=np.uint8)
+    raw[mask_valid] = (hex_matrix[:, 0::2] << 4) | hex_matrix[:, 1::2]
+    encoded = pa.FixedSizeBinaryArray.from_buffers(
+        pa.binary(16), len(values),
+        [pa.py_buffer(np.packbits(mask_valid, bitorder='little')), pa.py_buffer(raw.tobytes())]
+    )
+    return pd.Series(pd.arrays.ArrowExtensionArray(encoded), index=values.index)
+
+
+def decode_uuids(values: pd.Series) -> pd.Series:
+    """
+    Purpose:
+      -> UUID_DTYPE → canonical text (8-4-4-4-12, lowercase), for exports
+         only; missing values stay missing.
+    """
+    array = pa.array(values, type=pa.binary(16))
+    raw = np.frombuffer(array.buffers()[1], dtype=np.uint8)[array.offset * 16:(array.offset + len(array)) * 16]
+    raw = raw.reshape(-1, 16)
+    text = np.full((len(array), 36), ord('-'), dtype=np.uint8)
+    positions = [p for p in range(36) if p not in (8, 13, 18, 23)]
+    text[:, positions[0::2]] = _HEX_DIGITS[raw >> 4]
+    text[:, positions[1::2]] = _HEX_DIGITS[raw & 15]
+    decoded = pd.Series(np.char.decode(text.view('S36').ravel(), 'ascii'), index=values.index, dtype=object)
+    return decoded.where(values.notna().to_numpy(), None).astype('string')
+
+
+def uuid_isin(values: pd.Series, keys) -> pd.Series:
+    """
+    Purpose:
+      -> Boolean mask of the UUID_DTYPE `values` found in `keys` (16-byte
+         values: a UUID_DTYPE Series or any iterable of bytes); missing
+         values are never found.
+      -> Compared on the Arrow binary arrays: pandas isin against bytes goes
+         through numpy, which strips trailing NUL bytes, so those keys
+         never matched.
+    """
+    key_array = pa.array(keys.array if isinstance(keys, pd.Series) else list(keys), type=pa.binary(16))
+    found = pc.is_in(pa.array(values.array, type=pa.binary(16)), value_set=key_array, skip_nulls=True)
+    return pd.Series(found.fill_null(False).to_numpy(zero_copy_only=False), index=values.index)
+
+
+def encode_uuid_keys(
+    df: pd.DataFrame,
+    columns: list,
+    name: str,
+    stats: Optional[dict] = None
+) -> pd.DataFrame:
+    """
+    Purpose:
+      -> Store the UUID key `columns` as UUID_DTYPE from the first step on, so
+         dedup, the retry checks and the processed layer work on 16-byte keys.
+      -> Rows whose key is present but not a valid UUID are dropped here
+         (counted as 'invalid_<column>'); missing keys stay missing and are
+         dropped by the normalize_* step as before.
+    """
+    if not columns:
+        return df
+    encoded = {}
+    mask_invalid = np.zeros(len(df), dtype=bool)
+    for column in columns:
+        encoded[column] = encode_uuids(df[column])
+        mask_column = (encoded[column].isna() & df[column].notna()).to_numpy()
+        _report(stats, f"invalid_{column}", mask_column.sum(),
+                f"[Metadata] {name}: {mask_column.sum()}/{len(df)} invalid {column} format")
+        mask_invalid |= mask_column
+    df = df.assign(**encoded)
+    return df[~mask_invalid] if mask_invalid.any() else df
+
+
+def cross_reference_retries(
+    df_retry_logs: pd.DataFrame,
+    event_ids,
+    stats: Optional[dict] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Purpose:
+      -> Check that every retry points to a known event: a hash semi-join of
+         'original_event_id' against `event_ids` (e.g. the event_id column
+         of the processed events).
+      -> Pass a unique pd.Index to reuse its hash table across chunks;
+         anything else is hashed on every call.
+    Returns:
+      -> (retries with a known event, orphan retries)
+    """
+    if not isinstance(event_ids, pd.Index):
+        event_ids = pd.Index(pd.unique(pd.Series(event_ids)))
+    found = event_ids.get_indexer(df_retry_logs['original_event_id'])
+    mask_known = pd.Series(found >= 0, index=df_retry_logs.index)
+    n_orphans = int((~mask_known).sum())
+    _report(stats, 'orphan_retries', n_orphans,
+            f"[Metadata] retry_logs: {n_orphans}/{len(df_retry_logs)} retries without a matching event")
+    return df_retry_logs[mask_known], df_retry_logs[~mask_known]
+
+
+def normalize_retry_logs_metadata(
+    df_retry_logs: pd.DataFrame,
+    stats: Optional[dict] = None
+) -> pd.DataFrame:
     """
     Purpose:
       -> Clean and standardize retry logs metadata fields:
          1. Drop rows missing critical keys (retry_id, original_event_id, retry_time)
-         2. 'retry_id' & 'original_event_id': validate UUID format
+         2. 'retry_id' & 'original_event_id': validate UUID format (a no-op
+            once encode_uuid_keys stored them as UUID_DTYPE)
          3. 'retry_attempt': validate integer in range 1-3
          4. 'retry_status': normalize to {'success','failed'}, flag others as 'unknown'
-         5. 'retry_time': ensure proper datetime format
+         5. 'retry_time': kept as the UTC datetime set by standardize_dates,
+            so the processed layer and SQL read it typed
+    Encoding:
+      -> 'retry_status' is a Categorical with the fixed CATEGORY_DTYPES.
+    Referential check:
+      -> Orphan retries (original_event_id not in events) are handled by
+         cross_reference_retries, which needs the processed events.
     Next Features:
       -> Validate retry_attempt sequences (should be consecutive 1,2,3 for same event)
-      -> Cross-reference original_event_id with events table for consistency
+    Streaming:
+      -> When `stats` is given, every counter above is added to it instead of
+         being printed, so chunked runs report totals once at the end.
     """
-    import uuid
-    
     df = df_retry_logs.copy()
     total = len(df)
 
     # 1) Drop rows missing critical keys
     df = df.dropna(subset=['retry_id', 'original_event_id', 'retry_time'])
-    print(f"[Metadata] retry_logs: {total} → {len(df)} after dropping missing keys")
+    _report(stats, 'missing_keys', total - len(df),
+            f"[Metadata] retry_logs: {total} → {len(df)} after dropping missing keys")
 
     # 2) Validate UUID format for retry_id and original_event_id
-    def is_valid_uuid(value):
-        try:
-            uuid.UUID(str(value))
-            return True
-        except (ValueError, TypeError):
-            return False
-
     # Check retry_id
-    invalid_retry_id = ~df['retry_id'].apply(is_valid_uuid)
+    invalid_retry_id = ~is_valid_uuid(df['retry_id'])
     n_invalid_retry_id = invalid_retry_id.sum()
     if n_invalid_retry_id > 0:
-        print(f"[Metadata] retry_logs: {n_invalid_retry_id}/{len(df)} invalid retry_id format")
+        _report(stats, 'invalid_retry_id', n_invalid_retry_id,
+                f"[Metadata] retry_logs: {n_invalid_retry_id}/{len(df)} invalid retry_id format")
         # Drop rows with invalid UUIDs
         df = df[~invalid_retry_id]
 
     # Check original_event_id
-    invalid_event_id = ~df['original_event_id'].apply(is_valid_uuid)
+    invalid_event_id = ~is_valid_uuid(df['original_event_id'])
     n_invalid_event_id = invalid_event_id.sum()
     if n_invalid_event_id > 0:
-        print(f"[Metadata] retry_logs: {n_invalid_event_id}/{len(df)} invalid original_event_id format")
+        _report(stats, 'invalid_original_event_id', n_invalid_event_id,
+                f"[Metadata] retry_logs: {n_invalid_event_id}/{len(df)} invalid original_event_id format")
         # Drop rows with invalid UUIDs
         df = df[~invalid_event_id]
 
@@ -287,23 +622,16 @@ def normalize_retry_logs_metadata(df_retry_logs: pd.DataFrame) -> pd.DataFrame:
     invalid_attempt = ~df['retry_attempt'].isin([1, 2, 3])
     n_invalid_attempt = invalid_attempt.sum()
     if n_invalid_attempt > 0:
-        print(f"[Metadata] retry_logs: {n_invalid_attempt}/{len(df)} invalid retry_attempt (not 1-3)")
+        _report(stats, 'invalid_retry_attempt', n_invalid_attempt,
+                f"[Metadata] retry_logs: {n_invalid_attempt}/{len(df)} invalid retry_attempt (not 1-3)")
         # Drop rows with invalid attempts
         df = df[~invalid_attempt]
 
     # 4) Normalize retry_status
-    df['retry_status'] = (
-        df['retry_status']
-        .astype(str)
-        .str.lower()
-        .str.strip()
-        .where(lambda s: s.isin(['success', 'failed']), other='unknown')
-    )
+    df['retry_status'] = _to_fixed_category(df['retry_status'], 'retry_status', {s: s for s in RETRY_STATUSES})
     mask_status = df['retry_status'] == 'unknown'
     n_bad_status = mask_status.sum()
-    print(f"[Metadata] retry_logs: {n_bad_status}/{len(df)} invalid status set to 'unknown'")
-
-    # 5) Ensure retry_time is string format for consistency
-    df['retry_time'] = df['retry_time'].astype(str).str.strip()
+    _report(stats, 'bad_retry_status', n_bad_status,
+            f"[Metadata] retry_logs: {n_bad_status}/{len(df)} invalid status set to 'unknown'")
 
     return df
@@ -0,0 +1,449 @@
+# Functions Transform (DuckDB engine)
+import argparse
+import logging
+import shutil
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from load import NA_VALUES, RAW_SCHEMAS
+from metrics import RunMetrics, measure
+from pipeline import DATASETS, ORPHAN_ACTIONS, PROCESSED_FORMATS, _remove, processed_target, run_pipeline
+from sql_analytics import _sql_literal
+from transform import (
+    ALLOWED_SECTORS,
+    DATE_FORMATS,
+    EVENT_STATUSES,
+    EVENT_TYPES,
+    RETRY_STATUSES,
+    UUID_PATTERN,
+    VALID_TIERS,
+    report_stats
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def _duckdb_type(dtype: pa.DataType) -> str:
+    """
+    DuckDB type of a RAW_SCHEMAS column: numbers keep their type, text and
+    dictionary codes stay VARCHAR, so the SQL rules see the same strings
+    pandas does (dates are parsed by the rules, keys are never type-inferred)
+    """
+    if pa.types.is_floating(dtype):
+        return 'DOUBLE'
+    if pa.types.is_integer(dtype):
+        return 'BIGINT'
+    return 'VARCHAR'
+
+
+def _fixed_category(column: str, allowed) -> str:
+    """SQL of _to_fixed_category: lowercase, strip, keep allowed values, else 'unknown'"""
+    values = ', '.join(_sql_literal(value) for value in allowed)
+    return f"CASE WHEN lower(strip_ws({column})) IN ({values}) THEN lower(strip_ws({column})) ELSE 'unknown' END"
+
+
+def _open_category(column: str, length: int, invalid: str) -> str:
+    """SQL of _to_open_category: uppercase, strip, codes not `length` long → `invalid`"""
+    return (f"CASE WHEN length(strip_ws({column})) = {length} THEN upper(strip_ws({column})) "
+            f"ELSE {_sql_literal(invalid)} END")
+
+
+def _parse_date(column: str) -> str:
+    """SQL of _parse_dates: the DATE_FORMATS layout first, then DuckDB's own timestamp parsing"""
+    fmt = DATE_FORMATS.get(column)
+    inferred = f"TRY_CAST(strip_ws({column}) AS TIMESTAMPTZ)"
+    if fmt is None:
+        return inferred
+    return f"COALESCE(TRY_STRPTIME(strip_ws({column}), {_sql_literal(fmt)})::TIMESTAMPTZ, {inferred})"
+
+
+def _parse_uuid(column: str) -> str:
+    """SQL of encode_uuids: text accepted by UUID_PATTERN → UUID, anything else → NULL"""
+    digits = f"regexp_replace({column}, 'urn:|uuid:|[{{}}-]', '', 'g')"
+    return f"CASE WHEN regexp_full_match({column}, {_sql_literal(UUID_PATTERN)}) THEN CAST({digits} AS UUID) END"
+
+
+# normalize_* rules per dataset:
+#   'keys'      → rows dropped when any of these is missing
+#   'checks'    → further row filters, in order, as (counter, SQL condition)
+#   'replace'   → normalized columns
+#   'counters'  → data-quality counts over the rows kept
+NORMALIZE_SQL = {
+    'clients': {
+        'keys': [],
+        'checks': [],
+        'replace': {
+            'sector': _fixed_category('sector', ALLOWED_SECTORS),
+            'contract_tier': _fixed_category('contract_tier', VALID_TIERS),
+            # clean_name: str(NaN) is 'nan', so a missing name becomes 'Nan'
+            'client_name': (
+                "title_case(strip_ws(regexp_replace(regexp_replace("
+                "COALESCE(client_name, 'nan'), '[._,-]+', ' ', 'g'), '\\s+', ' ', 'g')))"
+            )
+        },
+        'counters': {
+            'unknown_sector': "sector = 'unknown'",
+            'unknown_contract_tier': "contract_tier = 'unknown'"
+        }
+    },
+    'events': {
+        'keys': ['event_id', 'client_id', 'created_at'],
+        'checks': [],
+        'replace': {
+            'client_id': "strip_ws(client_id)",
+            'type': _fixed_category('type', EVENT_TYPES),
+            'currency': _open_category('currency', 3, 'XXX'),
+            'status': _fixed_category('status', EVENT_STATUSES),
+            # Empty codes depend on the normalized status
+            'error_code': (
+                "CASE WHEN upper(strip_ws(error_code)) IS NULL "
+                "OR upper(strip_ws(error_code)) IN ('', 'NONE', 'NAN') "
+                f"THEN CASE WHEN {_fixed_category('status', EVENT_STATUSES)} = 'failed' "
+                "THEN 'UNKNOWN' ELSE 'NONE' END "
+                "ELSE upper(strip_ws(error_code)) END"
+            ),
+            'origin_country': _open_category('origin_country', 2, 'XX'),
+            'destination_country': _open_category('destination_country', 2, 'XX')
+        },
+        'counters': {
+            'bad_type': "type = 'unknown'",
+            'bad_currency': "length(strip_ws(raw_currency)) IS DISTINCT FROM 3",
+            'bad_status': "status = 'unknown'",
+            'bad_error_code': "status = 'unknown'",
+            'bad_origin_country': "length(strip_ws(raw_origin_country)) IS DISTINCT FROM 2",
+            'bad_destination_country': "length(strip_ws(raw_destination_country)) IS DISTINCT FROM 2"
+        }
+    },
+    'retry_logs': {
+        'keys': ['retry_id', 'original_event_id', 'retry_time'],
+        'checks': [
+            ('invalid_retry_attempt', "TRY_CAST(strip_ws(retry_attempt) AS DOUBLE) IN (1, 2, 3)")
+        ],
+        'replace': {
+            'retry_attempt': "CAST(TRY_CAST(strip_ws(retry_attempt) AS DOUBLE) AS BIGINT)",
+            'retry_status': _fixed_category('retry_status', RETRY_STATUSES)
+        },
+        'counters': {
+            'bad_retry_status': "retry_status = 'unknown'"
+        }
+    }
+}
+
+
+def connect(
+    work_path: Path,
+    threads: Optional[int] = None,
+    memory_limit: Optional[str] = None
+) -> duckdb.DuckDBPyConnection:
+    """
+    Purpose:
+      -> DuckDB connection for the transform: a database file and a spill
+         directory under `work_path`, so tables and sorts larger than
+         `memory_limit` (e.g. '8GB') go to disk instead of failing.
+      -> `threads` defaults to every core.
+      -> Registers the helpers the NORMALIZE_SQL rules use: strip_ws (strip
+         like str.strip, not only spaces) and title_case (str.title).
+    """
+    work_path.mkdir(parents=True, exist_ok=True)
+    conn = duckdb.connect(str(work_path / 'transform.duckdb'))
+    conn.execute(f"SET temp_directory = {_sql_literal(work_path / 'spill')}")
+    conn.execute("SET TimeZone = 'UTC'")
+    if threads is not None:
+        conn.execute(f"SET threads = {int(threads)}")
+    if memory_limit is not None:
+        conn.execute(f"SET memory_limit = {_sql_literal(memory_limit)}")
+    conn.execute("CREATE OR REPLACE MACRO strip_ws(x) AS regexp_replace(x, '^\\s+|\\s+$', '', 'g')")
+    conn.create_function('title_case', str.title, ['VARCHAR'], 'VARCHAR')
+    return conn
+
+
+def stage_raw(conn: duckdb.DuckDBPyConnection, name: str, raw_path: Path) -> dict:
+    """
+    Purpose:
+      -> Scan the declared columns of the raw CSV (same NA strings and
+         RAW_SCHEMAS as load_csv, other columns pruned) into table
+         raw_<name>, with the UUID keys cast to UUID as encode_uuid_keys does
+         (rows whose key is present but malformed are dropped), the date
+         columns parsed as standardize_dates does and the input position in _row.
+    Returns:
+      -> Counters: 'rows_in', 'invalid_<column>' per UUID key and the date
+         counters of standardize_dates.
+    """
+    config = DATASETS[name]
+    path = raw_path / config['file']
+    if not path.exists():
+        raise FileNotFoundError(f"File not found: {path}")
+    nulls = ', '.join(_sql_literal(value) for value in NA_VALUES)
+    schema = RAW_SCHEMAS[name]
+    types = ', '.join(f"{_sql_literal(col)}: {_sql_literal(_duckdb_type(dtype))}" for col, dtype in schema.items())
+    converted = [f"{_parse_date(col)} AS {col}" for col in config['date_columns']]
+    converted += [f"{_parse_uuid(col)} AS {col}" for col in config['uuid_columns']]
+    flags = [f"{col} IS NOT NULL AND NOT regexp_full_match({col}, {_sql_literal(UUID_PATTERN)}) AS _invalid_{col}"
+             for col in config['uuid_columns']]
+    conn.execute(
+        f"CREATE OR REPLACE TABLE raw_{name} AS "
+        f"SELECT * REPLACE ({', '.join(converted)}), {', '.join(flags + ['row_number() OVER () AS _row'])} "
+        f"FROM (SELECT {', '.join(schema)} "
+        f"FROM read_csv({_sql_literal(path)}, header = true, nullstr = [{nulls}], types = {{{types}}}))"
+    )
+
+    stats = {'rows_in': conn.execute(f"SELECT COUNT(*) FROM raw_{name}").fetchone()[0]}
+    if config['uuid_columns']:
+        invalid = [f"_invalid_{col}" for col in config['uuid_columns']]
+        stats.update(_fetch_counters(conn, f"SELECT {', '.join(f'COUNT_IF({flag}) AS {flag[1:]}' for flag in invalid)} "
+                                           f"FROM raw_{name}"))
+        conn.execute(f"CREATE OR REPLACE TABLE raw_{name} AS SELECT * EXCLUDE ({', '.join(invalid)}) "
+                     f"FROM raw_{name} WHERE NOT ({' OR '.join(invalid)})")
+
+    counters = []
+    for column in config['date_columns']:
+        if name == 'events' and column == 'completed_at':
+            counters.append(f"COUNT_IF({column} IS NULL) AS {column}_null")
+            # Raw status, as standardize_dates runs before normalization
+            counters.append(
+                f"COUNT_IF({column} IS NULL AND status IS DISTINCT FROM 'processing' "
+                f"AND status IS DISTINCT FROM 'created') AS {column}_null_unexpected"
+            )
+        else:
+            counters.append(f"COUNT_IF({column} IS NULL) AS {column}_unparsed")
+    stats.update(_fetch_counters(conn, f"SELECT {', '.join(counters)} FROM raw_{name}"))
+    return stats
+
+
+def deduplicate(conn: duckdb.DuckDBPyConnection, name: str) -> dict:
+    """
+    Purpose:
+      -> Keep-earliest dedup of raw_<name> into dedup_<name>, like
+         deduplicate_logic: per key, the row with the smallest `sort_by`,
+         missing timestamps last and ties broken by input order.
+    Returns:
+      -> Counters 'duplicate_keys' and 'duplicates'.
+    """
+    config = DATASETS[name]
+    key = ', '.join(config['subset'])
+    conn.execute(
+        f"CREATE OR REPLACE TABLE dedup_{name} AS SELECT * FROM raw_{name} "
+        f"QUALIFY row_number() OVER (PARTITION BY {key} ORDER BY {config['sort_by']} NULLS LAST, _row) = 1"
+    )
+    return _fetch_counters(
+        conn,
+        f"SELECT (SELECT COUNT(*) FROM (SELECT 1 FROM raw_{name} GROUP BY {key} HAVING COUNT(*) > 1)) "
+        f"AS duplicate_keys, (SELECT COUNT(*) FROM raw_{name}) - (SELECT COUNT(*) FROM dedup_{name}) AS duplicates"
+    )
+
+
+def normalize(conn: duckdb.DuckDBPyConnection, name: str) -> dict:
+    """
+    Purpose:
+      -> Apply the normalize_* rules of NORMALIZE_SQL to dedup_<name> into
+         table <name>, keeping input order in _row.
+    Returns:
+      -> Counters with the same names as normalize_*.
+    """
+    rules = NORMALIZE_SQL[name]
+    # Row filters as chained flags: missing keys first, then each check
+    valid = ' AND '.join(f"{key} IS NOT NULL" for key in rules['keys']) or 'true'
+    checked = f"SELECT *, {valid} AS _keep_0 FROM dedup_{name}"
+    for i, (_, condition) in enumerate(rules['checks'], start=1):
+        checked = f"SELECT *, _keep_{i - 1} AND COALESCE({condition}, false) AS _keep_{i} FROM ({checked})"
+    flags = [f"_keep_{i}" for i in range(len(rules['checks']) + 1)]
+
+    replace = ', '.join(f"{expr} AS {col}" for col, expr in rules['replace'].items())
+    raw = ', '.join(f"{col} AS raw_{col}" for col in rules['replace'])
+    normalized = f"SELECT * REPLACE ({replace}), {raw} FROM ({checked}) WHERE {flags[-1]}"
+    exclude = ', '.join(flags + [f"raw_{col}" for col in rules['replace']])
+    conn.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT * EXCLUDE ({exclude}) FROM ({normalized}) ORDER BY _row")
+
+    counters = [f"COUNT_IF(NOT _keep_0) AS missing_keys"] if rules['keys'] else []
+    counters += [
+        f"COUNT_IF(_keep_{i - 1} AND NOT _keep_{i}) AS {counter}"
+        for i, (counter, _) in enumerate(rules['checks'], start=1)
+    ]
+    stats = _fetch_counters(conn, f"SELECT {', '.join(counters)} FROM ({checked})") if counters else {}
+    kept = ', '.join(f"COUNT_IF({condition}) AS {counter}" for counter, condition in rules['counters'].items())
+    stats.update(_fetch_counters(conn, f"SELECT {kept} FROM ({normalized})"))
+    return stats
+
+
+def check_orphans(
+    conn: duckdb.DuckDBPyConnection,
+    processed_path: Path,
+    orphans: str
+) -> dict:
+    """
+    Purpose:
+      -> Anti-join of retry_logs against events, like cross_reference_retries;
+         'quarantine' also moves the orphans to processed/quarantine/retry_logs/.
+    Returns:
+      -> Counter 'orphan_retries'.
+    """
+    if orphans not in ORPHAN_ACTIONS:
+        raise ValueError(f"Unknown orphan action '{orphans}'. Options: {list(ORPHAN_ACTIONS)}")
+    orphan_rows = (
+        "SELECT * FROM retry_logs AS R WHERE NOT EXISTS "
+        "(SELECT 1 FROM events AS E WHERE E.event_id = R.original_event_id)"
+    )
+    stats = _fetch_counters(conn, f"SELECT COUNT(*) AS orphan_retries FROM ({orphan_rows})")
+    if orphans == 'quarantine':
+        quarantine_dir = processed_path / 'quarantine' / 'retry_logs'
+        shutil.rmtree(quarantine_dir, ignore_errors=True)
+        if stats['orphan_retries']:
+            quarantine_dir.mkdir(parents=True, exist_ok=True)
+            conn.execute(
+                f"COPY (SELECT * EXCLUDE (_row) FROM ({orphan_rows}) ORDER BY _row) "
+                f"TO {_sql_literal(quarantine_dir / 'part-00000.parquet')} (FORMAT parquet)"
+            )
+            conn.execute(
+                "DELETE FROM retry_logs AS R WHERE NOT EXISTS "
+                "(SELECT 1 FROM events AS E WHERE E.event_id = R.original_event_id)"
+            )
+    return stats
+
+
+def write_processed(conn: duckdb.DuckDBPyConnection, name: str, processed_path: Path, fmt: str = 'parquet') -> Path:
+    """
+    Purpose:
+      -> COPY table <name> to the processed layer with the layout of
+         ProcessedWriter (see processed_target): Hive partitions by month for
+         events and retry logs in Parquet, one file otherwise.
+      -> Written to a staging path swapped in at the end, so a failed run
+         never leaves a half-written dataset behind.
+    """
+    target = processed_target(name, processed_path, fmt)
+    staging = target.with_name(target.name + '.tmp')
+    _remove(staging)
+    config = DATASETS[name]
+    if fmt == 'csv':
+        query, options = f"SELECT * EXCLUDE (_row) FROM {name} ORDER BY _row", "FORMAT csv, HEADER"
+    elif 'partition' in config:
+        column, partition_col = config['partition']
+        query = (f"SELECT * EXCLUDE (_row), COALESCE(strftime({column}, '%Y-%m'), 'unknown') AS {partition_col} "
+                 f"FROM {name} ORDER BY _row")
+        options = f"FORMAT parquet, PARTITION_BY ({partition_col})"
+    else:
+        query, options = f"SELECT * EXCLUDE (_row) FROM {name} ORDER BY _row", "FORMAT parquet"
+    conn.execute(f"COPY ({query}) TO {_sql_literal(staging)} ({options})")
+    _remove(target)
+    staging.rename(target)
+    return target
+
+
+def run_duckdb(
+    raw_path: Path,
+    processed_path: Path,
+    fmt: str = 'parquet',
+    orphans: Optional[str] = 'report',
+    threads: Optional[int] = None,
+    memory_limit: Optional[str] = None,
+    metrics: Optional[RunMetrics] = None
+) -> dict:
+    """
+    Purpose:
+      -> The ETL of run_pipeline on the DuckDB engine: the raw CSVs are
+         scanned, deduplicated and normalized in SQL (same rules, counters and
+         processed layout as the pandas functions), multi-threaded and out of
+         core: DuckDB spills to processed/.transform/ past `memory_limit`.
+      -> `orphans` as in run_pipeline ('report', 'quarantine' or None).
+      -> With `metrics`, each step is a stage '<name>.<step>' and each
+         dataset a stage '<name>' with its counters.
+    Returns:
+      -> Counters per dataset.
+    """
+    if fmt not in PROCESSED_FORMATS:
+        raise ValueError(f"Unknown processed format '{fmt}'. Options: {list(PROCESSED_FORMATS)}")
+    processed_path.mkdir(parents=True, exist_ok=True)
+    work_path = processed_path / '.transform'
+    shutil.rmtree(work_path, ignore_errors=True)
+    conn = connect(work_path, threads, memory_limit)
+    results = {}
+    try:
+        for name in DATASETS:
+            stats = {}
+            with measure(metrics, name, stats=stats) as record:
+                with measure(metrics, f"{name}.load_csv"):
+                    stats.update(stage_raw(conn, name, raw_path))
+                with measure(metrics, f"{name}.deduplicate_logic", stats['rows_in']):
+                    stats.update(deduplicate(conn, name))
+                with measure(metrics, f"{name}.normalize"):
+                    stats.update(normalize(conn, name))
+                if name == 'retry_logs' and orphans is not None:
+                    with measure(metrics, f"{name}.check_orphans"):
+                        stats.update(check_orphans(conn, processed_path, orphans))
+                with measure(metrics, f"{name}.write") as write:
+                    output = write_processed(conn, name, processed_path, fmt)
+                    stats['rows_out'] = write['rows_in'] = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+                record.update(rows_in=stats['rows_in'], rows_out=stats['rows_out'])
+            report_stats(stats, name)
+            logger.info(f"[DuckDB] {name}: {stats['rows_out']} rows → {output}")
+            results[name] = stats
+    finally:
+        conn.close()
+        shutil.rmtree(work_path, ignore_errors=True)
+    return results
+
+
+def _fetch_counters(conn: duckdb.DuckDBPyConnection, query: str) -> dict:
+    """One-row counter query as {column: int}"""
+    cursor = conn.execute(query)
+    columns = [column[0] for column in cursor.description]
+    return {column: int(value or 0) for column, value in zip(columns, cursor.fetchone())}
+
+
+def read_processed(name: str, processed_path: Path) -> pd.DataFrame:
+    """
+    A Parquet dataset of the processed layer in a comparable form: sorted by
+    key, categoricals as plain strings and timestamps as UTC nanoseconds
+    """
+    key = DATASETS[name]['subset']
+    df = pq.read_table(processed_target(name, processed_path, 'parquet')).to_pandas()
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype) or df[column].dtype == object:
+            df[column] = df[column].astype(object).where(df[column].notna(), None).astype('string')
+        elif pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = pd.to_datetime(df[column], utc=True).astype('datetime64[ns, UTC]')
+    return df.sort_values(key, kind='stable').reset_index(drop=True)
+
+
+def check_parity(raw_path: Path, work_path: Path) -> Dict[str, int]:
+    """
+    Purpose:
+      -> Run the pandas engine (whole frames) and the DuckDB engine on the
+         same raw data under `work_path` and assert that every processed
+         dataset has the same rows, columns and values.
+    Returns:
+      -> Rows per dataset; raises AssertionError on the first difference.
+    """
+    pandas_path = work_path / 'pandas'
+    duckdb_path = work_path / 'duckdb'
+    for path in (pandas_path, duckdb_path):
+        shutil.rmtree(path, ignore_errors=True)
+    run_pipeline(raw_path, pandas_path, chunksize=None)
+    run_duckdb(raw_path, duckdb_path)
+
+    rows = {}
+    for name in DATASETS:
+        expected = read_processed(name, pandas_path)
+        actual = read_processed(name, duckdb_path)
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False, obj=name)
+        rows[name] = len(actual)
+        logger.info(f"[Parity] {name}: {len(actual)} identical rows")
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, int]:
+    """Command line entry point: python src/transform_sql.py --raw data/raw --work /tmp/parity"""
+    parser = argparse.ArgumentParser(description="Check that the pandas and DuckDB engines give the same output.")
+    parser.add_argument('--raw', type=Path, default=Path(__file__).resolve().parents[1] / 'data' / 'raw')
+    parser.add_argument('--work', type=Path, required=True, help="processed output of each engine")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    return check_parity(args.raw, args.work)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+from pathlib import Path
+
+import pytest
+
+from datagen import generate
+
+
+REPO_RAW = Path(__file__).resolve().parents[1] / 'data' / 'raw'
+
+
+@pytest.fixture(scope='session')
+def repo_raw() -> Path:
+    """The raw CSVs shipped with the repo"""
+    return REPO_RAW
+
+
+@pytest.fixture(scope='session')
+def dirty_raw(tmp_path_factory) -> Path:
+    """
+    Synthetic raw CSVs with 5% dirt, generated in chunks of 5k events so
+    duplicate keys cross chunk boundaries
+    """
+    raw_path = tmp_path_factory.mktemp('dirty') / 'raw'
+    generate(raw_path, 20_000, dirt=0.05, seed=0, chunksize=5_000)
+    return raw_path
+
+
+@pytest.fixture(params=['repo', 'dirty'])
+def raw_path(request) -> Path:
+    """Each raw dataset the engines are checked on"""
+    return request.getfixturevalue(f"{request.param}_raw")
@@ -0,0 +1,94 @@
+import shutil
+import uuid
+
+import pyarrow.parquet as pq
+
+import load
+from metrics import RunMetrics
+from pipeline import DATASETS, STREAMABLE, run_incremental
+
+
+def _append(path, rows):
+    with open(path, 'ab') as f:
+        f.write(b''.join(rows))
+
+
+def _run(raw_path, tmp_path, batch_id):
+    return run_incremental(raw_path, tmp_path / 'processed', tmp_path / 'state', chunksize=2_000, batch_id=batch_id)
+
+
+def _split_raw(dirty_raw, tmp_path):
+    """
+    Raw dir holding the first half of each dirty events / retries file;
+    returns it and the data rows of each half
+    """
+    raw_path = tmp_path / 'raw'
+    raw_path.mkdir()
+    shutil.copy(dirty_raw / 'clients.csv', raw_path)
+    halves = {}
+    for name in STREAMABLE:
+        file_name = DATASETS[name]['file']
+        lines = (dirty_raw / file_name).read_bytes().splitlines(keepends=True)
+        half = 1 + (len(lines) - 1) // 2
+        (raw_path / file_name).write_bytes(b''.join(lines[:half]))
+        halves[name] = (lines[1:half], lines[half:])
+    return raw_path, halves
+
+
+def test_each_run_reads_only_appended_rows(dirty_raw, tmp_path):
+    raw_path, halves = _split_raw(dirty_raw, tmp_path)
+    first = _run(raw_path, tmp_path, 'b1')
+    for name, (_, appended) in halves.items():
+        _append(raw_path / DATASETS[name]['file'], appended)
+    second = _run(raw_path, tmp_path, 'b2')
+    third = _run(raw_path, tmp_path, 'b3')
+
+    for name, (initial, appended) in halves.items():
+        assert first[name]['rows_in'] == len(initial)
+        assert second[name]['rows_in'] == len(appended)
+        assert third[name]['rows_in'] == third[name]['rows_out'] == 0
+        key = DATASETS[name]['subset'][0]
+        keys = pq.read_table(tmp_path / 'processed' / name, columns=[key]).column(key).to_pandas()
+        assert len(keys) == first[name]['rows_out'] + second[name]['rows_out']
+        assert not keys.duplicated().any(), name
+
+
+def test_late_rows_are_ingested_and_known_keys_dropped(dirty_raw, tmp_path):
+    raw_path, _ = _split_raw(dirty_raw, tmp_path)
+    _run(raw_path, tmp_path, 'b1')
+    events = raw_path / 'events.csv'
+    header, stored = events.read_bytes().splitlines(keepends=True)[:2]
+    columns = header.decode().strip().split(',')
+
+    # A new event older than the watermark, and a copy of an event already written
+    late = stored.decode().strip().split(',')
+    late[columns.index('event_id')] = str(uuid.uuid4())
+    late[columns.index('created_at')] = '2025-01-01 00:00:00'
+    _append(events, [(','.join(late) + '\n').encode(), stored])
+    stats = _run(raw_path, tmp_path, 'b2')['events']
+    assert (stats['rows_in'], stats['rows_out'], stats['late_rows']) == (2, 1, 1)
+
+
+def test_partial_row_waits_for_its_newline(dirty_raw, tmp_path):
+    raw_path, halves = _split_raw(dirty_raw, tmp_path)
+    _run(raw_path, tmp_path, 'b1')
+    row = halves['events'][1][0]
+    _append(raw_path / 'events.csv', [row[:-1]])
+    assert _run(raw_path, tmp_path, 'b2')['events']['rows_in'] == 0
+    _append(raw_path / 'events.csv', [b'\n'])
+    assert _run(raw_path, tmp_path, 'b3')['events']['rows_in'] == 1
+
+
+def test_backlog_flows_through_bounded_chunks_and_shards(dirty_raw, tmp_path, monkeypatch):
+    """A whole-file first run is read, spilled and deduplicated about `chunksize` rows at a time"""
+    monkeypatch.setattr(load, 'MAX_READ_BYTES', 200_000)
+    metrics = RunMetrics('incremental')
+    results = run_incremental(dirty_raw, tmp_path / 'processed', tmp_path / 'state', chunksize=2_000,
+                              batch_id='b1', metrics=metrics)
+    for name in STREAMABLE:
+        loads = metrics.stages[f"{name}.load_csv"]
+        # One call per chunk, plus the one that finds the end of the range
+        assert loads['calls'] - 1 == -(-results[name]['rows_in'] // 2_000)
+        assert loads['rows_out'] == results[name]['rows_in']
+        shards = metrics.stages[f"{name}.read_spill"]
+        assert shards['rows_out'] / shards['calls'] <= 2_000
@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+import load
+from load import RAW_SCHEMAS, csv_unread_range, load_csv, load_csv_range
+
+
+@pytest.mark.parametrize('max_read_bytes', [load.MAX_READ_BYTES, 100_000])
+def test_range_streams_in_chunks(repo_raw, monkeypatch, max_read_bytes):
+    """A range longer than `chunksize` (and than MAX_READ_BYTES) comes in exact chunks with a running index"""
+    monkeypatch.setattr(load, 'MAX_READ_BYTES', max_read_bytes)
+    columns, start, end = csv_unread_range('events.csv', repo_raw)
+    chunks = list(load_csv_range('events.csv', repo_raw, columns, start, end, 4_000, RAW_SCHEMAS['events']))
+
+    expected = load_csv('events.csv', repo_raw, schema=RAW_SCHEMAS['events'])
+    assert [len(chunk) for chunk in chunks] == [4_000] * (len(expected) // 4_000) + [len(expected) % 4_000]
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+
+
+def test_split_range_pieces_are_bounded_and_line_aligned(repo_raw):
+    columns, start, end = csv_unread_range('events.csv', repo_raw)
+    data = (repo_raw / 'events.csv').read_bytes()
+    with open(repo_raw / 'events.csv', 'rb') as f:
+        pieces = load._split_range(f, start, end, 100_000)
+    assert len(pieces) > 1
+    assert pieces[0][0] == start and pieces[-1][1] == end
+    assert [piece[0] for piece in pieces[1:]] == [piece[1] for piece in pieces[:-1]]
+    longest_line = max(len(line) for line in data.splitlines(keepends=True))
+    for piece_start, piece_end in pieces:
+        assert data[piece_end - 1:piece_end] == b'\n'
+        assert piece_end - piece_start <= 100_000 + longest_line
+
+
+def test_empty_range_yields_nothing(repo_raw):
+    columns, _, end = csv_unread_range('events.csv', repo_raw)
+    assert list(load_csv_range('events.csv', repo_raw, columns, end, end, 4_000, RAW_SCHEMAS['events'])) == []
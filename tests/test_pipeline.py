@@ -0,0 +1,51 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from load import load_csv
+from pipeline import DATASETS, STREAMABLE, run_pipeline
+from transform_sql import read_processed
+
+
+def test_chunked_load_reads_every_row(repo_raw):
+    chunks = list(load_csv('events.csv', repo_raw, chunksize=4_000))
+    assert [len(chunk) for chunk in chunks[:-1]] == [4_000] * (len(chunks) - 1)
+    pd.testing.assert_frame_equal(pd.concat(chunks), load_csv('events.csv', repo_raw))
+
+
+def test_chunked_run_writes_unique_keys(dirty_raw, tmp_path):
+    """Copies of a key in different chunks are dropped, not written twice"""
+    run_pipeline(dirty_raw, tmp_path, chunksize=3_000)
+    for name in STREAMABLE:
+        key = DATASETS[name]['subset'][0]
+        keys = pq.read_table(tmp_path / name, columns=[key]).column(key).to_pandas()
+        assert len(keys) > 0
+        assert not keys.duplicated().any(), name
+
+
+@pytest.mark.parametrize('chunksize', [1_000, 3_000])
+def test_chunked_run_matches_whole_frame(dirty_raw, tmp_path, chunksize):
+    """Streaming keeps the earliest copy of every key, like the whole-frame run"""
+    expected_stats = run_pipeline(dirty_raw, tmp_path / 'whole', chunksize=None, orphans='quarantine')
+    actual_stats = run_pipeline(dirty_raw, tmp_path / 'chunked', chunksize=chunksize, orphans='quarantine')
+    assert actual_stats == expected_stats
+
+    for name in DATASETS:
+        expected = read_processed(name, tmp_path / 'whole')
+        pd.testing.assert_frame_equal(read_processed(name, tmp_path / 'chunked'), expected, obj=name)
+    pd.testing.assert_frame_equal(read_processed('retry_logs', tmp_path / 'chunked' / 'quarantine'),
+                                  read_processed('retry_logs', tmp_path / 'whole' / 'quarantine'))
+    assert not (tmp_path / 'chunked' / '.spill-events').exists()
+
+
+def test_processed_keys_are_16_byte_uuids(repo_raw, tmp_path):
+    """Keys are stored as 16 bytes and read back as the raw UUID strings"""
+    run_pipeline(repo_raw, tmp_path, chunksize=None)
+    field_type = pq.read_schema(next((tmp_path / 'events').rglob('*.parquet'))).field('event_id').type
+    assert getattr(field_type, 'storage_type', field_type) == pa.binary(16)
+
+    keys = read_processed('events', tmp_path)['event_id']
+    raw_keys = pd.read_csv(repo_raw / 'events.csv', usecols=['event_id'])['event_id'].str.lower()
+    assert len(keys) > 0
+    assert set(keys) <= set(raw_keys)
@@ -0,0 +1,106 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from pipeline import run_pipeline
+from service import SERVING_TABLES, AnalyticsService, serve
+
+
+@pytest.fixture(scope='module')
+def service(repo_raw, tmp_path_factory):
+    work = tmp_path_factory.mktemp('service')
+    run_pipeline(repo_raw, work / 'processed')
+    service = AnalyticsService(work / 'processed', work / 'analytics')
+    yield service
+    service.close()
+
+
+@pytest.fixture(scope='module')
+def base_url(service):
+    server = serve(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_http_routes(service, base_url):
+    client_id = service.analytics.conn.execute("SELECT min(client_id) FROM serve_client_summary").fetchone()[0]
+    status, row = _get(f"{base_url}/client_summary/{client_id}")
+    assert status == 200 and row['client_id'] == client_id
+    assert _get(f"{base_url}/client_summary/unknown")[0] == 404
+
+    status, hours = _get(f"{base_url}/event_time_series?start=2025-02-01&end=2025-02-02")
+    assert status == 200 and 0 < len(hours) <= 24
+    assert [hour['TIMESTAMP'] for hour in hours] == sorted(hour['TIMESTAMP'] for hour in hours)
+    assert _get(f"{base_url}/event_time_series?start=2025-02-01")[0] == 400
+    assert _get(f"{base_url}/event_time_series?start=nope&end=2025-02-02")[0] == 400
+    assert _get(f"{base_url}/stats")[1]['client_summary']['count'] > 0
+
+
+def test_reads_never_fail_during_refresh(service, base_url):
+    client_id = service.analytics.conn.execute("SELECT min(client_id) FROM serve_client_summary").fetchone()[0]
+    paths = [f"/client_summary/{client_id}", "/event_time_series?start=2025-01-01&end=2026-01-01"]
+    expected = {path: _get(base_url + path) for path in paths}
+    failures = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            for path in paths:
+                result = _get(base_url + path)
+                if result != expected[path]:
+                    failures.append((path, result))
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    try:
+        for _ in range(5):
+            service.refresh()
+    finally:
+        done.set()
+        for reader in readers:
+            reader.join()
+    assert not failures, failures[:3]
+
+
+def test_failed_refresh_keeps_every_table(service, base_url, monkeypatch):
+    conn = service.analytics.conn
+    count = 'SELECT COUNT(*) FROM {}'
+    before = {table: conn.execute(count.format(table)).fetchone()[0] for table, _ in SERVING_TABLES.values()}
+    stage_query = service.analytics.stage_query
+
+    def stage_then_fail(table_type, table_name, key):
+        if table_name != 'serve_client_summary':
+            raise RuntimeError("staging failed")
+        stage_query(table_type, table_name, key)
+        conn.execute(f"DELETE FROM {table_name}_new")
+
+    monkeypatch.setattr(service.analytics, 'stage_query', stage_then_fail)
+    request = urllib.request.Request(f"{base_url}/refresh", method='POST')
+    with pytest.raises(urllib.error.HTTPError) as error:
+        urllib.request.urlopen(request)
+    assert error.value.code == 500
+    assert json.loads(error.value.read()) == {'error': "RuntimeError: staging failed"}
+    assert {table: conn.execute(count.format(table)).fetchone()[0] for table in before} == before
+
+
+def test_unexpected_errors_are_json_500s(service, base_url, monkeypatch):
+    def fail(client_id):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(service, 'client_summary', fail)
+    assert _get(f"{base_url}/client_summary/C0001") == (500, {'error': "RuntimeError: boom"})
@@ -0,0 +1,55 @@
+import pytest
+
+from pipeline import run_pipeline
+from sql_analytics import SQLAnalytics
+
+
+@pytest.fixture(scope='module')
+def processed(repo_raw, tmp_path_factory):
+    processed_path = tmp_path_factory.mktemp('analytics') / 'processed'
+    run_pipeline(repo_raw, processed_path)
+    return processed_path
+
+
+def test_misses_are_cached_under_the_key_taken_before_running(processed, tmp_path, monkeypatch):
+    analytics = SQLAnalytics(processed, tmp_path)
+    keys = {}
+    cache_key = analytics._cache_key
+
+    def record_key(name):
+        keys.setdefault(name, []).append(cache_key(name))
+        return keys[name][-1]
+
+    monkeypatch.setattr(analytics, '_cache_key', record_key)
+    try:
+        results = analytics.generate_analytics_tables()
+    finally:
+        analytics.close()
+    assert results and all(results.values())
+    assert sorted(keys) == sorted(results)
+    assert all(len(taken) == 1 for taken in keys.values())
+    assert set(analytics.cache.index) == {taken[0] for taken in keys.values()}
+
+
+def test_all_hits_skip_duckdb(processed, tmp_path, monkeypatch):
+    first = SQLAnalytics(processed, tmp_path)
+    try:
+        expected = first.generate_analytics_tables()
+    finally:
+        first.close()
+    outputs = {name: first._output_file(name) for name in expected}
+    for output_file in outputs.values():
+        output_file.unlink()
+
+    def fail(*args):
+        raise AssertionError("DuckDB work on a fully cached run")
+
+    analytics = SQLAnalytics(processed, tmp_path)
+    monkeypatch.setattr(analytics, 'load_processed_to_sql', fail)
+    monkeypatch.setattr(analytics, '_execute_query', fail)
+    try:
+        assert analytics.generate_analytics_tables() == expected
+    finally:
+        analytics.close()
+    assert all(output_file.exists() for output_file in outputs.values())
+    assert analytics.cache.stats()['hits'] == len(expected)
@@ -0,0 +1,39 @@
+import uuid
+
+import pandas as pd
+
+from state import KeyStore
+from transform import encode_uuids, uuid_isin
+
+
+def _uuids(n: int) -> pd.Series:
+    """Random UUIDs as UUID_DTYPE, half of them ending in a NUL byte"""
+    values = [uuid.uuid4().bytes[:15] + (b'\x00' if i % 2 else b'\x01') for i in range(n)]
+    return encode_uuids(pd.Series([str(uuid.UUID(bytes=value)) for value in values]))
+
+
+def test_uuid_isin_finds_every_key():
+    keys = _uuids(200)
+    values = pd.concat([keys, _uuids(50), pd.Series([None], dtype=keys.dtype)], ignore_index=True)
+    mask = uuid_isin(values, set(keys))
+    assert mask.tolist() == [True] * 200 + [False] * 51
+    assert uuid_isin(values, keys).equals(mask)
+
+
+def test_key_store_sees_every_stored_key(tmp_path):
+    keys = _uuids(200)
+    store = KeyStore(tmp_path / 'keys.sqlite')
+    store.add('events', keys.iloc[:100])
+    assert store.seen('events', keys).tolist() == [True] * 100 + [False] * 100
+    store.close()
+
+
+def test_key_store_keeps_only_committed_keys(tmp_path):
+    store = KeyStore(tmp_path / 'keys.sqlite')
+    store.add('events', pd.Series(['a', 'b']))
+    store.commit()
+    store.add('events', pd.Series(['c']))
+    store.rollback()
+    assert store.seen('events', pd.Series(['a', 'c', None, 'b'])).tolist() == [True, False, False, True]
+    assert store.count('events') == 2
+    store.close()
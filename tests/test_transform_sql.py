@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from pipeline import DATASETS, run_pipeline
+from transform_sql import read_processed, run_duckdb
+
+
+def _counters(results: dict) -> dict:
+    """Counters per dataset without the zeros (pandas only reports what it found)"""
+    return {name: {key: value for key, value in stats.items() if value} for name, stats in results.items()}
+
+
+@pytest.mark.parametrize('orphans', ['report', 'quarantine'])
+def test_duckdb_matches_pandas(raw_path, tmp_path, orphans):
+    """Same counters and same processed rows from both engines"""
+    expected_stats = run_pipeline(raw_path, tmp_path / 'pandas', chunksize=None, orphans=orphans)
+    actual_stats = run_duckdb(raw_path, tmp_path / 'duckdb', orphans=orphans)
+    assert _counters(actual_stats) == _counters(expected_stats)
+
+    for name in DATASETS:
+        expected = read_processed(name, tmp_path / 'pandas')
+        actual = read_processed(name, tmp_path / 'duckdb')
+        assert len(actual) > 0
+        pd.testing.assert_frame_equal(actual, expected, check_dtype=False, obj=name)
+
+
+
+def test_duckdb_quarantines_the_same_orphans(dirty_raw, tmp_path):
+    """Quarantined retries match too, and both engines write them as readable Parquet"""
+    run_pipeline(dirty_raw, tmp_path / 'pandas', chunksize=None, orphans='quarantine')
+    run_duckdb(dirty_raw, tmp_path / 'duckdb', orphans='quarantine')
+
+    expected = read_processed('retry_logs', tmp_path / 'pandas' / 'quarantine')
+    actual = read_processed('retry_logs', tmp_path / 'duckdb' / 'quarantine')
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)